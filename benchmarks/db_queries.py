@@ -0,0 +1,343 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+import psycopg2
+from psycopg2.extras import DictCursor
+from dotenv import load_dotenv
+from modules import catalog, db, migrations, topic_bundles
+from modules.backends import postgres
+
+# Query latency and plan benchmark for the hot tables.
+#
+# Loads a synthetic dataset (100k users by default) into a *separate* benchmark
+# database, then runs every query issued by modules/db.py, modules/catalog.py
+# and modules/psychometrics.py and reports latency plus EXPLAIN ANALYZE plans
+# twice: without the migration 2 indexes ("before") and with them ("after").
+# Nothing the benchmark writes while measuring is committed.
+#
+# BENCH_DATABASE_URL=postgresql://... python -m benchmarks.db_queries
+# python -m benchmarks.db_queries --users 20000 --runs 50 --plans bench_output.txt
+
+BENCH_USER_PREFIX = 'bench_user_'
+BENCH_SUBJECT_PREFIX = 'Bench'
+
+# --- SYNTHETIC DATA ---
+
+SEED_STATEMENTS = [
+    # Knowledge units and topics: `subjects` subjects x `topics` topics, 5 KUs per subject
+    """
+    INSERT INTO knowledge_units (ku_code, ku_name, description)
+    SELECT 'BENCH_KU_' || s.i || '_' || k.i, 'Bench KU ' || k.i, 'Synthetic benchmark unit'
+    FROM generate_series(1, %(subjects)s) AS s(i), generate_series(1, 5) AS k(i)
+    ON CONFLICT (ku_code) DO NOTHING
+    """,
+    """
+    INSERT INTO topics (subject, ku_id, topic_name, topic_order)
+    SELECT %(prefix)s || s.i, ku.id, 'Bench Topic ' || n.i, n.i
+    FROM generate_series(1, %(subjects)s) AS s(i)
+    CROSS JOIN generate_series(1, %(topics)s) AS n(i)
+    JOIN knowledge_units ku ON ku.ku_code = 'BENCH_KU_' || s.i || '_' || (1 + (n.i - 1) %% 5)
+    ON CONFLICT (subject, topic_name) DO NOTHING
+    """,
+    """
+    INSERT INTO pedagogical_content (topic_id, bloom_level, intention_type, content)
+    SELECT t.id, v.bloom::bloom_level, v.intention::intention_type, repeat('Synthetic lesson text. ', 100)
+    FROM topics t
+    CROSS JOIN (VALUES
+        ('Explain', 'Lesson'), ('Explain', 'Simple_Explanation'), ('Explain', 'Worked_Example'),
+        ('Explain', 'Hint_L1'), ('Explain', 'Hint_L2'), ('Apply', 'Quiz_Question_Apply')
+    ) AS v(bloom, intention)
+    WHERE t.subject LIKE %(prefix)s || '%%'
+    ON CONFLICT (topic_id, bloom_level, intention_type) DO NOTHING
+    """,
+    """
+    INSERT INTO question_bank (topic_id, question_text, options, correct_option_index,
+                               irt_difficulty_b, irt_discrimination_a, irt_guessing_c, test_type)
+    SELECT t.id, 'Synthetic question ' || q.i, '["A", "B", "C", "D"]'::jsonb, q.i %% 4,
+           random() * 4 - 2, 0.5 + random() * 1.5, 0.2, tt.test_type
+    FROM topics t
+    CROSS JOIN generate_series(1, %(questions)s) AS q(i)
+    CROSS JOIN (VALUES ('placement'), ('final')) AS tt(test_type)
+    WHERE t.subject LIKE %(prefix)s || '%%'
+    """,
+    # Users, then progress for roughly half of the (user, subject) pairs
+    """
+    INSERT INTO users (username, hashed_password)
+    SELECT %(user_prefix)s || i, 'x' FROM generate_series(1, %(users)s) AS i
+    ON CONFLICT (username) DO NOTHING
+    """,
+    """
+    INSERT INTO progress (user_id, subject, irt_theta_initial, status)
+    SELECT u.id, s.subject, random() * 4 - 2, 'learning'
+    FROM users u
+    CROSS JOIN (SELECT DISTINCT subject FROM topics WHERE subject LIKE %(prefix)s || '%%') AS s
+    WHERE u.username LIKE %(user_prefix)s || '%%'
+      AND (u.id + ascii(right(s.subject, 1))) %% 2 = 0
+    ON CONFLICT (user_id, subject) DO NOTHING
+    """,
+    """
+    INSERT INTO bkt_model (user_id, subject, topic_id, prob_knows)
+    SELECT p.user_id, p.subject, t.id, random()
+    FROM progress p
+    JOIN topics t ON t.subject = p.subject
+    WHERE p.subject LIKE %(prefix)s || '%%'
+    ON CONFLICT (user_id, subject, topic_id) DO NOTHING
+    """,
+    """
+    INSERT INTO learning_log (user_id, subject, topic_id, event_type, details, timestamp)
+    SELECT p.user_id, p.subject, t.id, 'quiz_pass', '', now() - random() * interval '365 days'
+    FROM progress p
+    JOIN topics t ON t.subject = p.subject AND t.topic_order <= %(events)s
+    WHERE p.subject LIKE %(prefix)s || '%%'
+    """,
+    """
+    INSERT INTO student_cat_responses (user_id, question_id, test_type, response_index,
+                                       is_correct, theta_estimate_after, timestamp)
+    SELECT p.user_id, q.id, 'placement', 0, random() < 0.5, random() * 4 - 2,
+           now() - random() * interval '365 days'
+    FROM progress p
+    CROSS JOIN LATERAL (
+        SELECT qb.id FROM question_bank qb
+        JOIN topics t ON t.id = qb.topic_id
+        WHERE t.subject = p.subject AND qb.test_type = 'placement'
+        ORDER BY qb.id
+        LIMIT 10 OFFSET p.user_id %% 20
+    ) AS q
+    WHERE p.subject LIKE %(prefix)s || '%%'
+    """,
+]
+
+def seed_dataset(conn, users, subjects, topics, questions, events):
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM users WHERE username LIKE %s", (BENCH_USER_PREFIX + '%',))
+    existing = cur.fetchone()[0]
+    if existing:
+        print(f"Synthetic dataset already present ({existing} users). Use --reset to rebuild.")
+        conn.rollback()
+        return
+
+    params = {
+        'users': users, 'subjects': subjects, 'topics': topics, 'questions': questions,
+        'events': events, 'prefix': BENCH_SUBJECT_PREFIX, 'user_prefix': BENCH_USER_PREFIX,
+    }
+    for statement in SEED_STATEMENTS:
+        started = time.perf_counter()
+        cur.execute(statement, params)
+        label = ' '.join(statement.split()[:3])
+        print(f"  {label:<40} {cur.rowcount:>10} rows  {time.perf_counter() - started:6.1f}s")
+    conn.commit()
+    cur.execute("ANALYZE")
+    conn.commit()
+    cur.close()
+
+def reset_dataset(conn):
+    cur = conn.cursor()
+    like_subject = BENCH_SUBJECT_PREFIX + '%'
+    cur.execute("DELETE FROM users WHERE username LIKE %s", (BENCH_USER_PREFIX + '%',))
+    cur.execute("DELETE FROM question_bank WHERE topic_id IN (SELECT id FROM topics WHERE subject LIKE %s)", (like_subject,))
+    cur.execute("DELETE FROM learning_log WHERE subject LIKE %s", (like_subject,))
+    cur.execute("DELETE FROM topics WHERE subject LIKE %s", (like_subject,))
+    cur.execute("DELETE FROM knowledge_units WHERE ku_code LIKE %s", ('BENCH_KU_%',))
+    conn.commit()
+    cur.close()
+
+# --- QUERY REGISTRY ---
+# (name, kind, sql, params_fn). The SQL is the modules' own statements, so the
+# benchmark measures what ships. params_fn receives a Sample.
+
+class Sample:
+    """Random parameters drawn from the synthetic dataset for one query run."""
+
+    def __init__(self, ctx):
+        self.user_id, self.subject = random.choice(ctx['progress'])
+        self.username = f"{BENCH_USER_PREFIX}{random.randint(1, ctx['users'])}"
+        self.topic_id = random.choice(ctx['topics'][self.subject])
+        self.question_id = random.choice(ctx['questions'][self.subject])
+        self.test_type = random.choice(['placement', 'final'])
+
+QUERIES = [
+    # --- modules/db.py ---
+    ("db.get_user_from_db", "read", db.USER_SQL, lambda s: (s.username,)),
+    ("db.get_progress", "read", db.PROGRESS_SQL, lambda s: (s.user_id, s.subject)),
+    ("db.update_progress", "write",
+     db.progress_upsert_sql(['status']),
+     lambda s: (s.user_id, s.subject, 'learning')),
+    ("db.get_all_user_progress", "read", db.ALL_PROGRESS_SQL, lambda s: (s.user_id,)),
+    ("db.get_bkt_model", "read", db.BKT_MODEL_SQL, lambda s: (s.user_id, s.subject, s.topic_id)),
+    ("db.update_bkt_model", "write",
+     postgres.BKT_ANSWER_SQL,
+     lambda s: db.answer_params(s.user_id, s.subject, s.topic_id, random.random() < 0.5,
+                                random.choice([None, 'Confused assignment with comparison']))),
+    ("db.apply_learning", "write",
+     postgres.BKT_LEARNING_SQL,
+     lambda s: {'user_id': s.user_id, 'subject': s.subject, 'topic_id': s.topic_id,
+                'p_transit': db.P_TRANSIT}),
+    ("db.get_all_bkt_models_for_subject", "read",
+     postgres.BKT_PROFILE_SQL,
+     lambda s: {'user_id': s.user_id, 'subject': s.subject, 'limit': db.MISCONCEPTION_LIMIT}),
+    ("db.get_misconceptions", "read",
+     db.MISCONCEPTIONS_SQL,
+     lambda s: {'user_id': s.user_id, 'topic_id': s.topic_id, 'limit': db.MISCONCEPTION_LIMIT}),
+    ("db.seed_bkt_models", "write",
+     postgres.BKT_SEED_SQL,
+     lambda s: postgres.seed_params(s.user_id, {s.subject: 0.5})),
+    # One-row batches: a tuple parameter expands to one VALUES row, as in execute_values()
+    ("db.log_learning_event (batched)", "write",
+     postgres.event_insert_sql('learning_log', db.EVENT_TABLES['learning_log']),
+     lambda s: ((s.user_id, s.subject, s.topic_id, 'quiz_pass', '', datetime.now(timezone.utc)),)),
+    ("db.get_dashboard", "read",
+     postgres.DASHBOARD_SQL,
+     lambda s: {'user_id': s.user_id}),
+    ("db.get_mastery_rollup", "read", db.MASTERY_ROLLUP_SQL, lambda s: (s.user_id, s.subject)),
+    # --- modules/catalog.py: subjects, learning paths, content and question
+    # banks are served from memory; these run once per process and per load ---
+    ("catalog.load_catalog: topics", "read", catalog.CATALOG_TOPICS_SQL, lambda s: {}),
+    ("catalog.load_catalog: pedagogical_content", "read", catalog.CATALOG_CONTENT_SQL, lambda s: {}),
+    ("catalog.load_catalog: question_bank", "read", catalog.CATALOG_QUESTIONS_SQL, lambda s: {}),
+    # --- modules/topic_bundles.py: one query per topic visit (on a cache miss) ---
+    ("topic_bundles.get_topic_bundle", "read", topic_bundles.TOPIC_BUNDLE_SQL, lambda s: (s.topic_id,)),
+    # --- modules/psychometrics.py ---
+    ("psychometrics.log_cat_response (batched)", "write",
+     postgres.event_insert_sql('student_cat_responses', db.EVENT_TABLES['student_cat_responses']),
+     lambda s: ((s.user_id, s.question_id, 'placement', 0, True, 0.0, datetime.now(timezone.utc)),)),
+    # --- Per-user history lookups served by the new indexes ---
+    ("history: learning_log for user/subject", "read",
+     """
+     SELECT * FROM learning_log
+     WHERE user_id = %(user_id)s AND subject = %(subject)s
+     ORDER BY timestamp DESC LIMIT 50
+     """,
+     lambda s: {'user_id': s.user_id, 'subject': s.subject}),
+    ("history: CAT responses for user/test", "read",
+     """
+     SELECT * FROM student_cat_responses
+     WHERE user_id = %(user_id)s AND test_type = %(test_type)s
+     ORDER BY timestamp DESC LIMIT 50
+     """,
+     lambda s: {'user_id': s.user_id, 'test_type': s.test_type}),
+]
+
+# --- MEASUREMENT ---
+
+def load_context(conn, users):
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT user_id, subject FROM progress WHERE subject LIKE %s ORDER BY random() LIMIT 5000",
+        (BENCH_SUBJECT_PREFIX + '%',)
+    )
+    progress = [(r['user_id'], r['subject']) for r in cur.fetchall()]
+    cur.execute("SELECT subject, array_agg(id) AS ids FROM topics WHERE subject LIKE %s GROUP BY subject", (BENCH_SUBJECT_PREFIX + '%',))
+    topics = {r['subject']: r['ids'] for r in cur.fetchall()}
+    cur.execute(
+        """
+        SELECT t.subject, array_agg(q.id) AS ids
+        FROM question_bank q JOIN topics t ON t.id = q.topic_id
+        WHERE t.subject LIKE %s AND q.test_type = 'placement'
+        GROUP BY t.subject
+        """,
+        (BENCH_SUBJECT_PREFIX + '%',)
+    )
+    questions = {r['subject']: r['ids'] for r in cur.fetchall()}
+    cur.close()
+    conn.rollback()
+    if not progress:
+        raise SystemExit("No synthetic progress rows found; run without --skip-seed first.")
+    return {'progress': progress, 'topics': topics, 'questions': questions, 'users': users}
+
+def run_phase(conn, ctx, runs, drop_indexes):
+    """Measures every query inside one transaction that is rolled back at the end."""
+    cur = conn.cursor()
+    if drop_indexes:
+        for name in migrations.HOT_PATH_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+
+    results = []
+    for name, kind, sql, params_fn in QUERIES:
+        timings = []
+        for _ in range(runs):
+            params = params_fn(Sample(ctx))
+            cur.execute("SAVEPOINT bench")
+            started = time.perf_counter()
+            cur.execute(sql, params)
+            if cur.description is not None:
+                cur.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+            cur.execute("ROLLBACK TO SAVEPOINT bench")
+
+        cur.execute("SAVEPOINT bench")
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params_fn(Sample(ctx)))
+        plan = "\n".join(row[0] for row in cur.fetchall())
+        cur.execute("ROLLBACK TO SAVEPOINT bench")
+
+        timings.sort()
+        results.append({
+            'name': name,
+            'kind': kind,
+            'p50': statistics.median(timings),
+            'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            'mean': statistics.fmean(timings),
+            'plan': plan,
+        })
+    conn.rollback()
+    cur.close()
+    return results
+
+def print_report(before, after):
+    print(f"\n{'query':<52} {'kind':<6} {'p50 before':>11} {'p50 after':>10} {'p95 before':>11} {'p95 after':>10}")
+    print("-" * 104)
+    for b, a in zip(before, after):
+        print(f"{b['name']:<52} {b['kind']:<6} {b['p50']:>9.2f}ms {a['p50']:>8.2f}ms {b['p95']:>9.2f}ms {a['p95']:>8.2f}ms")
+
+def write_plans(path, before, after):
+    with open(path, 'w') as f:
+        for b, a in zip(before, after):
+            f.write(f"=== {b['name']} ===\n--- before ---\n{b['plan']}\n--- after ---\n{a['plan']}\n\n")
+    print(f"\nEXPLAIN ANALYZE plans written to {path}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app's SQL with and without the hot-path indexes.")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--subjects", type=int, default=5)
+    parser.add_argument("--topics", type=int, default=20, help="Topics per subject")
+    parser.add_argument("--questions", type=int, default=10, help="Questions per topic and test type")
+    parser.add_argument("--events", type=int, default=10, help="learning_log rows per (user, subject)")
+    parser.add_argument("--runs", type=int, default=100, help="Executions per query and phase")
+    parser.add_argument("--plans", default="bench_output.txt", help="File for EXPLAIN ANALYZE output")
+    parser.add_argument("--reset", action="store_true", help="Delete and rebuild the synthetic dataset")
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db_url = os.environ.get("BENCH_DATABASE_URL")
+    if not db_url:
+        print("BENCH_DATABASE_URL is not set. Point it at a disposable database, never at production.")
+        return 1
+
+    conn = psycopg2.connect(db_url, cursor_factory=DictCursor)
+    try:
+        migrations.migrate(conn)
+        if args.reset:
+            print("Removing previous synthetic dataset...")
+            reset_dataset(conn)
+        if not args.skip_seed:
+            # Seeded history spans the last year; give every month its partition
+            migrations.ensure_partitions(conn, months_back=13)
+            print(f"Loading synthetic dataset ({args.users} users)...")
+            seed_dataset(conn, args.users, args.subjects, args.topics, args.questions, args.events)
+
+        ctx = load_context(conn, args.users)
+        print(f"\nMeasuring {len(QUERIES)} queries x {args.runs} runs...")
+        before = run_phase(conn, ctx, args.runs, drop_indexes=True)
+        after = run_phase(conn, ctx, args.runs, drop_indexes=False)
+        print_report(before, after)
+        write_plans(args.plans, before, after)
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import os
+import sys
+import glob
+import time
+import argparse
+from datetime import datetime
+import numpy as np
+from modules import calibration, catalog_events, migrations
+from modules.backends import sqlite as sqlite_backend
+from .load_curriculum import bulk, get_db_connection, use_sqlite
+
+# Offline IRT calibration of the question banks from student_cat_responses.
+# python -m data.calibrate_items
+# Fit the 2PL, from recent responses only, and print the result without writing it:
+# python -m data.calibrate_items --model 2pl --since 2026-01-01 --dry-run
+# Include months already archived to Parquet by modules/archive.py:
+# python -m data.calibrate_items --include-archive
+#
+# Responses are streamed in chunks (through a server-side cursor on
+# PostgreSQL) into compact NumPy arrays per bank, and every (subject, test
+# type) bank is fitted by modules/calibration.py on its own ability scale,
+# one examinee per student (final exam retakes are pooled). Items with fewer
+# than --min-responses responses keep their parameters.
+#
+# A run is written in one transaction: an item_calibrations row (its id is
+# the version tag), the fitted parameters in item_calibration_params,
+# question_bank updated to them with calibration_id set, and a catalog
+# change so running app processes reload the banks.
+
+CALIBRATION_CHUNK_ROWS = 200_000   # Responses fetched per round trip
+CALIBRATION_MIN_RESPONSES = 200    # Items with fewer responses are not recalibrated
+
+CALIBRATION_QUESTIONS_SQL = """
+    SELECT q.id, t.subject, q.test_type,
+           q.irt_discrimination_a, q.irt_difficulty_b, q.irt_guessing_c
+    FROM question_bank q
+    JOIN topics t ON t.id = q.topic_id
+    WHERE NOT q.retired
+    ORDER BY q.id
+"""
+
+CALIBRATION_RESPONSES_SQL = """
+    SELECT user_id, question_id, is_correct
+    FROM student_cat_responses
+    WHERE user_id IS NOT NULL AND question_id IS NOT NULL AND is_correct IS NOT NULL
+"""
+
+def load_banks(cur):
+    """{(subject, test_type): {'question_ids', 'item_params'}} of the active questions; the current parameters are the starting values."""
+    cur.execute(CALIBRATION_QUESTIONS_SQL)
+    banks = {}
+    for question_id, subject, test_type, a, b, c in cur.fetchall():
+        bank = banks.setdefault((subject, test_type), {'question_ids': [], 'item_params': []})
+        bank['question_ids'].append(question_id)
+        # Same defaults as modules/catalog.py for missing values
+        bank['item_params'].append([
+            a if a is not None else 1.0,
+            b if b is not None else 0.0,
+            c if c is not None else 0.25,
+        ])
+    for bank in banks.values():
+        bank['question_ids'] = np.array(bank['question_ids'], dtype=np.int64)
+        bank['item_params'] = np.array(bank['item_params'], dtype=float)
+    return banks
+
+def stream_responses(conn, since=None, chunk_rows=CALIBRATION_CHUNK_ROWS):
+    """Yields (user_ids, question_ids, correct) arrays of up to chunk_rows responses."""
+    sql, params = CALIBRATION_RESPONSES_SQL, ()
+    if since is not None:
+        sql += ' AND "timestamp" >= %s'
+        params = (since,)
+    if use_sqlite():
+        cur = conn.cursor()
+    else:
+        cur = conn.cursor(name="calibration_responses")
+        cur.itersize = chunk_rows
+    try:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            data = np.array([tuple(row) for row in rows], dtype=np.int64)
+            yield data[:, 0], data[:, 1], data[:, 2].astype(bool)
+    finally:
+        cur.close()
+        conn.rollback()
+
+def stream_archived_responses(since=None, chunk_rows=CALIBRATION_CHUNK_ROWS):
+    """Same as stream_responses() for the months archived to Parquet."""
+    # Only needed with --include-archive
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from modules import archive
+
+    files = sorted(glob.glob(os.path.join(archive.ARCHIVE_DIR, 'student_cat_responses', '*.parquet')))
+    if not files:
+        return
+    schema = archive.ARCHIVE_SCHEMAS['student_cat_responses']
+    condition = ds.field('user_id').is_valid() & ds.field('question_id').is_valid() & ds.field('is_correct').is_valid()
+    if since is not None:
+        condition &= ds.field('timestamp') >= pa.scalar(pd.Timestamp(since), type=schema.field('timestamp').type)
+    dataset = ds.dataset(files, format="parquet", schema=schema)
+    for batch in dataset.to_batches(columns=['user_id', 'question_id', 'is_correct'], filter=condition, batch_size=chunk_rows):
+        if batch.num_rows:
+            yield (
+                batch.column(0).to_numpy().astype(np.int64),
+                batch.column(1).to_numpy().astype(np.int64),
+                batch.column(2).to_numpy(zero_copy_only=False).astype(bool),
+            )
+
+def split_by_bank(chunks, banks):
+    """
+    Routes streamed response chunks to their banks. Returns {key: (people,
+    items, correct, n_people)} with dense 0-based people and item indices;
+    responses to retired or unknown questions are dropped.
+    """
+    keys = list(banks)
+    if not keys:
+        return {}
+    question_ids = np.concatenate([banks[key]['question_ids'] for key in keys])
+    bank_of = np.concatenate([np.full(len(banks[key]['question_ids']), i) for i, key in enumerate(keys)])
+    item_of = np.concatenate([np.arange(len(banks[key]['question_ids'])) for key in keys])
+    order = np.argsort(question_ids)
+    question_ids, bank_of, item_of = question_ids[order], bank_of[order], item_of[order]
+
+    parts = {key: [] for key in keys}
+    for users, questions, correct in chunks:
+        position = np.minimum(np.searchsorted(question_ids, questions), len(question_ids) - 1)
+        known = question_ids[position] == questions
+        users, position, correct = users[known], position[known], correct[known]
+        for i, key in enumerate(keys):
+            in_bank = bank_of[position] == i
+            if in_bank.any():
+                parts[key].append((users[in_bank], item_of[position[in_bank]], correct[in_bank]))
+
+    responses = {}
+    for key, chunks_of_bank in parts.items():
+        if not chunks_of_bank:
+            continue
+        users, items, correct = (np.concatenate(column) for column in zip(*chunks_of_bank))
+        user_ids, people = np.unique(users, return_inverse=True)
+        responses[key] = (people, items, correct, len(user_ids))
+    return responses
+
+def calibrate_banks(banks, responses, model='3pl', min_responses=CALIBRATION_MIN_RESPONSES,
+                    max_iterations=calibration.CALIBRATION_MAX_ITERATIONS):
+    """Fits every bank with responses. Returns one summary dict per bank that had items to calibrate."""
+    fits = []
+    for key, (people, items, correct, n_people) in responses.items():
+        bank = banks[key]
+        counts = np.bincount(items, minlength=len(bank['question_ids']))
+        fixed = counts < min_responses
+        if fixed.all():
+            print(f"{key[0]} / {key[1]}: no item has {min_responses} responses yet; skipped.")
+            continue
+        started = time.perf_counter()
+        result = calibration.calibrate(people, items, correct, bank['item_params'], model, fixed, max_iterations)
+        fit = {
+            'key': key,
+            'question_ids': bank['question_ids'][~fixed],
+            'item_params': result['item_params'][~fixed],
+            'item_responses': counts[~fixed],
+            'responses': len(items),
+            'students': n_people,
+            'items': int((~fixed).sum()),
+            'iterations': result['iterations'],
+            'converged': result['converged'],
+        }
+        fits.append(fit)
+        print(
+            f"{key[0]} / {key[1]}: {fit['items']} of {len(fixed)} items from {fit['responses']} responses "
+            f"by {n_people} students, {fit['iterations']} iterations"
+            f"{'' if fit['converged'] else ' (not converged)'} in {time.perf_counter() - started:.1f}s."
+        )
+    return fits
+
+def write_calibration(conn, fits, model, since=None):
+    """Records a calibration run and applies its parameters to question_bank. Returns its id."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "INSERT INTO item_calibrations (model, responses, students, items, since) VALUES (%s, %s, %s, %s, %s) RETURNING id",
+            (model, sum(f['responses'] for f in fits), sum(f['students'] for f in fits), sum(f['items'] for f in fits), since)
+        )
+        calibration_id = cur.fetchone()[0]
+        rows = [
+            (calibration_id, int(question_id), float(b), float(a), float(c), int(count), fit['iterations'], fit['converged'])
+            for fit in fits
+            for question_id, (a, b, c), count in zip(fit['question_ids'], fit['item_params'], fit['item_responses'])
+        ]
+        bulk(
+            cur,
+            """
+            INSERT INTO item_calibration_params
+            (calibration_id, question_id, irt_difficulty_b, irt_discrimination_a, irt_guessing_c, responses, iterations, converged)
+            VALUES %s
+            """,
+            rows
+        )
+        cur.execute(
+            """
+            UPDATE question_bank SET
+                irt_difficulty_b = (SELECT p.irt_difficulty_b FROM item_calibration_params p
+                                    WHERE p.calibration_id = %(id)s AND p.question_id = question_bank.id),
+                irt_discrimination_a = (SELECT p.irt_discrimination_a FROM item_calibration_params p
+                                        WHERE p.calibration_id = %(id)s AND p.question_id = question_bank.id),
+                irt_guessing_c = (SELECT p.irt_guessing_c FROM item_calibration_params p
+                                  WHERE p.calibration_id = %(id)s AND p.question_id = question_bank.id),
+                calibration_id = %(id)s
+            WHERE id IN (SELECT question_id FROM item_calibration_params WHERE calibration_id = %(id)s)
+            """,
+            {'id': calibration_id}
+        )
+        changes = catalog_events.new_changes()
+        changes['question_banks'].update(fit['key'] for fit in fits)
+        catalog_events.publish(cur, changes, notify=not use_sqlite())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return calibration_id
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate IRT item parameters from student_cat_responses.")
+    parser.add_argument("--model", choices=calibration.MODELS, default='3pl', help="IRT model to fit")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only use responses from this date or time on")
+    parser.add_argument("--min-responses", type=int, default=CALIBRATION_MIN_RESPONSES, help="responses an item needs to be recalibrated")
+    parser.add_argument("--max-iterations", type=int, default=calibration.CALIBRATION_MAX_ITERATIONS, help="EM iterations per bank")
+    parser.add_argument("--include-archive", action="store_true", help="also read months archived to Parquet")
+    parser.add_argument("--dry-run", action="store_true", help="fit and report without writing")
+    args = parser.parse_args(argv)
+
+    conn = get_db_connection()
+    if conn is None:
+        return 1
+    try:
+        schema = sqlite_backend if use_sqlite() else migrations
+        schema.migrate(conn)
+
+        started = time.perf_counter()
+        cur = conn.cursor()
+        banks = load_banks(cur)
+        cur.close()
+        chunks = stream_responses(conn, args.since)
+        if args.include_archive:
+            chunks = (chunk for source in (stream_archived_responses(args.since), chunks) for chunk in source)
+        responses = split_by_bank(chunks, banks)
+        total = sum(len(items) for _, items, _, _ in responses.values())
+        print(f"Read {total} responses to {len(banks)} question bank(s) in {time.perf_counter() - started:.1f}s.")
+
+        fits = calibrate_banks(banks, responses, args.model, args.min_responses, args.max_iterations)
+        if not fits:
+            print("Nothing to calibrate.")
+            return 0
+        if args.dry_run:
+            print("Dry run: nothing written.")
+            return 0
+        calibration_id = write_calibration(conn, fits, args.model, args.since)
+        print(f"Calibration {calibration_id} applied to {sum(f['items'] for f in fits)} question(s).")
+        return 0
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
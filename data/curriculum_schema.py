@@ -0,0 +1,262 @@
+import json
+import hashlib
+
+# Schemas and checks for the curriculum source files, used by
+# data/load_curriculum.py before anything is written to the database.
+#
+# A schema spec is plain data:
+#   a type or tuple of types   the value must be an instance (bool is not an int)
+#   frozenset                  the value must be one of the members
+#   [spec]                     a list whose items all match spec
+#   {name: spec}               an object; a trailing '?' marks an optional field
+# compile_schema() turns a spec into a checker once, so the per-item work in
+# the worker processes is plain function calls.
+
+NUMBER = (int, float)
+
+BLOOM_LEVELS = frozenset({'Explain', 'Apply', 'Evaluate', 'Develop'})
+INTENTION_TYPES = frozenset({
+    'Lesson', 'Worked_Example', 'Socratic_Question', 'Hint_L1', 'Hint_L2',
+    'Quiz_Question_Apply', 'Quiz_Question_Eval', 'Code_Challenge', 'Simple_Explanation',
+})
+TEST_TYPES = frozenset({'placement', 'final'})
+
+CURRICULUM_SCHEMA = {
+    'subject': str,
+    'knowledge_units': [{'code': str, 'name': str, 'description?': str}],
+    'topics': [{'ku_code': str, 'name': str, 'order': int, 'prerequisites?': [str]}],
+}
+
+PEDAGOGICAL_CONTENT_SCHEMA = [{
+    'subject': str,
+    'topic_name': str,
+    'bloom_level': BLOOM_LEVELS,
+    'intention_type': INTENTION_TYPES,
+    'content': (str, dict),
+    'author_notes?': str,
+}]
+
+QUESTION_BANK_SCHEMA = [{
+    'subject': str,
+    'topic_name': str,
+    'question_text': str,
+    'options': [str],
+    'correct_option_index': int,
+    'irt_difficulty_b': NUMBER,
+    'irt_discrimination_a': NUMBER,
+    'irt_guessing_c': NUMBER,
+    'test_type': TEST_TYPES,
+}]
+
+def compile_schema(spec):
+    """Returns check(value, where) -> [error messages] for a schema spec."""
+    if isinstance(spec, dict):
+        fields = {
+            name.rstrip('?'): (name.endswith('?'), compile_schema(field_spec))
+            for name, field_spec in spec.items()
+        }
+
+        def check(value, where):
+            if not isinstance(value, dict):
+                return [f"{where}: expected an object"]
+            errors = []
+            for name, (optional, check_field) in fields.items():
+                if value.get(name) is None:
+                    if not optional:
+                        errors.append(f"{where}: missing '{name}'")
+                    continue
+                errors += check_field(value[name], f"{where}.{name}")
+            return errors
+        return check
+
+    if isinstance(spec, list):
+        check_item = compile_schema(spec[0])
+
+        def check(value, where):
+            if not isinstance(value, list):
+                return [f"{where}: expected a list"]
+            errors = []
+            for i, item in enumerate(value):
+                errors += check_item(item, f"{where}[{i}]")
+            return errors
+        return check
+
+    if isinstance(spec, frozenset):
+        allowed = ", ".join(sorted(spec))
+
+        def check(value, where):
+            if value not in spec:
+                return [f"{where}: {value!r} is not one of {allowed}"]
+            return []
+        return check
+
+    types = spec if isinstance(spec, tuple) else (spec,)
+    names = " or ".join(t.__name__ for t in types)
+
+    def check(value, where):
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            return [f"{where}: expected {names}, got {type(value).__name__}"]
+        return []
+    return check
+
+def _check_question(item, where):
+    """Value checks the schema can't express."""
+    errors = []
+    if not 0 <= item['correct_option_index'] < len(item['options']):
+        errors.append(f"{where}.correct_option_index: {item['correct_option_index']} is out of range for {len(item['options'])} options")
+    if item['irt_discrimination_a'] <= 0:
+        errors.append(f"{where}.irt_discrimination_a: must be positive")
+    if not 0 <= item['irt_guessing_c'] < 1:
+        errors.append(f"{where}.irt_guessing_c: must be in [0, 1)")
+    return errors
+
+FILE_SCHEMAS = {
+    'curriculum': CURRICULUM_SCHEMA,
+    'pedagogical_content': PEDAGOGICAL_CONTENT_SCHEMA,
+    'question_bank': QUESTION_BANK_SCHEMA,
+}
+VALUE_CHECKS = {'question_bank': _check_question}
+
+# List files are checked item by item, so one bad item doesn't hide the rest
+_CHECKERS = {
+    kind: compile_schema(spec[0] if isinstance(spec, list) else spec)
+    for kind, spec in FILE_SCHEMAS.items()
+}
+
+def parse_file(job):
+    """
+    Reads, hashes, parses and validates one source file. Runs in a worker
+    process, so it takes and returns plain picklable values:
+    (kind, path) -> {'kind', 'path', 'hash', 'data', 'positions', 'errors'}.
+    For list files `data` holds the valid items even when others failed, so
+    references can still be checked and every problem reported in one run;
+    `positions` gives each valid item's index in the file.
+    """
+    kind, path = job
+    parsed = {'kind': kind, 'path': path, 'hash': None, 'data': None, 'positions': None, 'errors': []}
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        parsed['hash'] = hashlib.sha256(raw).hexdigest()
+        data = json.loads(raw)
+    except (OSError, ValueError) as e:
+        parsed['errors'].append(f"{path}: {e}")
+        return parsed
+
+    check = _CHECKERS[kind]
+    if not isinstance(FILE_SCHEMAS[kind], list):
+        parsed['errors'] = check(data, path)
+        if not parsed['errors']:
+            parsed['data'] = data
+        return parsed
+
+    if not isinstance(data, list):
+        parsed['errors'].append(f"{path}: expected a list")
+        return parsed
+    valid, positions = [], []
+    for i, item in enumerate(data):
+        where = f"{path}[{i}]"
+        item_errors = check(item, where)
+        if not item_errors and kind in VALUE_CHECKS:
+            item_errors = VALUE_CHECKS[kind](item, where)
+        parsed['errors'] += item_errors
+        if not item_errors:
+            valid.append(item)
+            positions.append(i)
+    parsed['data'] = valid
+    parsed['positions'] = positions
+    return parsed
+
+def _check_prerequisites(path, data):
+    """Unknown, self and cyclic prerequisites of one curriculum file."""
+    errors = []
+    names = {topic['name'] for topic in data['topics']}
+    graph = {}
+    for topic in data['topics']:
+        prerequisites = topic.get('prerequisites') or []
+        for name in prerequisites:
+            if name == topic['name']:
+                errors.append(f"{path}: topic '{topic['name']}' lists itself as a prerequisite")
+            elif name not in names:
+                errors.append(f"{path}: topic '{topic['name']}' has unknown prerequisite '{name}'")
+        graph[topic['name']] = [name for name in prerequisites if name in names and name != topic['name']]
+
+    # Iterative depth-first search; a grey node reached again closes a cycle
+    WHITE, GREY, BLACK = 0, 1, 2
+    color = dict.fromkeys(graph, WHITE)
+    for root in graph:
+        if color[root] != WHITE:
+            continue
+        color[root] = GREY
+        stack = [(root, iter(graph[root]))]
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                color[node] = BLACK
+                stack.pop()
+            elif color[child] == GREY:
+                path_names = [n for n, _ in stack]
+                cycle = path_names[path_names.index(child):] + [child]
+                errors.append(f"{path}: prerequisite cycle {' -> '.join(cycle)}")
+            elif color[child] == WHITE:
+                color[child] = GREY
+                stack.append((child, iter(graph[child])))
+    return errors
+
+def resolve_references(parsed_files):
+    """
+    Checks references across files in memory: every topic's ku_code, and
+    every content item's and question's (subject, topic_name), must be
+    defined by some curriculum file; subjects, knowledge units, topics,
+    content slots and questions must not be defined twice; prerequisites
+    must name topics of the same subject and must not form a cycle.
+    Returns a list of error messages.
+    """
+    errors = []
+    subjects = {}
+    knowledge_units = {}
+    topics = set()
+
+    curricula = [p for p in parsed_files if p['kind'] == 'curriculum' and p['data'] is not None]
+    for parsed in curricula:
+        path, data = parsed['path'], parsed['data']
+        subject = data['subject']
+        if subject in subjects:
+            errors.append(f"{path}: subject '{subject}' is also defined in {subjects[subject]}")
+        subjects[subject] = path
+        for ku in data['knowledge_units']:
+            definition = (ku['name'], ku.get('description'))
+            if knowledge_units.setdefault(ku['code'], (definition, path))[0] != definition:
+                errors.append(f"{path}: knowledge unit '{ku['code']}' differs from its definition in {knowledge_units[ku['code']][1]}")
+
+    for parsed in curricula:
+        path, subject = parsed['path'], parsed['data']['subject']
+        for topic in parsed['data']['topics']:
+            if topic['ku_code'] not in knowledge_units:
+                errors.append(f"{path}: topic '{topic['name']}' refers to unknown knowledge unit '{topic['ku_code']}'")
+            if (subject, topic['name']) in topics:
+                errors.append(f"{path}: topic '{topic['name']}' is listed twice for {subject}")
+            topics.add((subject, topic['name']))
+
+    for parsed in curricula:
+        errors += _check_prerequisites(parsed['path'], parsed['data'])
+
+    item_keys = {
+        'pedagogical_content': ('bloom_level', 'intention_type'),
+        'question_bank': ('test_type', 'question_text'),
+    }
+    for parsed in parsed_files:
+        if parsed['kind'] not in item_keys or parsed['data'] is None:
+            continue
+        seen = set()
+        for i, item in zip(parsed['positions'], parsed['data']):
+            where = f"{parsed['path']}[{i}]"
+            topic = (item['subject'], item['topic_name'])
+            if topic not in topics:
+                errors.append(f"{where}: topic '{item['topic_name']}' ({item['subject']}) is not in any curriculum file")
+            key = (*topic, *(item[field] for field in item_keys[parsed['kind']]))
+            if key in seen:
+                errors.append(f"{where}: duplicate of an earlier item {key[2:]}")
+            seen.add(key)
+    return errors
@@ -1,184 +1,464 @@
 import psycopg2
 import os
+import sys
 import json
 import glob
+import time
+import hashlib
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-from modules import db
+from psycopg2.extras import execute_values
+from modules import backends, catalog_events, migrations
+from modules.backends import sqlite as sqlite_backend
+from . import curriculum_schema
 
 # Run this script to populate the DB with Generic Curriculums
 # python -m data.load_curriculum
+# Reload every file even if it is unchanged since the last run:
+# python -m data.load_curriculum --force
+# Keep running and apply edits as they are saved:
+# python -m data.load_curriculum --watch
+#
+# Every source file is parsed and validated first, in parallel, and
+# references between files are resolved in memory; a single invalid file
+# stops the run before the database is touched. Re-runs are incremental:
+# files whose hash matches loader_files are skipped, and the rest are diffed
+# against the database by stable keys, so only new, changed and removed rows
+# are written (in bulk, one statement per page, in one transaction).
+
+CURRICULUM_GLOB = "data/curriculums/*.json"
+PEDAGOGICAL_CONTENT_PATH = "data/pedagogical_content.json"
+QUESTION_BANK_PATH = "data/question_bank.json"
+LOADER_PAGE_SIZE = 1000     # Rows per multi-row statement
+WATCH_INTERVAL = 1.0       # Seconds between file checks in --watch mode
+LOADER_WORKERS = int(os.environ.get("LOADER_WORKERS", os.cpu_count() or 1))   # Parse/validate processes
+
+def use_sqlite():
+    """Same backend selection as modules/db.py: DB_BACKEND, or a sqlite:/// DATABASE_URL."""
+    return backends.selected_backend() == "sqlite"
 
 def get_db_connection():
     load_dotenv()
     db_url = os.environ.get("DATABASE_URL")
+    if use_sqlite():
+        return sqlite_backend.connect(sqlite_backend.sqlite_path_from_url(db_url) or sqlite_backend.SQLITE_PATH)
     if not db_url:
         print("DATABASE_URL not found in .env file.")
         return None
     conn = psycopg2.connect(db_url)
     return conn
 
-def load_course_from_json(cur, file_path):
+# --- Helpers ---
+
+def content_key(*parts):
+    """md5 of the parts joined by the unit separator; matches the SQL backfill in migration 6."""
+    return hashlib.md5("\x1f".join(str(p) for p in parts).encode()).hexdigest()
+
+def bulk(cur, sql, rows):
     """
-    Reads a JSON file and loads Knowledge Units and Topics for that subject.
+    Runs `sql` with its "VALUES %s" expanded to one multi-row VALUES list per
+    LOADER_PAGE_SIZE rows: execute_values on PostgreSQL, the same expansion
+    by hand on SQLite.
     """
-    try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-    except Exception as e:
-        print(f"Error reading {file_path}: {e}")
+    if not rows:
         return
-
-    subject = data.get('subject')
-    if not subject:
-        print(f"Skipping {file_path}: No 'subject' field found.")
+    if not isinstance(cur, sqlite_backend.Cursor):
+        execute_values(cur, sql, rows, page_size=LOADER_PAGE_SIZE)
         return
+    row_placeholders = "(" + ", ".join(["?"] * len(rows[0])) + ")"
+    head, tail = sqlite_backend.translate(sql).split("VALUES ?", 1)
+    for start in range(0, len(rows), LOADER_PAGE_SIZE):
+        page = rows[start:start + LOADER_PAGE_SIZE]
+        values = ", ".join([row_placeholders] * len(page))
+        cur.execute(f"{head}VALUES {values}{tail}", [v for row in page for v in row])
 
-    print(f"Processing Subject: {subject}...")
+def parse_files(jobs, workers=LOADER_WORKERS):
+    """
+    Parses and validates [(kind, path)] with curriculum_schema.parse_file,
+    spread over a process pool. Returns the parsed files in job order.
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        return [curriculum_schema.parse_file(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(curriculum_schema.parse_file, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
 
-    # 1. Load Knowledge Units
-    for ku in data.get('knowledge_units', []):
-        cur.execute(
-            "INSERT INTO knowledge_units (ku_code, ku_name, description) VALUES (%s, %s, %s) ON CONFLICT (ku_code) DO NOTHING",
-            (ku['code'], ku['name'], ku['description'])
-        )
-    
-    # 2. Load Topics
-    for topic in data.get('topics', []):
-        # Find the KU ID generic to the system
-        cur.execute("SELECT id FROM knowledge_units WHERE ku_code = %s", (topic['ku_code'],))
-        ku_row = cur.fetchone()
-        
-        if ku_row:
-            ku_id = ku_row[0]
-            cur.execute(
-                """
-                INSERT INTO topics (subject, ku_id, topic_name, topic_order) 
-                VALUES (%s, %s, %s, %s) 
-                ON CONFLICT (subject, topic_name) DO NOTHING
-                """,
-                (subject, ku_id, topic['name'], topic['order'])
-            )
-        else:
-            print(f"  [WARN] KU Code {topic['ku_code']} not found for topic {topic['name']}")
+def changed_files(cur, parsed_files, force=False):
+    """Returns {path: hash} for the files whose hash differs from the last successful load."""
+    cur.execute("SELECT path, content_hash FROM loader_files")
+    loaded = {row[0]: row[1] for row in cur.fetchall()}
+    return {
+        p['path']: p['hash'] for p in parsed_files
+        if force or loaded.get(p['path']) != p['hash']
+    }
 
-    print(f"  -> {subject} Loaded successfully.")
+def mark_loaded(cur, hashes):
+    bulk(
+        cur,
+        """
+        INSERT INTO loader_files (path, content_hash) VALUES %s
+        ON CONFLICT (path) DO UPDATE SET content_hash = EXCLUDED.content_hash, loaded_at = CURRENT_TIMESTAMP
+        """,
+        list(hashes.items())
+    )
 
-def load_pedagogical_content(cur):
-    print("Loading pedagogical content...")
-    try:
-        with open('data/pedagogical_content.json') as f:
-            content_data = json.load(f)
-    except FileNotFoundError:
-        print("data/pedagogical_content.json not found. Skipping.")
-        return
-        
-    for item in content_data:
-        # We must now match Topic Name AND Subject
-        subject = item.get('subject')
-        topic_name = item.get('topic_name')
+def get_topic_ids(cur):
+    """(subject, topic_name) -> topic id, prefetched once instead of a lookup per row."""
+    cur.execute("SELECT subject, topic_name, id FROM topics")
+    return {(row[0], row[1]): row[2] for row in cur.fetchall()}
 
-        if not subject: 
-            print(f"Skipping content for {topic_name}: No 'subject' field in JSON.")
-            continue
+# --- Loaders ---
+# Each returns a Counter of rows changed, keyed by (table, action), and adds
+# the cache keys it touched to `changes` (see catalog_events.new_changes()).
 
-        cur.execute("SELECT id FROM topics WHERE topic_name = %s AND subject = %s", (topic_name, subject))
-        topic_id_row = cur.fetchone()
-        
-        if not topic_id_row:
-            print(f"  [SKIP] Content Topic '{topic_name}' ({subject}) not found in DB.")
-            continue
-            
-        topic_id = topic_id_row[0]
+def load_courses(cur, curricula, changes):
+    """
+    Loads Knowledge Units and Topics from parsed curriculum files.
+    Topics missing from a file are reported, not deleted: student models
+    and questions hang off them.
+    """
+    stats = Counter()
+    knowledge_units = {}
+    topics = {}
+    prerequisites = set()   # (subject, topic_name, prerequisite_name)
+    for data in curricula:
+        subject = data['subject']
+        print(f"Processing Subject: {subject}...")
+        for ku in data['knowledge_units']:
+            knowledge_units[ku['code']] = (ku['name'], ku.get('description'))
+        for topic in data['topics']:
+            topics[(subject, topic['name'])] = (topic['ku_code'], topic['order'])
+            for name in topic.get('prerequisites') or []:
+                prerequisites.add((subject, topic['name'], name))
+
+    # 1. Knowledge Units
+    cur.execute("SELECT ku_code, ku_name, description FROM knowledge_units")
+    existing_kus = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+    ku_rows = [(code, *values) for code, values in knowledge_units.items() if existing_kus.get(code) != values]
+    bulk(
+        cur,
+        """
+        INSERT INTO knowledge_units (ku_code, ku_name, description) VALUES %s
+        ON CONFLICT (ku_code) DO UPDATE SET ku_name = EXCLUDED.ku_name, description = EXCLUDED.description
+        """,
+        ku_rows
+    )
+    for code, *_ in ku_rows:
+        stats['knowledge_units', 'updated' if code in existing_kus else 'inserted'] += 1
+
+    # 2. Topics
+    cur.execute("SELECT ku_code, id FROM knowledge_units")
+    ku_ids = {row[0]: row[1] for row in cur.fetchall()}
+    subjects = {subject for subject, _ in topics}
+    cur.execute("SELECT subject, topic_name, ku_id, topic_order FROM topics")
+    existing_topics = {(row[0], row[1]): (row[2], row[3]) for row in cur.fetchall() if row[0] in subjects}
+
+    topic_rows = []
+    for (subject, name), (ku_code, order) in topics.items():
+        if existing_topics.get((subject, name)) != (ku_ids[ku_code], order):
+            topic_rows.append((subject, ku_ids[ku_code], name, order))
+            changes['subjects'].add(subject)
+            stats['topics', 'updated' if (subject, name) in existing_topics else 'inserted'] += 1
+    bulk(
+        cur,
+        """
+        INSERT INTO topics (subject, ku_id, topic_name, topic_order) VALUES %s
+        ON CONFLICT (subject, topic_name) DO UPDATE SET ku_id = EXCLUDED.ku_id, topic_order = EXCLUDED.topic_order
+        """,
+        topic_rows
+    )
+    for subject, name in existing_topics.keys() - topics.keys():
+        print(f"  [WARN] Topic '{name}' ({subject}) is no longer in its curriculum file; left in place.")
+
+    # 3. Prerequisite edges of the loaded subjects, diffed like the rows above
+    topic_ids = {key: topic_id for key, topic_id in get_topic_ids(cur).items() if key[0] in subjects}
+    subject_of = {topic_id: subject for (subject, _), topic_id in topic_ids.items()}
+    wanted = {
+        (topic_ids[(subject, name)], topic_ids[(subject, prerequisite)])
+        for subject, name, prerequisite in prerequisites
+    }
+    cur.execute("SELECT topic_id, prerequisite_id FROM topic_prerequisites")
+    existing = {(row[0], row[1]) for row in cur.fetchall() if row[0] in subject_of}
+    added = list(wanted - existing)
+    removed = list(existing - wanted)
+    bulk(cur, "INSERT INTO topic_prerequisites (topic_id, prerequisite_id) VALUES %s", added)
+    bulk(cur, "DELETE FROM topic_prerequisites WHERE (topic_id, prerequisite_id) IN (VALUES %s)", removed)
+    stats['topic_prerequisites', 'inserted'] += len(added)
+    stats['topic_prerequisites', 'deleted'] += len(removed)
+    changes['subjects'].update(subject_of[topic_id] for topic_id, _ in added + removed)
+    return stats
+
+def load_pedagogical_content(cur, content_data, topic_ids, changes):
+    """Upserts new and changed content items and deletes items removed from the file."""
+    print("Loading pedagogical content...")
+    stats = Counter()
+    wanted = {}
+    for item in content_data:
+        # Matched on Topic Name AND Subject (resolved before the transaction)
+        topic_id = topic_ids[(item['subject'], item['topic_name'])]
         content = item['content']
         if isinstance(content, dict):
             content = json.dumps(content)
-            
-        cur.execute(
-            """
-            INSERT INTO pedagogical_content (topic_id, bloom_level, intention_type, content, author_notes)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (topic_id, bloom_level, intention_type) DO NOTHING
-            """,
-            (topic_id, item['bloom_level'], item['intention_type'], content, item.get('author_notes'))
-        )
-    print("Pedagogical content loaded.")
+        wanted[(topic_id, item['bloom_level'], item['intention_type'])] = (content, item.get('author_notes'))
+
+    cur.execute("SELECT topic_id, bloom_level, intention_type, content, author_notes FROM pedagogical_content")
+    existing = {(row[0], row[1], row[2]): (row[3], row[4]) for row in cur.fetchall()}
 
-def load_question_bank(cur):
+    upserts = [(*key, *values) for key, values in wanted.items() if existing.get(key) != values]
+    bulk(
+        cur,
+        """
+        INSERT INTO pedagogical_content (topic_id, bloom_level, intention_type, content, author_notes) VALUES %s
+        ON CONFLICT (topic_id, bloom_level, intention_type)
+        DO UPDATE SET content = EXCLUDED.content, author_notes = EXCLUDED.author_notes
+        """,
+        upserts
+    )
+    for topic_id, bloom_level, intention_type, *_ in upserts:
+        stats['pedagogical_content', 'updated' if (topic_id, bloom_level, intention_type) in existing else 'inserted'] += 1
+
+    removed = list(existing.keys() - wanted.keys())
+    bulk(
+        cur,
+        "DELETE FROM pedagogical_content WHERE (topic_id, bloom_level, intention_type) IN (VALUES %s)",
+        removed
+    )
+    stats['pedagogical_content', 'deleted'] += len(removed)
+    changes['content'].update(key[:3] for key in upserts)
+    changes['content'].update(removed)
+    return stats
+
+def load_question_bank(cur, bank_data, topic_ids, changes):
+    """
+    Upserts new and changed questions by content_key and retires questions
+    removed from the file (responses keep pointing at them). A retired
+    question that reappears is reactivated. The file's IRT parameters are
+    starting values: once a question has been calibrated, they are ignored.
+    """
     print("Loading question bank...")
-    try:
-        with open('data/question_bank.json') as f:
-            bank_data = json.load(f)
-    except FileNotFoundError:
-        print("data/question_bank.json not found. Skipping.")
-        return
-        
+    stats = Counter()
+    wanted = {}
     for item in bank_data:
-        subject = item.get('subject')
-        topic_name = item.get('topic_name')
+        key = content_key(item['subject'], item['topic_name'], item['test_type'], item['question_text'])
+        wanted[key] = (
+            topic_ids[(item['subject'], item['topic_name'])],
+            item['question_text'],
+            json.dumps(item['options']),
+            item['correct_option_index'],
+            item['irt_difficulty_b'],
+            item['irt_discrimination_a'],
+            item['irt_guessing_c'],
+            item['test_type'],
+            hashlib.md5(json.dumps(item, sort_keys=True).encode()).hexdigest(),
+        )
 
-        if not subject:
-            print(f"Skipping question for {topic_name}: No 'subject' field.")
-            continue
+    cur.execute(
+        """
+        SELECT q.content_key, q.content_hash, q.retired, t.subject, q.test_type
+        FROM question_bank q
+        JOIN topics t ON t.id = q.topic_id
+        WHERE q.content_key IS NOT NULL
+        """
+    )
+    rows = cur.fetchall()
+    existing = {row[0]: (row[1], bool(row[2])) for row in rows}
+    banks = {row[0]: (row[3], row[4]) for row in rows}
 
-        cur.execute("SELECT id FROM topics WHERE topic_name = %s AND subject = %s", (topic_name, subject))
-        topic_id_row = cur.fetchone()
-        
-        if not topic_id_row:
-            print(f"  [SKIP] Question Topic '{topic_name}' ({subject}) not found.")
-            continue
-            
-        topic_id = topic_id_row[0]
-        
-        cur.execute(
-            """
-            INSERT INTO question_bank 
-            (topic_id, question_text, options, correct_option_index, irt_difficulty_b, irt_discrimination_a, irt_guessing_c, test_type)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT DO NOTHING
-            """,
-            (
-                topic_id,
-                item['question_text'],
-                json.dumps(item['options']),
-                item['correct_option_index'],
-                item['irt_difficulty_b'],
-                item['irt_discrimination_a'],
-                item['irt_guessing_c'],
-                item['test_type']
-            )
-        )
-    print("Question bank loaded.")
+    # Rows are compared by content_hash: REAL columns don't round-trip exactly
+    upserts = [
+        (key, *values) for key, values in wanted.items()
+        if existing.get(key) != (values[-1], False)
+    ]
+    bulk(
+        cur,
+        """
+        INSERT INTO question_bank
+        (content_key, topic_id, question_text, options, correct_option_index,
+         irt_difficulty_b, irt_discrimination_a, irt_guessing_c, test_type, content_hash)
+        VALUES %s
+        ON CONFLICT (content_key) DO UPDATE SET
+            topic_id = EXCLUDED.topic_id,
+            question_text = EXCLUDED.question_text,
+            options = EXCLUDED.options,
+            correct_option_index = EXCLUDED.correct_option_index,
+            -- Parameters fitted by data/calibrate_items.py win over the file's
+            irt_difficulty_b = CASE WHEN question_bank.calibration_id IS NULL THEN EXCLUDED.irt_difficulty_b ELSE question_bank.irt_difficulty_b END,
+            irt_discrimination_a = CASE WHEN question_bank.calibration_id IS NULL THEN EXCLUDED.irt_discrimination_a ELSE question_bank.irt_discrimination_a END,
+            irt_guessing_c = CASE WHEN question_bank.calibration_id IS NULL THEN EXCLUDED.irt_guessing_c ELSE question_bank.irt_guessing_c END,
+            test_type = EXCLUDED.test_type,
+            content_hash = EXCLUDED.content_hash,
+            retired = false
+        """,
+        upserts
+    )
+    subject_of = {topic_id: subject for (subject, _), topic_id in topic_ids.items()}
+    for key, topic_id, *_, test_type, _hash in upserts:
+        stats['question_bank', 'updated' if key in existing else 'inserted'] += 1
+        changes['question_banks'].add((subject_of[topic_id], test_type))
 
-def main():
-    conn = get_db_connection()
-    if conn is None:
-        return
+    retired = [(key,) for key, (_, is_retired) in existing.items() if key not in wanted and not is_retired]
+    bulk(cur, "UPDATE question_bank SET retired = true WHERE content_key IN (VALUES %s)", retired)
+    stats['question_bank', 'retired'] += len(retired)
+    changes['question_banks'].update(banks[key] for (key,) in retired)
+    return stats
+
+def source_files():
+    """[(kind, path)] for every source file that exists."""
+    jobs = [('curriculum', path) for path in sorted(glob.glob(CURRICULUM_GLOB))]
+    if not jobs:
+        print("No curriculum files found in data/curriculums/")
+    for kind, path in (('pedagogical_content', PEDAGOGICAL_CONTENT_PATH), ('question_bank', QUESTION_BANK_PATH)):
+        if os.path.exists(path):
+            jobs.append((kind, path))
+        else:
+            print(f"{path} not found. Skipping.")
+    return jobs
+
+def validate_files(workers=LOADER_WORKERS):
+    """
+    Parses and validates every file, then checks references between them.
+    Returns the parsed files, or None (after printing every error) if any is invalid.
+    """
+    started = time.perf_counter()
+    parsed_files = parse_files(source_files(), workers)
+    errors = [e for p in parsed_files for e in p['errors']]
+    errors += curriculum_schema.resolve_references(parsed_files)
+    if errors:
+        print(f"Validation failed with {len(errors)} error(s); nothing was loaded:")
+        for error in errors:
+            print(f"  {error}")
+        return None
+    print(f"Validated {len(parsed_files)} file(s) in {time.perf_counter() - started:.3f}s.")
+    return parsed_files
 
-    print("Attempting to create/update tables...")
-    db.create_tables(conn)
-    
+def apply_files(conn, parsed_files, force=False):
+    """
+    Applies the changed files in one transaction and publishes the cache keys
+    they touched to running app processes. Returns (stats, skipped_files).
+    """
     cur = conn.cursor()
     try:
-        # 1. Load Curriculums from JSON files
-        json_files = glob.glob("data/curriculums/*.json")
-        if not json_files:
-            print("No curriculum files found in data/curriculums/")
-        
-        for file_path in json_files:
-            load_course_from_json(cur, file_path)
-
-        # 2. Load Content & Questions (Now with Subject check)
-        load_pedagogical_content(cur)
-        load_question_bank(cur)
-        
+        changed = changed_files(cur, parsed_files, force)
+        changed_courses = [p['data'] for p in parsed_files if p['kind'] == 'curriculum' and p['path'] in changed]
+
+        stats = Counter()
+        changes = catalog_events.new_changes()
+        if changed_courses:
+            stats += load_courses(cur, changed_courses, changes)
+
+        # New topics can make previously skipped items loadable,
+        # so a curriculum change reloads content and questions as well.
+        topic_ids = get_topic_ids(cur)
+        loaders = {'pedagogical_content': load_pedagogical_content, 'question_bank': load_question_bank}
+        for parsed in parsed_files:
+            if parsed['kind'] in loaders and (parsed['path'] in changed or changed_courses):
+                stats += loaders[parsed['kind']](cur, parsed['data'], topic_ids, changes)
+
+        if changed_courses:
+            # Topic counts may have changed: rebuild the mastery rollups
+            if use_sqlite():
+                sqlite_backend.refresh_mastery_rollups(conn)
+            else:
+                cur.execute("SELECT refresh_mastery_rollups()")
+
+        mark_loaded(cur, changed)
+        catalog_events.publish(cur, changes, notify=not use_sqlite())
         conn.commit()
-        print("\nDatabase population complete.")
-    except Exception as e:
+    except Exception:
         conn.rollback()
-        print(f"An error occurred: {e}")
+        raise
     finally:
         cur.close()
+    return stats, len(parsed_files) - len(changed)
+
+def load_once(conn, parsed_files, force=False, started=None):
+    """Applies validated files and prints a summary. Returns True on success."""
+    started = started or time.perf_counter()
+    try:
+        stats, skipped = apply_files(conn, parsed_files, force)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return False
+
+    elapsed = time.perf_counter() - started
+    print(f"\nDatabase population complete in {elapsed:.3f}s ({skipped} unchanged file(s) skipped).")
+    for (table, action), count in sorted(stats.items()):
+        print(f"  {table}: {count} {action}")
+    if not stats:
+        print("  No rows changed.")
+    return True
+
+def _file_signatures():
+    paths = glob.glob(CURRICULUM_GLOB) + [PEDAGOGICAL_CONTENT_PATH, QUESTION_BANK_PATH]
+    signatures = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        signatures[path] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+def watch(conn, workers=LOADER_WORKERS, interval=WATCH_INTERVAL):
+    """
+    Polls the source files and reloads whenever one is saved, added or
+    removed. A change is applied once the files have been stable for one
+    interval, so an editor's multi-step save is loaded once. Runs until Ctrl+C.
+    """
+    print(f"Watching data/ for changes (every {interval}s, Ctrl+C to stop)...")
+    applied = _file_signatures()
+    pending = None
+    try:
+        while True:
+            time.sleep(interval)
+            current = _file_signatures()
+            if current == applied:
+                pending = None
+                continue
+            if current != pending:
+                pending = current   # Still being written; check again next tick
+                continue
+            print(f"\n[{time.strftime('%H:%M:%S')}] Change detected.")
+            started = time.perf_counter()
+            parsed_files = validate_files(workers)
+            if parsed_files is not None:
+                load_once(conn, parsed_files, started=started)
+            # Invalid files are retried when they are saved again
+            applied, pending = current, None
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load curriculums, pedagogical content and the question bank.")
+    parser.add_argument("--force", action="store_true", help="reload files even if unchanged since the last run")
+    parser.add_argument("--workers", type=int, default=LOADER_WORKERS, help="processes used to parse and validate files")
+    parser.add_argument("--watch", action="store_true", help="keep running and apply edits as files are saved")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="seconds between checks in --watch mode")
+    args = parser.parse_args(argv)
+
+    # Bad files fail here, before a database connection is opened;
+    # --watch keeps running so they can be fixed in place
+    started = time.perf_counter()
+    parsed_files = validate_files(args.workers)
+    if parsed_files is None and not args.watch:
+        return 1
+
+    conn = get_db_connection()
+    if conn is None:
+        return 1
+    try:
+        schema = sqlite_backend if use_sqlite() else migrations
+        print("Applying schema migrations...")
+        applied = schema.migrate(conn)
+        print(f"Schema at version {schema.get_schema_version(conn)} (applied: {applied or 'none'}).")
+
+        ok = parsed_files is not None and load_once(conn, parsed_files, args.force, started)
+        if args.watch:
+            watch(conn, args.workers, args.interval)
+        return 0 if ok else 1
+    finally:
         conn.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
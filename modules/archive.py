@@ -0,0 +1,285 @@
+import os
+import re
+import sys
+import glob
+import argparse
+import functools
+import operator
+from datetime import date
+import pandas as pd
+import psycopg2
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from . import migrations
+
+# Retention job for the month-partitioned history tables.
+# Export partitions older than ARCHIVE_AFTER_MONTHS to Parquet and drop them:
+# python -m modules.archive
+# See what would be archived without changing anything:
+# python -m modules.archive --dry-run
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", os.path.join("data", "archive"))
+ARCHIVE_AFTER_MONTHS = int(os.environ.get("ARCHIVE_AFTER_MONTHS", 6))   # Months kept in PostgreSQL
+ARCHIVE_CHUNK_ROWS = 50_000     # Rows fetched and written per Parquet row group
+
+# Explicit Arrow schemas so every file (and every chunk) has identical types,
+# even when a column is entirely NULL in one month.
+ARCHIVE_SCHEMAS = {
+    'learning_log': pa.schema([
+        ('id', pa.int64()),
+        ('user_id', pa.int32()),
+        ('subject', pa.string()),
+        ('topic_id', pa.int32()),
+        ('event_type', pa.string()),
+        ('details', pa.string()),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+    ]),
+    'student_cat_responses': pa.schema([
+        ('id', pa.int64()),
+        ('user_id', pa.int32()),
+        ('question_id', pa.int32()),
+        ('test_type', pa.string()),
+        ('response_index', pa.int32()),
+        ('is_correct', pa.bool_()),
+        ('theta_estimate_after', pa.float32()),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+    ]),
+}
+
+_PARTITION_NAME = re.compile(r"_p(\d{4})_(\d{2})$")
+
+def _column_list(columns):
+    return ", ".join(f'"{name}"' for name in columns)
+
+def archive_path(table, month):
+    """Where the Parquet file for one month of a table lives."""
+    return os.path.join(ARCHIVE_DIR, table, f"{month:%Y-%m}.parquet")
+
+def list_partitions(conn, table):
+    """Returns [(partition_name, first_day_of_month)] for a table's monthly partitions, oldest first."""
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        """,
+        (table,)
+    )
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = _PARTITION_NAME.search(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    cur.close()
+    conn.rollback()
+    return sorted(partitions, key=lambda p: p[1])
+
+def _archive_cutoff(months):
+    today = date.today()
+    total = today.year * 12 + (today.month - 1) - months
+    return date(total // 12, total % 12 + 1, 1)
+
+def export_partition(conn, table, partition, month):
+    """
+    Streams one partition into a zstd-compressed Parquet file with a named
+    (server-side) cursor, then checks the file's row count against the table.
+    If the month was archived before (rows that arrived late and were split
+    out of the default partition), the archived rows are kept in the file.
+    Returns the number of rows exported from the partition.
+    """
+    schema = ARCHIVE_SCHEMAS[table]
+    path = archive_path(table, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+
+    written = 0
+    cur = conn.cursor(name=f"archive_{partition}")
+    cur.itersize = ARCHIVE_CHUNK_ROWS
+    cur.execute(f"SELECT {_column_list(schema.names)} FROM {partition} ORDER BY id")
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        if os.path.exists(path):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=ARCHIVE_CHUNK_ROWS):
+                writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+                written += batch.num_rows
+        previous = written
+        while True:
+            rows = cur.fetchmany(ARCHIVE_CHUNK_ROWS)
+            if not rows:
+                break
+            batch = pa.Table.from_pylist([dict(zip(schema.names, row)) for row in rows], schema=schema)
+            writer.write_table(batch)
+            written += len(rows)
+    cur.close()
+
+    if pq.ParquetFile(tmp_path).metadata.num_rows != written:
+        os.remove(tmp_path)
+        raise RuntimeError(f"Row count mismatch while archiving {partition}.")
+    os.replace(tmp_path, path)
+    conn.rollback()
+    return written - previous
+
+def default_partition_months(conn, table, cutoff):
+    """
+    Returns [(first_day_of_month, rows)] for rows older than `cutoff` sitting
+    in the table's default partition: months that had no partition when the
+    rows were written, or rows that arrived after their month was archived.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT date_trunc('month', "timestamp")::date AS month, COUNT(*)
+        FROM {table}_default
+        WHERE "timestamp" < %s
+        GROUP BY month
+        ORDER BY month
+        """,
+        (cutoff,)
+    )
+    months = cur.fetchall()
+    cur.close()
+    conn.rollback()
+    return months
+
+def split_default_partition(conn, table, cutoff):
+    """
+    Moves the rows older than `cutoff` out of the default partition into
+    monthly partitions (created by ensure_monthly_partitions(), see
+    migrations.py), so they are archived like any other month.
+    Returns what default_partition_months() found.
+    """
+    months = default_partition_months(conn, table, cutoff)
+    if months:
+        cur = conn.cursor()
+        # One month at a time: months in between may already be archived
+        for month, _ in months:
+            cur.execute("SELECT ensure_monthly_partitions(%s, %s, %s)", (table, month, month))
+        conn.commit()
+        cur.close()
+    return months
+
+def archive_old_partitions(conn, months=ARCHIVE_AFTER_MONTHS, dry_run=False, keep_detached=False):
+    """
+    Exports every monthly partition that ended more than `months` months ago,
+    then detaches it (and drops it unless keep_detached). Old rows in the
+    default partition are first split out into monthly partitions. Each
+    partition is handled in its own transaction, after its Parquet file is
+    safely on disk.
+    Returns [(table, partition, month, rows)]; rows is None on a dry run,
+    where old rows still in the default partition are listed under
+    <table>_default.
+    """
+    cutoff = _archive_cutoff(months)
+    archived = []
+    for table in migrations.PARTITIONED_TABLES:
+        if dry_run:
+            for month, rows in default_partition_months(conn, table, cutoff):
+                archived.append((table, f"{table}_default", month, None))
+        else:
+            split_default_partition(conn, table, cutoff)
+        for partition, month in list_partitions(conn, table):
+            if month >= cutoff:
+                continue
+            if dry_run:
+                archived.append((table, partition, month, None))
+                continue
+
+            rows = export_partition(conn, table, partition, month)
+            cur = conn.cursor()
+            cur.execute(f"ALTER TABLE {table} DETACH PARTITION {partition}")
+            if not keep_detached:
+                cur.execute(f"DROP TABLE {partition}")
+            conn.commit()
+            cur.close()
+            archived.append((table, partition, month, rows))
+    return archived
+
+# --- Reading history across PostgreSQL and the archive ---
+
+def read_history(conn, table, user_id=None, since=None, until=None, columns=None):
+    """
+    Returns the rows of a partitioned history table as one DataFrame, reading
+    archived months from Parquet and recent months from PostgreSQL, so
+    analytics code does not need to know where a month lives.
+
+    user_id, since and until (inclusive / exclusive timestamps) are pushed
+    down into both the Parquet scan and the SQL query.
+    """
+    schema = ARCHIVE_SCHEMAS[table]
+    columns = list(columns or schema.names)
+    frames = []
+
+    files = sorted(glob.glob(os.path.join(ARCHIVE_DIR, table, "*.parquet")))
+    if files:
+        timestamp_type = schema.field('timestamp').type
+        filters = []
+        if user_id is not None:
+            filters.append(ds.field('user_id') == user_id)
+        if since is not None:
+            filters.append(ds.field('timestamp') >= pa.scalar(pd.Timestamp(since), type=timestamp_type))
+        if until is not None:
+            filters.append(ds.field('timestamp') < pa.scalar(pd.Timestamp(until), type=timestamp_type))
+        condition = functools.reduce(operator.and_, filters) if filters else None
+        dataset = ds.dataset(files, format="parquet", schema=schema)
+        frames.append(dataset.to_table(columns=columns, filter=condition).to_pandas())
+
+    clauses, params = [], []
+    if user_id is not None:
+        clauses.append("user_id = %s")
+        params.append(user_id)
+    if since is not None:
+        clauses.append('"timestamp" >= %s')
+        params.append(since)
+    if until is not None:
+        clauses.append('"timestamp" < %s')
+        params.append(until)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    cur = conn.cursor()
+    cur.execute(f"SELECT {_column_list(columns)} FROM {table} {where}", params)
+    frames.append(pd.DataFrame([tuple(row) for row in cur.fetchall()], columns=columns))
+    cur.close()
+    conn.rollback()
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    history = pd.concat(frames, ignore_index=True)
+    if 'timestamp' in columns:
+        history = history.sort_values('timestamp', ignore_index=True)
+    return history
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old history partitions to Parquet.")
+    parser.add_argument("--months", type=int, default=ARCHIVE_AFTER_MONTHS, help="months of history to keep in PostgreSQL")
+    parser.add_argument("--dry-run", action="store_true", help="list partitions that would be archived")
+    parser.add_argument("--keep-detached", action="store_true", help="detach archived partitions without dropping them")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        print("DATABASE_URL not found in .env file.")
+        return 1
+
+    conn = psycopg2.connect(db_url)
+    try:
+        # Keep future months ahead of the inserts while we're here
+        migrations.ensure_partitions(conn)
+        archived = archive_old_partitions(conn, args.months, args.dry_run, args.keep_detached)
+        for table, partition, month, rows in archived:
+            if rows is None:
+                print(f"Would archive {partition} -> {archive_path(table, month)}")
+            else:
+                print(f"Archived {partition}: {rows} rows -> {archive_path(table, month)}")
+        if not archived:
+            print("Nothing to archive.")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
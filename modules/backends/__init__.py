@@ -0,0 +1,35 @@
+import os
+
+# Storage backends behind modules/db.py, chosen once per process.
+#
+# Each backend module defines a Backend class with the same interface:
+# connections and cursors, the listener's background cursor and change
+# waiter, telemetry writes, schema upgrades, and the few statements whose
+# SQL differs between engines. modules/db.py creates one instance at startup
+# and never checks which backend it has.
+#
+# postgres  modules/backends/postgres.py  pooled psycopg2 connections (default)
+# sqlite    modules/backends/sqlite.py    embedded file, one connection per thread
+
+BACKENDS = ('postgres', 'sqlite')
+
+def selected_backend():
+    """DB_BACKEND, defaulting to "sqlite" for a sqlite:/// DATABASE_URL and "postgres" otherwise."""
+    from .sqlite import sqlite_path_from_url
+    default = "sqlite" if sqlite_path_from_url(os.environ.get("DATABASE_URL")) else "postgres"
+    name = os.environ.get("DB_BACKEND", default)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND {name!r}; expected one of {BACKENDS}.")
+    return name
+
+def create(name, get_database_url, event_tables, event_batch_size, event_flush_interval):
+    """
+    Opens the named backend. get_database_url() is only called by PostgreSQL;
+    the SQLite file is the sqlite:/// DATABASE_URL, else SQLITE_PATH.
+    event_tables maps each telemetry table to its insert columns.
+    """
+    if name == 'sqlite':
+        from .sqlite import Backend, SQLITE_PATH, sqlite_path_from_url
+        return Backend(sqlite_path_from_url(os.environ.get("DATABASE_URL")) or SQLITE_PATH, event_tables)
+    from .postgres import Backend
+    return Backend(get_database_url(), event_tables, event_batch_size, event_flush_interval)
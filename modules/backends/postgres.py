@@ -0,0 +1,375 @@
+import os
+import threading
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import extensions, pool
+from psycopg2.extras import DictCursor, execute_values
+from .. import catalog_events, events, migrations
+
+# PostgreSQL backend (the default): a bounded pool of psycopg2 connections
+# shared by every session in the process, NOTIFY for catalog changes, and
+# telemetry written behind in batches.
+
+# --- Connection Pool Settings ---
+# Override per deployment via environment variables.
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 2))        # Connections opened (and warmed) at startup
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 10))       # Hard cap per process, keep below max_connections
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))  # Seconds to wait for a free connection
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of PostgreSQL connections shared by every
+    Streamlit session in this process.
+
+    Borrowers block for up to `timeout` seconds when all connections are in
+    use instead of opening new ones, so one process never holds more than
+    `maxconn` server connections. Connections are health-checked on the way
+    back in: open transactions are rolled back and broken connections are
+    discarded rather than handed to the next caller.
+    """
+
+    def __init__(self, db_url, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, db_url, cursor_factory=DictCursor)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._stats = {
+            "borrowed": 0,
+            "returned": 0,
+            "discarded": 0,
+            "timeouts": 0,
+            "in_use": 0,
+            "peak_in_use": 0,
+        }
+
+    def warm_up(self):
+        """Opens the minimum number of connections and verifies each one with a round trip."""
+        conns = [self.getconn() for _ in range(self.minconn)]
+        for conn in conns:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            self.putconn(conn)
+
+    def getconn(self):
+        """Borrows a connection, waiting for a free slot if the pool is exhausted."""
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise pool.PoolError(f"No database connection became free within {self.timeout}s (pool size {self.maxconn}).")
+        try:
+            conn = self._pool.getconn()
+            if conn.closed:
+                # The server dropped this one while it sat idle; replace it.
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["borrowed"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._stats["in_use"])
+        return conn
+
+    def putconn(self, conn):
+        """Returns a connection, resetting or discarding it depending on its health."""
+        discard = bool(conn.closed)
+        if not discard:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                # Roll back anything the borrower left open (including plain SELECTs)
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+            if not discard and conn.readonly:
+                # Session flags set by a borrower don't carry over to the next one
+                conn.readonly = None
+
+        try:
+            self._pool.putconn(conn, close=discard)
+        finally:
+            with self._lock:
+                self._stats["returned"] += 1
+                self._stats["in_use"] -= 1
+                if discard:
+                    self._stats["discarded"] += 1
+            self._slots.release()
+
+    def stats(self):
+        """Returns a snapshot of the pool counters."""
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["min_size"] = self.minconn
+        snapshot["max_size"] = self.maxconn
+        return snapshot
+
+    def close(self):
+        """Closes every connection held by the pool."""
+        self._pool.closeall()
+
+# --- Statements ---
+
+# The BKT updates below run entirely inside PostgreSQL as one UPSERT ... RETURNING,
+# so an answer costs a single round trip and concurrent submits for the same
+# topic serialize on the row lock instead of overwriting each other.
+# A missing row is created from the 0% prior; the values inserted for that case
+# are the result of applying the same update to a prior of 0.0.
+
+BKT_ANSWER_SQL = """
+    WITH answer AS (
+        INSERT INTO bkt_model AS b (user_id, subject, topic_id, prob_knows, last_assessed)
+        VALUES (%(user_id)s, %(subject)s, %(topic_id)s, 0.0, CURRENT_TIMESTAMP)
+        ON CONFLICT (user_id, subject, topic_id) DO UPDATE SET
+            prob_knows = CASE
+                WHEN %(is_correct)s::boolean THEN
+                    -- Student got it RIGHT
+                    (b.prob_knows * (1 - %(p_slip)s::real)) / (b.prob_knows * (1 - %(p_slip)s::real) + (1 - b.prob_knows) * %(p_guess)s::real)
+                ELSE
+                    -- Student got it WRONG
+                    (b.prob_knows * %(p_slip)s::real) / (b.prob_knows * %(p_slip)s::real + (1 - b.prob_knows) * (1 - %(p_guess)s::real))
+            END,
+            last_assessed = CURRENT_TIMESTAMP
+        RETURNING prob_knows
+    ),
+    -- Record the misconception once per distinct text, counting repeats
+    noted AS (
+        INSERT INTO bkt_misconceptions AS m (user_id, topic_id, text_hash, misconception)
+        SELECT %(user_id)s::int, %(topic_id)s::int, md5(%(misconception)s::text),
+               left(%(misconception)s::text, %(max_chars)s::int)
+        WHERE %(misconception)s::text IS NOT NULL
+        ON CONFLICT (user_id, topic_id, text_hash) DO UPDATE SET
+            frequency = m.frequency + 1,
+            last_seen = CURRENT_TIMESTAMP
+    ),
+    -- Keep only the most recent `keep` per student and topic (the new one included)
+    pruned AS (
+        DELETE FROM bkt_misconceptions m
+        WHERE %(misconception)s::text IS NOT NULL
+          AND m.user_id = %(user_id)s AND m.topic_id = %(topic_id)s
+          AND m.text_hash <> md5(%(misconception)s::text)
+          AND m.text_hash NOT IN (
+              SELECT text_hash FROM bkt_misconceptions
+              WHERE user_id = %(user_id)s AND topic_id = %(topic_id)s
+                AND text_hash <> md5(%(misconception)s::text)
+              ORDER BY last_seen DESC, frequency DESC
+              LIMIT GREATEST(%(keep)s::int - 1, 0)
+          )
+    )
+    SELECT prob_knows FROM answer
+"""
+
+BKT_LEARNING_SQL = """
+    INSERT INTO bkt_model AS b (user_id, subject, topic_id, prob_knows, last_assessed)
+    VALUES (%(user_id)s, %(subject)s, %(topic_id)s, %(p_transit)s::real, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id, subject, topic_id) DO UPDATE SET
+        -- P(Knows_New) = P(Knows_Old) + P(Not_Knows_Old) * P(Learns_Now)
+        prob_knows = b.prob_knows + (1 - b.prob_knows) * %(p_transit)s::real,
+        last_assessed = CURRENT_TIMESTAMP
+    RETURNING prob_knows
+"""
+
+BKT_SEED_SQL = """
+    INSERT INTO bkt_model (user_id, subject, topic_id, prob_knows)
+    SELECT %(user_id)s::int, t.subject, t.id, COALESCE(tp.prior, kp.prior, sp.prior)
+    FROM topics t
+    JOIN unnest(%(subjects)s::text[], %(subject_probs)s::real[]) AS sp(subject, prior)
+        ON sp.subject = t.subject
+    LEFT JOIN knowledge_units ku ON ku.id = t.ku_id
+    LEFT JOIN unnest(%(ku_codes)s::text[], %(ku_probs)s::real[]) AS kp(ku_code, prior)
+        ON kp.ku_code = ku.ku_code
+    LEFT JOIN unnest(%(topic_ids)s::int[], %(topic_probs)s::real[]) AS tp(topic_id, prior)
+        ON tp.topic_id = t.id
+    ON CONFLICT (user_id, subject, topic_id)
+    DO UPDATE SET prob_knows = EXCLUDED.prob_knows
+"""
+
+def seed_params(user_id, subject_priors, topic_priors=None, ku_priors=None):
+    """Builds the parallel arrays BKT_SEED_SQL unnests from the prior dicts."""
+    topic_priors = topic_priors or {}
+    ku_priors = ku_priors or {}
+    return {
+        'user_id': user_id,
+        'subjects': list(subject_priors.keys()),
+        'subject_probs': [float(p) for p in subject_priors.values()],
+        'ku_codes': list(ku_priors.keys()),
+        'ku_probs': [float(p) for p in ku_priors.values()],
+        'topic_ids': [int(t) for t in topic_priors.keys()],
+        'topic_probs': [float(p) for p in topic_priors.values()],
+    }
+
+# One row per subject in the catalog, with the student's progress row (NULL
+# when not started) and their per-topic mastery vector aggregated in SQL.
+DASHBOARD_SQL = """
+    SELECT
+        t.subject,
+        p.id AS progress_id,
+        p.irt_theta_initial,
+        p.irt_theta_final,
+        p.topic_index,
+        p.status,
+        p.assignment_score,
+        p.final_assessment_attempts,
+        COUNT(t.id) AS total_topics,
+        COALESCE(r.mastered_count, 0) AS topics_mastered,
+        COALESCE(r.mean_mastery, 0.0) AS mean_mastery,
+        r.last_activity,
+        json_agg(
+            json_build_object(
+                'topic_id', t.id,
+                'topic_name', t.topic_name,
+                'prob_knows', COALESCE(b.prob_knows, 0.0)
+            )
+            ORDER BY t.topic_order
+        ) AS topics
+    FROM topics t
+    LEFT JOIN progress p ON p.subject = t.subject AND p.user_id = %(user_id)s
+    LEFT JOIN bkt_model b ON b.topic_id = t.id AND b.user_id = %(user_id)s
+    LEFT JOIN mastery_rollup r ON r.subject = t.subject AND r.user_id = %(user_id)s
+    GROUP BY t.subject, p.id, r.user_id, r.subject
+    ORDER BY t.subject
+"""
+
+# Every topic of the subject with the student's P(Knows) (0.0 when there is no
+# BKT row yet) and their bounded, most-recent-first misconception list.
+BKT_PROFILE_SQL = """
+    SELECT 
+        t.id AS topic_id, 
+        t.topic_name, 
+        COALESCE(b.prob_knows, 0.0) AS prob_knows,
+        COALESCE(mc.misconceptions, '{}') AS misconceptions
+    FROM topics t
+    LEFT JOIN bkt_model b ON t.id = b.topic_id AND b.user_id = %(user_id)s
+    LEFT JOIN LATERAL (
+        SELECT array_agg(recent.misconception ORDER BY recent.last_seen DESC) AS misconceptions
+        FROM (
+            SELECT misconception, last_seen FROM bkt_misconceptions
+            WHERE user_id = %(user_id)s AND topic_id = t.id
+            ORDER BY last_seen DESC, frequency DESC
+            LIMIT %(limit)s
+        ) recent
+    ) mc ON true
+    WHERE t.subject = %(subject)s
+    ORDER BY t.topic_order
+"""
+
+def event_insert_sql(table, columns):
+    """The telemetry INSERT; execute_values() expands its VALUES %s to one tuple per row."""
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
+
+class Backend:
+    """modules/db.py storage on PostgreSQL; see modules/backends/__init__.py."""
+
+    name = 'postgres'
+    IntegrityError = psycopg2.IntegrityError
+    LATEST_VERSION = migrations.LATEST_VERSION
+    MIGRATE_COMMAND = "python -m modules.migrations"
+
+    def __init__(self, db_url, event_tables, event_batch_size, event_flush_interval):
+        self.db_url = db_url
+        self.event_tables = event_tables
+        self.pool = ConnectionPool(db_url)
+        self.pool.warm_up()
+        # The writer thread runs outside any Streamlit session and uses the pool directly
+        self.events = events.EventWriter(
+            self._write_event_batch,
+            batch_size=event_batch_size,
+            flush_interval=event_flush_interval,
+            # The server or the pool is unavailable; anything else is about the rows
+            transient_errors=(psycopg2.OperationalError, psycopg2.InterfaceError, pool.PoolError)
+        )
+
+    # --- Connections ---
+
+    def connect(self):
+        """Borrows a connection; hand it back with release()."""
+        return self.pool.getconn()
+
+    def release(self, conn):
+        """Returns the connection to the pool, which rolls back uncommitted work."""
+        self.pool.putconn(conn)
+
+    def set_read_only(self, conn):
+        """The next transaction starts as BEGIN READ ONLY (no extra round trip); reset by release()."""
+        conn.readonly = True
+
+    def background_cursor(self):
+        """
+        Returns cursor(): a read-only cursor for background threads, on one
+        REPEATABLE READ snapshot (errors raise; there is no session to report to).
+        """
+        conn_pool = self.pool
+
+        @contextmanager
+        def cursor():
+            conn = conn_pool.getconn()
+            conn.readonly = True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                    yield cur
+            finally:
+                conn_pool.putconn(conn)
+        return cursor
+
+    def change_waiter(self):
+        """wait(timeout) for the catalog listener: wakes on NOTIFY."""
+        return catalog_events.NotificationWaiter(self.db_url).wait
+
+    # --- Telemetry ---
+
+    def write_event(self, table, row):
+        """Queues a row for a table in event_tables; a background thread inserts them in batches."""
+        self.events.submit(table, row)
+
+    def _write_event_batch(self, table, rows):
+        """Inserts a batch of telemetry rows with one multi-row INSERT."""
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, event_insert_sql(table, self.event_tables[table]), rows, page_size=len(rows))
+            conn.commit()
+        finally:
+            self.pool.putconn(conn)
+
+    # --- Schema ---
+
+    def schema_version(self, conn):
+        return migrations.get_schema_version(conn)
+
+    def migrate(self, conn):
+        return migrations.migrate(conn)
+
+    def maintain(self, conn):
+        """Startup upkeep: keep monthly history partitions created ahead of the inserts."""
+        migrations.ensure_partitions(conn)
+
+    # --- Statements ---
+
+    def record_answer(self, cur, params):
+        """Runs BKT_ANSWER_SQL (db.answer_params()); returns the new P(Knows)."""
+        cur.execute(BKT_ANSWER_SQL, params)
+        return cur.fetchone()['prob_knows']
+
+    def apply_learning(self, cur, params):
+        cur.execute(BKT_LEARNING_SQL, params)
+        return cur.fetchone()['prob_knows']
+
+    def seed_bkt_models(self, cur, user_id, subject_priors, topic_priors, ku_priors):
+        """One INSERT ... SELECT over the unnested priors; returns the rows written."""
+        cur.execute(BKT_SEED_SQL, seed_params(user_id, subject_priors, topic_priors, ku_priors))
+        return cur.rowcount
+
+    def load_dashboard(self, cur, user_id):
+        """DASHBOARD_SQL rows, one per subject, for db.dashboard_from_rows()."""
+        cur.execute(DASHBOARD_SQL, {'user_id': user_id})
+        return cur.fetchall()
+
+    def load_bkt_profile(self, cur, user_id, subject, limit):
+        cur.execute(BKT_PROFILE_SQL, {'user_id': user_id, 'subject': subject, 'limit': limit})
+        return [dict(m) for m in cur.fetchall()]
@@ -0,0 +1,777 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Embedded storage engine for single-node installs (DB_BACKEND=sqlite).
+# modules/db.py keeps its API and runs on the Backend at the end of this file
+# when the backend is selected; only queries that use PostgreSQL-only SQL have
+# SQLite versions below. Everything else runs unchanged through the
+# translating cursor. The loader and calibration job use the connections and
+# schema directly.
+
+SQLITE_PATH = os.environ.get("SQLITE_PATH", os.path.join("data", "app.db"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))  # Wait for the single writer lock
+
+# Mirrors the PostgreSQL mastery_threshold() / db.MASTERY_THRESHOLD.
+MASTERY_THRESHOLD = 0.95
+
+# --- Type conversion ---
+# Columns are declared with these type names so values come back as Python
+# objects, the way psycopg2 returns them.
+#
+# Timestamps are stored as naive UTC text in the format of CURRENT_TIMESTAMP
+# (so stored values compare correctly as text) and read back as aware UTC
+# datetimes, like TIMESTAMPTZ. Naive datetimes passed in are taken as UTC.
+
+def _adapt_datetime(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(" ")
+
+def _convert_timestamp(value):
+    parsed = datetime.fromisoformat(value.decode())
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(dict, json.dumps)
+sqlite3.register_adapter(list, json.dumps)
+sqlite3.register_converter("JSON", json.loads)
+sqlite3.register_converter("BOOLEAN", lambda value: value not in (b"0", b""))
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+
+def sqlite_path_from_url(db_url):
+    """Returns the file path of a sqlite:///path URL, or None for other URLs."""
+    if db_url and db_url.startswith("sqlite:///"):
+        return db_url[len("sqlite:///"):]
+    return None
+
+# --- Connections & cursors ---
+
+class Row(sqlite3.Row):
+    """Rows support row[0], row['name'], row.get() and dict(row), like psycopg2's DictRow."""
+
+    def get(self, key, default=None):
+        return self[key] if key in self.keys() else default
+
+_NAMED_PARAM = re.compile(r"%\((\w+)\)s")
+
+def translate(sql):
+    """Rewrites psycopg2 placeholders (%s, %(name)s, %%) as SQLite ones (?, :name, %)."""
+    return _NAMED_PARAM.sub(r":\1", sql).replace("%s", "?").replace("%%", "%")
+
+class Cursor:
+    """Cursor accepting psycopg2-style SQL, so module queries run on both backends."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(translate(sql), params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(translate(sql), seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Connection(sqlite3.Connection):
+    """sqlite3 connection whose cursor() speaks psycopg2-style placeholders."""
+
+    def cursor(self, *args, **kwargs):
+        return Cursor(super().cursor(*args, **kwargs))
+
+def connect(path=SQLITE_PATH):
+    """Opens a WAL-mode connection with foreign keys on and Python type conversion."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(
+        path,
+        factory=Connection,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=True
+    )
+    conn.row_factory = Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")   # Durable across app crashes; WAL fsyncs on checkpoint
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    return conn
+
+class ThreadConnections:
+    """
+    One SQLite connection per thread, opened on first use. Queries run
+    in-process, so there is no pool to size: a thread simply reuses its own
+    connection, and WAL lets readers proceed while one thread writes.
+    """
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            self._local.conn = conn
+        return conn
+
+# --- Schema ---
+# Equivalent of modules/migrations.py at the same feature level, without the
+# PostgreSQL-only parts (ENUMs become CHECK constraints, JSONB becomes JSON
+# text, partitioning and advisory locks are not needed in one process).
+# The applied version is kept in PRAGMA user_version.
+
+_SCHEMA_V1 = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT UNIQUE NOT NULL,
+    hashed_password TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS progress (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    subject TEXT NOT NULL,
+    irt_theta_initial REAL,
+    irt_theta_final REAL,
+    topic_index INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'learning',
+    assignment_score INTEGER,
+    final_assessment_attempts INTEGER DEFAULT 0,
+    UNIQUE(user_id, subject)
+);
+
+CREATE TABLE IF NOT EXISTS knowledge_units (
+    id INTEGER PRIMARY KEY,
+    ku_code TEXT UNIQUE NOT NULL,
+    ku_name TEXT NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY,
+    subject TEXT NOT NULL,
+    ku_id INTEGER REFERENCES knowledge_units(id),
+    topic_name TEXT NOT NULL,
+    topic_order INTEGER,
+    UNIQUE(subject, topic_name)
+);
+
+CREATE TABLE IF NOT EXISTS pedagogical_content (
+    id INTEGER PRIMARY KEY,
+    topic_id INTEGER REFERENCES topics(id) ON DELETE CASCADE,
+    bloom_level TEXT NOT NULL CHECK (bloom_level IN ('Explain', 'Apply', 'Evaluate', 'Develop')),
+    intention_type TEXT NOT NULL CHECK (intention_type IN (
+        'Lesson', 'Worked_Example', 'Socratic_Question', 'Hint_L1', 'Hint_L2',
+        'Quiz_Question_Apply', 'Quiz_Question_Eval', 'Code_Challenge', 'Simple_Explanation'
+    )),
+    content TEXT NOT NULL,
+    author_notes TEXT,
+    UNIQUE(topic_id, bloom_level, intention_type)
+);
+
+CREATE TABLE IF NOT EXISTS question_bank (
+    id INTEGER PRIMARY KEY,
+    topic_id INTEGER REFERENCES topics(id),
+    question_text TEXT NOT NULL,
+    options JSON NOT NULL,
+    correct_option_index INTEGER NOT NULL,
+    irt_difficulty_b REAL NOT NULL DEFAULT 0.0,
+    irt_discrimination_a REAL NOT NULL DEFAULT 1.0,
+    irt_guessing_c REAL NOT NULL DEFAULT 0.25,
+    test_type TEXT DEFAULT 'placement'
+);
+
+CREATE TABLE IF NOT EXISTS student_cat_responses (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    question_id INTEGER REFERENCES question_bank(id),
+    test_type TEXT NOT NULL,
+    response_index INTEGER,
+    is_correct BOOLEAN,
+    theta_estimate_after REAL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS bkt_model (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    subject TEXT NOT NULL,
+    topic_id INTEGER REFERENCES topics(id) ON DELETE CASCADE,
+    prob_knows REAL DEFAULT 0.0,
+    last_assessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, subject, topic_id)
+);
+
+CREATE TABLE IF NOT EXISTS bkt_misconceptions (
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    topic_id INTEGER REFERENCES topics(id) ON DELETE CASCADE,
+    text_hash TEXT NOT NULL,
+    misconception TEXT NOT NULL,
+    frequency INTEGER NOT NULL DEFAULT 1,
+    first_seen TIMESTAMP NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    last_seen TIMESTAMP NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    PRIMARY KEY (user_id, topic_id, text_hash)
+);
+
+CREATE TABLE IF NOT EXISTS learning_log (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    subject TEXT NOT NULL,
+    topic_id INTEGER REFERENCES topics(id),
+    event_type TEXT NOT NULL,
+    details TEXT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS mastery_rollup (
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    subject TEXT NOT NULL,
+    total_topics INTEGER NOT NULL,
+    mastered_count INTEGER NOT NULL,
+    first_unmastered_order INTEGER,
+    first_unmastered_topic_id INTEGER,
+    mean_mastery REAL NOT NULL,
+    last_activity TIMESTAMP,
+    PRIMARY KEY (user_id, subject)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cat_responses_user_type_time ON student_cat_responses (user_id, test_type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_learning_log_user_subject_time ON learning_log (user_id, subject, timestamp);
+CREATE INDEX IF NOT EXISTS idx_question_bank_type_topic ON question_bank (test_type, topic_id);
+CREATE INDEX IF NOT EXISTS idx_topics_subject_order ON topics (subject, topic_order);
+CREATE INDEX IF NOT EXISTS idx_bkt_model_user_topic ON bkt_model (user_id, topic_id);
+CREATE INDEX IF NOT EXISTS idx_cat_responses_question ON student_cat_responses (question_id);
+CREATE INDEX IF NOT EXISTS idx_bkt_misconceptions_recent ON bkt_misconceptions (user_id, topic_id, last_seen DESC);
+"""
+
+# Recomputes the rollup rows selected by `pairs` (a query yielding user_id, subject).
+# As shipped in migration 1, before mastery_sum; see _ROLLUP_REFRESH below.
+_ROLLUP_REFRESH_V1 = f"""
+    INSERT INTO mastery_rollup (
+        user_id, subject, total_topics, mastered_count,
+        first_unmastered_order, first_unmastered_topic_id, mean_mastery, last_activity
+    )
+    SELECT
+        pair.user_id,
+        pair.subject,
+        COUNT(t.id),
+        COUNT(*) FILTER (WHERE COALESCE(b.prob_knows, 0) >= {MASTERY_THRESHOLD}),
+        MIN(t.topic_order) FILTER (WHERE COALESCE(b.prob_knows, 0) < {MASTERY_THRESHOLD}),
+        (
+            SELECT t2.id FROM topics t2
+            LEFT JOIN bkt_model b2
+                ON b2.user_id = pair.user_id AND b2.subject = pair.subject AND b2.topic_id = t2.id
+            WHERE t2.subject = pair.subject AND COALESCE(b2.prob_knows, 0) < {MASTERY_THRESHOLD}
+            ORDER BY t2.topic_order LIMIT 1
+        ),
+        AVG(COALESCE(b.prob_knows, 0)),
+        MAX(b.last_assessed)
+    FROM ({{pairs}}) AS pair
+    JOIN users u ON u.id = pair.user_id
+    JOIN topics t ON t.subject = pair.subject
+    LEFT JOIN bkt_model b
+        ON b.user_id = pair.user_id AND b.subject = pair.subject AND b.topic_id = t.id
+    WHERE true
+    GROUP BY pair.user_id, pair.subject
+    ON CONFLICT (user_id, subject) DO UPDATE SET
+        total_topics = excluded.total_topics,
+        mastered_count = excluded.mastered_count,
+        first_unmastered_order = excluded.first_unmastered_order,
+        first_unmastered_topic_id = excluded.first_unmastered_topic_id,
+        mean_mastery = excluded.mean_mastery,
+        last_activity = excluded.last_activity
+"""
+
+def _rollup_triggers():
+    # Migration 1 (replaced by migration 7): each BKT row write refreshes its (user, subject)
+    statements = []
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        refresh = _ROLLUP_REFRESH_V1.replace("{pairs}", f"SELECT {row}.user_id AS user_id, {row}.subject AS subject")
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS bkt_model_rollup_{event.lower()} "
+            f"AFTER {event} ON bkt_model BEGIN {refresh}; END;"
+        )
+    return "\n".join(statements)
+
+# Migration 7 onwards: the rollup refresh also fills mastery_sum.
+_ROLLUP_REFRESH = f"""
+    INSERT INTO mastery_rollup (
+        user_id, subject, total_topics, mastered_count,
+        first_unmastered_order, first_unmastered_topic_id, mean_mastery, mastery_sum, last_activity
+    )
+    SELECT
+        pair.user_id,
+        pair.subject,
+        COUNT(t.id),
+        COUNT(*) FILTER (WHERE COALESCE(b.prob_knows, 0) >= {MASTERY_THRESHOLD}),
+        MIN(t.topic_order) FILTER (WHERE COALESCE(b.prob_knows, 0) < {MASTERY_THRESHOLD}),
+        (
+            SELECT t2.id FROM topics t2
+            LEFT JOIN bkt_model b2
+                ON b2.user_id = pair.user_id AND b2.subject = pair.subject AND b2.topic_id = t2.id
+            WHERE t2.subject = pair.subject AND COALESCE(b2.prob_knows, 0) < {MASTERY_THRESHOLD}
+            ORDER BY t2.topic_order LIMIT 1
+        ),
+        AVG(COALESCE(b.prob_knows, 0)),
+        TOTAL(COALESCE(b.prob_knows, 0)),
+        MAX(b.last_assessed)
+    FROM ({{pairs}}) AS pair
+    JOIN users u ON u.id = pair.user_id
+    JOIN topics t ON t.subject = pair.subject
+    LEFT JOIN bkt_model b
+        ON b.user_id = pair.user_id AND b.subject = pair.subject AND b.topic_id = t.id
+    WHERE true
+    GROUP BY pair.user_id, pair.subject
+    ON CONFLICT (user_id, subject) DO UPDATE SET
+        total_topics = excluded.total_topics,
+        mastered_count = excluded.mastered_count,
+        first_unmastered_order = excluded.first_unmastered_order,
+        first_unmastered_topic_id = excluded.first_unmastered_topic_id,
+        mean_mastery = excluded.mean_mastery,
+        mastery_sum = excluded.mastery_sum,
+        last_activity = excluded.last_activity
+"""
+
+# Applies one bkt_model row change to its rollup row, like the PostgreSQL
+# apply_mastery_rollup_delta(): {old_p} / {new_p} are the P(Knows) before and
+# after (0 for no row), {row} is NEW or OLD and {assessed} the write time.
+_ROLLUP_DELTA = f"""
+    UPDATE mastery_rollup SET
+        mastered_count = mastered_count + ({{new_p}} >= {MASTERY_THRESHOLD}) - ({{old_p}} >= {MASTERY_THRESHOLD}),
+        mastery_sum = mastery_sum + {{new_p}} - {{old_p}},
+        mean_mastery = (mastery_sum + {{new_p}} - {{old_p}}) / NULLIF(total_topics, 0),
+        last_activity = CASE
+            WHEN {{assessed}} IS NULL OR last_activity >= {{assessed}} THEN last_activity
+            ELSE {{assessed}}
+        END
+    WHERE user_id = {{row}}.user_id AND subject = {{row}}.subject;
+
+    -- The first unmastered topic was just mastered: scan forward from it
+    UPDATE mastery_rollup SET (first_unmastered_order, first_unmastered_topic_id) = (
+        SELECT t.topic_order, t.id FROM topics t
+        LEFT JOIN bkt_model b
+            ON b.user_id = {{row}}.user_id AND b.subject = {{row}}.subject AND b.topic_id = t.id
+        WHERE t.subject = {{row}}.subject AND t.topic_order >= mastery_rollup.first_unmastered_order
+          AND COALESCE(b.prob_knows, 0) < {MASTERY_THRESHOLD}
+        ORDER BY t.topic_order LIMIT 1
+    )
+    WHERE user_id = {{row}}.user_id AND subject = {{row}}.subject
+      AND first_unmastered_topic_id = {{row}}.topic_id AND {{new_p}} >= {MASTERY_THRESHOLD};
+
+    -- A topic before the first unmastered one dropped below the threshold
+    UPDATE mastery_rollup SET
+        first_unmastered_order = (SELECT topic_order FROM topics WHERE id = {{row}}.topic_id),
+        first_unmastered_topic_id = {{row}}.topic_id
+    WHERE user_id = {{row}}.user_id AND subject = {{row}}.subject AND {{new_p}} < {MASTERY_THRESHOLD}
+      AND EXISTS (SELECT 1 FROM topics WHERE id = {{row}}.topic_id)
+      AND (first_unmastered_topic_id IS NULL
+           OR (SELECT topic_order FROM topics WHERE id = {{row}}.topic_id) < first_unmastered_order);
+
+    -- First write for the pair: compute its rollup in full once
+    {{refresh}};
+"""
+
+def _incremental_rollup_triggers():
+    # Migration 7: row-level triggers that apply each row's change in O(1) instead of re-aggregating
+    statements = []
+    for event, row, old_p, new_p, assessed in (
+        ("INSERT", "NEW", "0", "COALESCE(NEW.prob_knows, 0)", "NEW.last_assessed"),
+        ("UPDATE", "NEW", "COALESCE(OLD.prob_knows, 0)", "COALESCE(NEW.prob_knows, 0)", "NEW.last_assessed"),
+        ("DELETE", "OLD", "COALESCE(OLD.prob_knows, 0)", "0", "NULL"),
+    ):
+        refresh = _ROLLUP_REFRESH.replace(
+            "{pairs}",
+            f"SELECT {row}.user_id AS user_id, {row}.subject AS subject "
+            f"WHERE NOT EXISTS (SELECT 1 FROM mastery_rollup WHERE user_id = {row}.user_id AND subject = {row}.subject)"
+        )
+        body = (_ROLLUP_DELTA.replace("{old_p}", old_p).replace("{new_p}", new_p)
+                .replace("{assessed}", assessed).replace("{row}", row).replace("{refresh}", refresh))
+        statements.append(f"DROP TRIGGER IF EXISTS bkt_model_rollup_{event.lower()};")
+        statements.append(f"CREATE TRIGGER bkt_model_rollup_{event.lower()} AFTER {event} ON bkt_model BEGIN {body} END;")
+    return "\n".join(statements)
+
+# PostgreSQL migration 6 (question keys for the diffing curriculum loader)
+_LOADER_KEYS = """
+ALTER TABLE question_bank ADD COLUMN content_key TEXT;
+ALTER TABLE question_bank ADD COLUMN content_hash TEXT;
+ALTER TABLE question_bank ADD COLUMN retired BOOLEAN NOT NULL DEFAULT 0;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_question_bank_content_key ON question_bank (content_key);
+
+CREATE TABLE IF NOT EXISTS loader_files (
+    path TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    loaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+SQLITE_MIGRATIONS = [
+    (1, "Schema equivalent to PostgreSQL migrations 1-5", _SCHEMA_V1 + _rollup_triggers()),
+    (2, "Stable question keys and loader file hashes", _LOADER_KEYS),
+    (3, "Curriculum change feed for cache invalidation", """
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            id INTEGER PRIMARY KEY,
+            payload JSON NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """),
+    (4, "Topic prerequisites", """
+        CREATE TABLE IF NOT EXISTS topic_prerequisites (
+            topic_id INTEGER NOT NULL REFERENCES topics(id) ON DELETE CASCADE,
+            prerequisite_id INTEGER NOT NULL REFERENCES topics(id) ON DELETE CASCADE,
+            PRIMARY KEY (topic_id, prerequisite_id),
+            CHECK (topic_id <> prerequisite_id)
+        );
+    """),
+    (5, "Resumable CAT sessions", """
+        CREATE TABLE IF NOT EXISTS cat_sessions (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            subject TEXT NOT NULL,
+            test_type TEXT NOT NULL,
+            bank_version INTEGER NOT NULL,
+            test_length INTEGER NOT NULL,
+            item_ids JSON NOT NULL DEFAULT '[]',
+            responses BLOB NOT NULL DEFAULT x'',
+            theta REAL NOT NULL DEFAULT 0,
+            se REAL,
+            current_item_id INTEGER,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, subject, test_type)
+        );
+    """),
+    (6, "Versioned IRT item calibrations", """
+        CREATE TABLE IF NOT EXISTS item_calibrations (
+            id INTEGER PRIMARY KEY,
+            model TEXT NOT NULL CHECK (model IN ('2pl', '3pl')),
+            responses INTEGER NOT NULL,
+            students INTEGER NOT NULL,
+            items INTEGER NOT NULL,
+            since TIMESTAMP,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS item_calibration_params (
+            calibration_id INTEGER NOT NULL REFERENCES item_calibrations(id) ON DELETE CASCADE,
+            question_id INTEGER NOT NULL REFERENCES question_bank(id),
+            irt_difficulty_b REAL NOT NULL,
+            irt_discrimination_a REAL NOT NULL,
+            irt_guessing_c REAL NOT NULL,
+            responses INTEGER NOT NULL,
+            iterations INTEGER NOT NULL,
+            converged BOOLEAN NOT NULL,
+            PRIMARY KEY (calibration_id, question_id)
+        );
+        ALTER TABLE question_bank ADD COLUMN calibration_id INTEGER REFERENCES item_calibrations(id);
+    """),
+    (7, "Incremental mastery rollup from BKT row changes",
+        "ALTER TABLE mastery_rollup ADD COLUMN mastery_sum REAL NOT NULL DEFAULT 0;\n"
+        + _incremental_rollup_triggers()
+        + _ROLLUP_REFRESH.replace("{pairs}", "SELECT DISTINCT user_id, subject FROM bkt_model") + ";"),
+]
+
+LATEST_VERSION = SQLITE_MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Applies pending SQLite schema steps. Returns the list of versions applied."""
+    applied = []
+    current = get_schema_version(conn)
+    for version, _description, script in SQLITE_MIGRATIONS:
+        if version <= current:
+            continue
+        # executescript() commits first and runs the script outside any transaction,
+        # so the version bump is part of the script itself. A failing statement
+        # stops the script inside its BEGIN; roll that back so the step is all or nothing.
+        try:
+            conn.executescript(f"BEGIN; {script}\nPRAGMA user_version = {version}; COMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+def refresh_mastery_rollups(conn, subject=None):
+    """Rebuilds the rollups of every student (or one subject); run after curriculum changes."""
+    pairs = "SELECT DISTINCT user_id, subject FROM bkt_model"
+    params = ()
+    if subject is not None:
+        pairs += " WHERE subject = ?"
+        params = (subject,)
+    conn.execute(_ROLLUP_REFRESH.replace("{pairs}", pairs), params)
+
+# --- SQLite versions of PostgreSQL-specific statements ---
+
+BKT_ANSWER_SQL = """
+    INSERT INTO bkt_model AS b (user_id, subject, topic_id, prob_knows, last_assessed)
+    VALUES (:user_id, :subject, :topic_id, 0.0, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id, subject, topic_id) DO UPDATE SET
+        prob_knows = CASE
+            WHEN :is_correct THEN
+                (b.prob_knows * (1 - :p_slip)) / (b.prob_knows * (1 - :p_slip) + (1 - b.prob_knows) * :p_guess)
+            ELSE
+                (b.prob_knows * :p_slip) / (b.prob_knows * :p_slip + (1 - b.prob_knows) * (1 - :p_guess))
+        END,
+        last_assessed = CURRENT_TIMESTAMP
+    RETURNING prob_knows
+"""
+
+# SQLite has no md5(); the hash is computed in Python and passed as :text_hash.
+# last_seen keeps milliseconds so answers within one second stay ordered.
+MISCONCEPTION_UPSERT_SQL = """
+    INSERT INTO bkt_misconceptions AS m (user_id, topic_id, text_hash, misconception)
+    VALUES (:user_id, :topic_id, :text_hash, substr(:misconception, 1, :max_chars))
+    ON CONFLICT (user_id, topic_id, text_hash) DO UPDATE SET
+        frequency = m.frequency + 1,
+        last_seen = strftime('%Y-%m-%d %H:%M:%f', 'now')
+"""
+
+MISCONCEPTION_PRUNE_SQL = """
+    DELETE FROM bkt_misconceptions
+    WHERE user_id = :user_id AND topic_id = :topic_id
+      AND text_hash NOT IN (
+          SELECT text_hash FROM bkt_misconceptions
+          WHERE user_id = :user_id AND topic_id = :topic_id
+          ORDER BY (text_hash = :text_hash) DESC, last_seen DESC, frequency DESC
+          LIMIT :keep
+      )
+"""
+
+BKT_LEARNING_SQL = """
+    INSERT INTO bkt_model AS b (user_id, subject, topic_id, prob_knows, last_assessed)
+    VALUES (:user_id, :subject, :topic_id, :p_transit, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id, subject, topic_id) DO UPDATE SET
+        prob_knows = b.prob_knows + (1 - b.prob_knows) * :p_transit,
+        last_assessed = CURRENT_TIMESTAMP
+    RETURNING prob_knows
+"""
+
+BKT_SEED_SQL = """
+    INSERT INTO bkt_model (user_id, subject, topic_id, prob_knows)
+    VALUES (:user_id, :subject, :topic_id, :prior)
+    ON CONFLICT (user_id, subject, topic_id) DO UPDATE SET prob_knows = excluded.prob_knows
+"""
+
+SEED_TOPICS_SQL = """
+    SELECT t.id, t.subject, ku.ku_code
+    FROM topics t
+    LEFT JOIN knowledge_units ku ON ku.id = t.ku_id
+    WHERE t.subject IN (SELECT value FROM json_each(:subjects))
+"""
+
+BKT_PROFILE_SQL = """
+    SELECT
+        t.id AS topic_id,
+        t.topic_name,
+        COALESCE(b.prob_knows, 0.0) AS prob_knows,
+        (
+            SELECT json_group_array(recent.misconception) FROM (
+                SELECT misconception FROM bkt_misconceptions
+                WHERE user_id = :user_id AND topic_id = t.id
+                ORDER BY last_seen DESC, frequency DESC
+                LIMIT :limit
+            ) recent
+        ) AS misconceptions
+    FROM topics t
+    LEFT JOIN bkt_model b ON t.id = b.topic_id AND b.user_id = :user_id
+    WHERE t.subject = :subject
+    ORDER BY t.topic_order
+"""
+
+# One row per topic; db groups them per subject in Python (same single round trip).
+DASHBOARD_SQL = """
+    SELECT
+        t.subject,
+        p.id AS progress_id,
+        p.irt_theta_initial,
+        p.irt_theta_final,
+        p.topic_index,
+        p.status,
+        p.assignment_score,
+        p.final_assessment_attempts,
+        COALESCE(r.mastered_count, 0) AS topics_mastered,
+        COALESCE(r.mean_mastery, 0.0) AS mean_mastery,
+        r.last_activity,
+        t.id AS topic_id,
+        t.topic_name,
+        COALESCE(b.prob_knows, 0.0) AS prob_knows
+    FROM topics t
+    LEFT JOIN progress p ON p.subject = t.subject AND p.user_id = :user_id
+    LEFT JOIN bkt_model b ON b.topic_id = t.id AND b.user_id = :user_id
+    LEFT JOIN mastery_rollup r ON r.subject = t.subject AND r.user_id = :user_id
+    ORDER BY t.subject, t.topic_order
+"""
+
+# --- Backend ---
+
+class Backend:
+    """modules/db.py storage on an embedded SQLite file; see modules/backends/__init__.py."""
+
+    name = 'sqlite'
+    IntegrityError = sqlite3.IntegrityError
+    LATEST_VERSION = LATEST_VERSION
+    MIGRATE_COMMAND = "python -m data.load_curriculum"
+
+    def __init__(self, path, event_tables):
+        self.path = path
+        self.event_tables = event_tables
+        self.connections = ThreadConnections(path)
+
+    # --- Connections ---
+    # Each thread keeps one in-process connection, so there is no pool and
+    # queries cost microseconds instead of a network round trip.
+
+    def connect(self):
+        """Returns this thread's connection (opened on first use)."""
+        return self.connections.get()
+
+    def release(self, conn):
+        """Rolls back anything left uncommitted; the connection stays with its thread."""
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute("PRAGMA query_only = OFF")
+
+    def set_read_only(self, conn):
+        """Refuses writes until release() (PRAGMA query_only)."""
+        conn.execute("PRAGMA query_only = ON")
+
+    def background_cursor(self):
+        """Like the PostgreSQL version: an explicit BEGIN gives the reads one WAL snapshot."""
+        connections = self.connections
+
+        @contextmanager
+        def cursor():
+            conn = connections.get()
+            conn.execute("BEGIN")
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+                conn.rollback()
+        return cursor
+
+    def change_waiter(self):
+        # No NOTIFY in SQLite: the listener polls catalog_changes
+        return time.sleep
+
+    # --- Telemetry ---
+
+    def write_event(self, table, row):
+        """Writes the row immediately: a local insert is cheaper than batching it."""
+        columns = self.event_tables[table]
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                    row
+                )
+            conn.commit()
+        finally:
+            self.release(conn)
+
+    # --- Schema ---
+
+    def schema_version(self, conn):
+        return get_schema_version(conn)
+
+    def migrate(self, conn):
+        return migrate(conn)
+
+    def maintain(self, conn):
+        """Nothing to keep up at startup (no partitions)."""
+
+    # --- Statements ---
+
+    def record_answer(self, cur, params):
+        """
+        The BKT update and, for a wrong answer, the misconception upsert and
+        prune as separate statements in the caller's transaction.
+        """
+        cur.execute(BKT_ANSWER_SQL, params)
+        new_prob_knows = cur.fetchone()['prob_knows']
+        if params['misconception'] is not None:
+            params = dict(params, text_hash=hashlib.md5(params['misconception'].encode()).hexdigest())
+            cur.execute(MISCONCEPTION_UPSERT_SQL, params)
+            cur.execute(MISCONCEPTION_PRUNE_SQL, params)
+        return new_prob_knows
+
+    def apply_learning(self, cur, params):
+        cur.execute(BKT_LEARNING_SQL, params)
+        return cur.fetchone()['prob_knows']
+
+    def seed_bkt_models(self, cur, user_id, subject_priors, topic_priors, ku_priors):
+        """The most specific prior is chosen in Python and the rows upserted with one executemany()."""
+        topic_priors = {int(t): p for t, p in (topic_priors or {}).items()}
+        ku_priors = ku_priors or {}
+        cur.execute(SEED_TOPICS_SQL, {'subjects': list(subject_priors)})
+        rows = [
+            {
+                'user_id': user_id,
+                'subject': row['subject'],
+                'topic_id': row['id'],
+                'prior': float(topic_priors.get(row['id'], ku_priors.get(row['ku_code'], subject_priors[row['subject']]))),
+            }
+            for row in cur.fetchall()
+        ]
+        cur.executemany(BKT_SEED_SQL, rows)
+        return len(rows)
+
+    def load_dashboard(self, cur, user_id):
+        """
+        One query returning a row per topic, grouped per subject here (SQLite
+        has no json_agg ... ORDER BY) into the rows db.dashboard_from_rows() takes.
+        """
+        cur.execute(DASHBOARD_SQL, {'user_id': user_id})
+        subjects = {}
+        for row in cur.fetchall():
+            subject = subjects.get(row['subject'])
+            if subject is None:
+                subject = subjects[row['subject']] = dict(row, total_topics=0, topics=[])
+            subject['total_topics'] += 1
+            subject['topics'].append({
+                'topic_id': row['topic_id'],
+                'topic_name': row['topic_name'],
+                'prob_knows': row['prob_knows'],
+            })
+        return list(subjects.values())
+
+    def load_bkt_profile(self, cur, user_id, subject, limit):
+        cur.execute(BKT_PROFILE_SQL, {'user_id': user_id, 'subject': subject, 'limit': limit})
+        return [dict(m, misconceptions=json.loads(m['misconceptions'])) for m in cur.fetchall()]
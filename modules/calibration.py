@@ -0,0 +1,159 @@
+import numpy as np
+from .irt import THETA_GRID, THETA_MIN, THETA_MAX, prob_correct
+
+# Marginal maximum likelihood calibration of 2PL / 3PL item parameters
+# (Bock-Aitkin EM over a quadrature grid), used by the offline job in
+# data/calibrate_items.py.
+#
+# Responses are flat arrays (person index, item index, correct), sorted once
+# by person and once by item. Both steps then gather one row of a small
+# table per response (log-probabilities per item and answer, or posteriors
+# per person) and sum the rows group by group with np.add.reduceat, a block
+# of CALIBRATION_CHUNK responses at a time: each iteration is a couple of
+# passes over the responses, with memory linear in people x points.
+#
+# - E-step: each person's posterior over the grid (N(0, 1) prior), then the
+#   expected number of responses n[j, q] and correct responses r[j, q] of
+#   every item at every point.
+# - M-step: every item at once, a few Fisher-scoring steps on the expected
+#   complete-data log-likelihood, with a log-normal prior on a and a Beta
+#   prior on c to keep sparse items stable.
+
+CALIBRATION_QUADRATURE = THETA_GRID[::4]   # 41 points, step 0.2
+CALIBRATION_LOG_PRIOR = -0.5 * CALIBRATION_QUADRATURE ** 2
+CALIBRATION_MAX_ITERATIONS = 200
+CALIBRATION_TOLERANCE = 1e-3    # Largest parameter change between iterations at convergence
+SCORING_STEPS = 2               # Fisher-scoring steps per M-step
+SLOPE_PRIOR_SD = 0.5            # log(a) ~ N(0, SLOPE_PRIOR_SD)
+GUESSING_PRIOR = (5, 13)        # Beta prior on c, mode 0.25 (four options)
+SLOPE_RANGE = (0.2, 4.0)
+GUESSING_MAX = 0.5
+MODELS = ('2pl', '3pl')
+CALIBRATION_CHUNK = 100_000     # Responses gathered per block (block memory: CHUNK x 41 floats)
+
+class GroupedRows:
+    """
+    Sums of table[rows[k]] per group, for group ids given sorted. Built once
+    per ordering; sum() is called every iteration with a new table.
+    """
+
+    def __init__(self, rows, groups, n_groups, chunk=CALIBRATION_CHUNK):
+        self.rows = rows
+        self.n_groups = n_groups
+        self.blocks = []
+        for start in range(0, len(rows), chunk):
+            block = groups[start:start + chunk]
+            starts = np.flatnonzero(np.r_[True, block[1:] != block[:-1]])
+            self.blocks.append((start, start + len(block), starts, block[starts]))
+
+    def sum(self, table):
+        out = np.zeros((self.n_groups, table.shape[1]))
+        for start, end, starts, ids in self.blocks:
+            # ids are unique within a block, so += does not drop repeats
+            out[ids] += np.add.reduceat(table[self.rows[start:end]], starts, axis=0)
+        return out
+
+def expected_counts(by_person, by_answer, n_items, item_params):
+    """
+    E-step: (n, r, log_likelihood), where n[j, q] and r[j, q] are the
+    expected responses and correct responses to item j from people at
+    CALIBRATION_QUADRATURE[q], and log_likelihood is the marginal
+    log-likelihood of all responses under item_params. by_person and
+    by_answer are the GroupedRows built by calibrate().
+    """
+    a, b, c = (item_params[:, k][:, None] for k in range(3))
+    p = np.clip(prob_correct(CALIBRATION_QUADRATURE[None, :], a, b, c), 1e-9, 1.0 - 1e-9)
+    # Row 2j: log P(wrong) of item j at each point, row 2j + 1: log P(right)
+    log_answer = np.empty((2 * n_items, len(CALIBRATION_QUADRATURE)))
+    log_answer[0::2], log_answer[1::2] = np.log1p(-p), np.log(p)
+
+    log_posterior = by_person.sum(log_answer) + CALIBRATION_LOG_PRIOR
+    peak = log_posterior.max(axis=1, keepdims=True)
+    posterior = np.exp(log_posterior - peak)
+    total = posterior.sum(axis=1, keepdims=True)
+    posterior /= total
+    log_likelihood = float((np.log(total) + peak).sum())
+
+    counts = by_answer.sum(posterior)
+    r = counts[1::2]
+    return counts[0::2] + r, r, log_likelihood
+
+def maximize(n, r, item_params, model='3pl'):
+    """
+    M-step: new (a, b, c) rows for every item from the expected counts, by
+    SCORING_STEPS Fisher-scoring steps on (a, d = -a * b, c) per item, all
+    items solved at once (c stays 0 for the 2PL).
+    """
+    theta = CALIBRATION_QUADRATURE[None, :]
+    a, b, c = (item_params[:, k].copy() for k in range(3))
+    d = -a * b
+    alpha, beta = GUESSING_PRIOR
+    size = 3 if model == '3pl' else 2
+    for _ in range(SCORING_STEPS):
+        f = 1.0 / (1.0 + np.exp(-(a[:, None] * theta + d[:, None])))
+        p = np.clip(c[:, None] + (1.0 - c[:, None]) * f, 1e-9, 1.0 - 1e-9)
+        slope = (1.0 - c[:, None]) * f * (1.0 - f)
+        # dP/da, dP/dd, dP/dc at every point: items x points each
+        derivatives = [slope * theta, slope, 1.0 - f][:size]
+        residual = (r - n * p) / (p * (1.0 - p))
+        weight = n / (p * (1.0 - p))
+        grad = np.stack([(residual * dp).sum(axis=1) for dp in derivatives], axis=1)
+        info = np.stack([
+            np.stack([(weight * di * dj).sum(axis=1) for dj in derivatives], axis=1)
+            for di in derivatives
+        ], axis=1)
+        # Log-normal prior on a, Beta prior on c
+        grad[:, 0] -= np.log(a) / (a * SLOPE_PRIOR_SD ** 2)
+        info[:, 0, 0] += 1.0 / (a * SLOPE_PRIOR_SD) ** 2
+        info[:, 1, 1] += 1e-6
+        if model == '3pl':
+            grad[:, 2] += (alpha - 1) / c - (beta - 1) / (1.0 - c)
+            info[:, 2, 2] += (alpha - 1) / c ** 2 + (beta - 1) / (1.0 - c) ** 2
+        step = np.clip(np.linalg.solve(info, grad[:, :, None])[:, :, 0], -1.0, 1.0)
+        a = np.clip(a + step[:, 0], *SLOPE_RANGE)
+        d = d + step[:, 1]
+        if model == '3pl':
+            c = np.clip(c + 0.5 * step[:, 2], 1e-3, GUESSING_MAX)
+    b = np.clip(-d / a, THETA_MIN, THETA_MAX)
+    return np.column_stack([a, b, c])
+
+def calibrate(people, items, correct, item_params, model='3pl', fixed=None,
+              max_iterations=CALIBRATION_MAX_ITERATIONS, tolerance=CALIBRATION_TOLERANCE):
+    """
+    Fits the items of one bank by EM, starting from item_params (N x 3 rows
+    of a, b, c). people and items are dense 0-based indices, correct is
+    boolean, one entry per response. Items where `fixed` is True keep their
+    parameters (e.g. too few responses) but still inform the abilities.
+
+    Returns {'item_params', 'iterations', 'converged', 'log_likelihood'}.
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown IRT model {model!r}; expected one of {MODELS}.")
+    people = np.asarray(people, dtype=np.intp)
+    answers = 2 * np.asarray(items, dtype=np.intp) + np.asarray(correct, dtype=bool)
+    params = np.array(item_params, dtype=float)
+    free = ~np.asarray(fixed, dtype=bool) if fixed is not None else np.ones(len(params), dtype=bool)
+    if model == '2pl':
+        params[free, 2] = 0.0
+    n_people = int(people.max()) + 1 if len(people) else 0
+
+    order = np.argsort(people, kind='stable')
+    by_person = GroupedRows(answers[order], people[order], n_people)
+    order = np.argsort(answers, kind='stable')
+    by_answer = GroupedRows(people[order], answers[order], 2 * len(params))
+    del order
+
+    converged, iteration, log_likelihood = False, 0, None
+    while iteration < max_iterations and not converged:
+        iteration += 1
+        n, r, log_likelihood = expected_counts(by_person, by_answer, len(params), params)
+        updated = maximize(n, r, params, model)
+        change = np.abs(updated[free] - params[free]).max() if free.any() else 0.0
+        params[free] = updated[free]
+        converged = change < tolerance
+    return {
+        'item_params': params,
+        'iterations': iteration,
+        'converged': converged,
+        'log_likelihood': log_likelihood,
+    }
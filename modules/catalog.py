@@ -0,0 +1,173 @@
+import threading
+from types import MappingProxyType
+from .curriculum_graph import CurriculumGraph
+from .item_bank import build_item_bank
+
+# In-memory, versioned snapshot of the curriculum catalog: subjects, knowledge
+# units, topics (with each subject's CurriculumGraph), the index of
+# pedagogical content slots and the active question banks (as
+# modules/item_bank.py ItemBanks). Content bodies are loaded per topic by
+# modules/topic_bundles.py.
+#
+# The catalog only changes when data/load_curriculum.py runs, so each process
+# loads it once and serves every catalog read from memory. When the loader
+# publishes a change (see modules/catalog_events.py) a complete new snapshot
+# is built beside the old one and swapped in with a single assignment:
+# readers see either the old catalog or the new one, never a mix, and there
+# is no TTL to go stale. Snapshots are shared by every session and are
+# read-only (records are MappingProxyType, sequences are tuples).
+
+REMEDIAL_INTENTIONS = ('Simple_Explanation', 'Worked_Example', 'Socratic_Question', 'Hint_L1', 'Hint_L2')
+
+# The version is the id of the last published change the snapshot includes
+CATALOG_VERSION_SQL = "SELECT COALESCE(MAX(id), 0) AS version FROM catalog_changes"
+
+CATALOG_TOPICS_SQL = """
+    SELECT t.id, t.subject, t.topic_name, t.topic_order, ku.id AS ku_id, ku.ku_code, ku.ku_name
+    FROM topics t
+    JOIN knowledge_units ku ON t.ku_id = ku.id
+    ORDER BY t.subject, t.topic_order, t.id
+"""
+
+CATALOG_KNOWLEDGE_UNITS_SQL = "SELECT id, ku_code, ku_name, description FROM knowledge_units ORDER BY ku_code"
+
+CATALOG_PREREQUISITES_SQL = "SELECT topic_id, prerequisite_id FROM topic_prerequisites"
+
+CATALOG_CONTENT_SQL = "SELECT id, topic_id, bloom_level, intention_type FROM pedagogical_content ORDER BY id"
+
+CATALOG_QUESTIONS_SQL = """
+    SELECT q.id, q.topic_id, t.subject, q.test_type,
+           q.irt_difficulty_b, q.irt_discrimination_a, q.irt_guessing_c,
+           q.question_text, q.options, q.correct_option_index
+    FROM question_bank q
+    JOIN topics t ON t.id = q.topic_id
+    WHERE NOT q.retired
+    ORDER BY q.id
+"""
+
+def _record(row, fields):
+    return MappingProxyType({field: row[field] for field in fields})
+
+class Catalog:
+    """One immutable catalog snapshot. Build it with load_catalog()."""
+
+    def __init__(self, version, knowledge_units, topics, content, questions, prerequisites=()):
+        self.version = version
+        self.knowledge_units = MappingProxyType({ku['ku_code']: ku for ku in knowledge_units})
+        self.topics = MappingProxyType({t['id']: t for t in topics})
+
+        paths = {}
+        for topic in topics:
+            paths.setdefault(topic['subject'], []).append(topic)
+        self.subjects = tuple(sorted(paths))
+        self._paths = {subject: tuple(path) for subject, path in paths.items()}
+        edges = {}
+        for topic_id, prerequisite_id in prerequisites:
+            if topic_id in self.topics:
+                edges.setdefault(self.topics[topic_id]['subject'], []).append((topic_id, prerequisite_id))
+        self._graphs = {
+            subject: CurriculumGraph(subject, path, edges.get(subject, ()))
+            for subject, path in self._paths.items()
+        }
+
+        self._content = {}
+        remedial = {}
+        for item in content:
+            key = (item['topic_id'], item['bloom_level'], item['intention_type'])
+            self._content[key] = item['id']
+            if item['intention_type'] in REMEDIAL_INTENTIONS:
+                remedial.setdefault(key[:2], []).append(
+                    MappingProxyType({'intention_type': item['intention_type'], 'id': item['id']})
+                )
+        self._remedial = {key: tuple(options) for key, options in remedial.items()}
+
+        banks = {}
+        for question in questions:
+            banks.setdefault((question['subject'], question['test_type']), []).append(question)
+        self._banks = {key: build_item_bank(*key, bank, version) for key, bank in banks.items()}
+
+    def learning_path(self, subject):
+        """The subject's topics in order: records with id, topic_name, ku_code, ..."""
+        return self._paths.get(subject, ())
+
+    def graph(self, subject):
+        """The subject's CurriculumGraph (an empty one for an unknown subject)."""
+        graph = self._graphs.get(subject)
+        return graph if graph is not None else CurriculumGraph(subject, ())
+
+    def content_id(self, topic_id, bloom_level, intention_type):
+        """The id of the content item in one slot, or None if the slot is empty."""
+        return self._content.get((topic_id, bloom_level, intention_type))
+
+    def remedial_options(self, topic_id, bloom_level):
+        """{'intention_type', 'id'} records of the remedial content available for a slot."""
+        return self._remedial.get((topic_id, bloom_level), ())
+
+    def question_bank(self, subject, test_type='placement'):
+        """The active questions as an ItemBank (with its InformationTable), or None."""
+        return self._banks.get((subject, test_type))
+
+    def stats(self):
+        """Entry counts, for logging and the benchmarks."""
+        return {
+            'version': self.version,
+            'subjects': len(self.subjects),
+            'knowledge_units': len(self.knowledge_units),
+            'topics': len(self.topics),
+            'content': len(self._content),
+            'questions': sum(len(bank) for bank in self._banks.values()),
+            'question_bank_bytes': sum(bank.nbytes for bank in self._banks.values()),
+        }
+
+def get_catalog_version(cur):
+    cur.execute(CATALOG_VERSION_SQL)
+    return cur.fetchone()[0]
+
+def load_catalog(cur, version=None):
+    """Reads the whole catalog in one pass. Run on a single read snapshot so the tables agree."""
+    if version is None:
+        version = get_catalog_version(cur)
+    cur.execute(CATALOG_KNOWLEDGE_UNITS_SQL)
+    knowledge_units = [_record(row, ('id', 'ku_code', 'ku_name', 'description')) for row in cur.fetchall()]
+    cur.execute(CATALOG_TOPICS_SQL)
+    topics = [_record(row, ('id', 'subject', 'topic_name', 'topic_order', 'ku_id', 'ku_code', 'ku_name')) for row in cur.fetchall()]
+    cur.execute(CATALOG_PREREQUISITES_SQL)
+    prerequisites = [(row[0], row[1]) for row in cur.fetchall()]
+    cur.execute(CATALOG_CONTENT_SQL)
+    content = cur.fetchall()
+    cur.execute(CATALOG_QUESTIONS_SQL)
+    questions = []
+    for row in cur.fetchall():
+        question = {field: row[field] for field in ('id', 'topic_id', 'subject', 'test_type', 'question_text', 'correct_option_index')}
+        question['irt_difficulty_b'] = row['irt_difficulty_b'] if row['irt_difficulty_b'] is not None else 0.0
+        question['irt_discrimination_a'] = row['irt_discrimination_a'] if row['irt_discrimination_a'] is not None else 1.0
+        question['irt_guessing_c'] = row['irt_guessing_c'] if row['irt_guessing_c'] is not None else 0.25
+        question['options'] = tuple(row['options'])
+        questions.append(question)
+    return Catalog(version, knowledge_units, topics, content, questions, prerequisites)
+
+class CatalogStore:
+    """
+    Holds the current snapshot and replaces it when the catalog changes.
+
+    `cursor()` is a context manager yielding a cursor on one read snapshot.
+    refresh() is the catalog change callback: it rebuilds only if the
+    published version moved past the one in memory, so a burst of changes
+    read together costs one reload.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._lock = threading.Lock()
+        with cursor() as cur:
+            self.current = load_catalog(cur)
+
+    def refresh(self, change=None):
+        with self._lock:
+            with self._cursor() as cur:
+                version = get_catalog_version(cur)
+                if version == self.current.version:
+                    return False
+                catalog = load_catalog(cur, version)
+            self.current = catalog
+        return True
@@ -0,0 +1,144 @@
+import os
+import json
+import select
+import logging
+import threading
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# Curriculum change feed between the loader and running app processes.
+#
+# The loader records what it changed as one row in catalog_changes (in the
+# same transaction as the change itself) and, on PostgreSQL, sends NOTIFY on
+# CATALOG_CHANNEL with the row id. Each app process runs a CatalogListener
+# that wakes on the notification (or polls, on SQLite), reads the new rows
+# and hands their payloads to the subscribed invalidation callbacks.
+#
+# Payload: {"subjects": [subject, ...],                  topics / KUs changed
+#           "content": [[topic_id, bloom_level, intention_type], ...],
+#           "question_banks": [[subject, test_type], ...]}
+
+CATALOG_CHANNEL = "catalog_changes"
+CATALOG_POLL_INTERVAL = float(os.environ.get("CATALOG_POLL_INTERVAL", 2.0))   # Seconds between checks without NOTIFY
+CATALOG_CHANGES_KEEP = 1000    # Most recent change rows kept; older ones are pruned by the loader
+CATALOG_RETRY_MAX = 60.0       # Longest pause between retries of a change whose callback failed
+
+def new_changes():
+    """An empty change set for the loader to fill in."""
+    return {'subjects': set(), 'content': set(), 'question_banks': set()}
+
+def publish(cur, changes, notify=True):
+    """
+    Records a change set in catalog_changes and, with notify=True
+    (PostgreSQL), queues a NOTIFY that is delivered when the caller commits.
+    Returns the change id, or None if nothing changed.
+    """
+    if not any(changes.values()):
+        return None
+    payload = {name: sorted(list(key) if isinstance(key, tuple) else key for key in keys) for name, keys in changes.items()}
+    cur.execute("INSERT INTO catalog_changes (payload) VALUES (%s) RETURNING id", (json.dumps(payload),))
+    change_id = cur.fetchone()[0]
+    cur.execute("DELETE FROM catalog_changes WHERE id <= %s", (change_id - CATALOG_CHANGES_KEEP,))
+    if notify:
+        cur.execute("SELECT pg_notify(%s, %s)", (CATALOG_CHANNEL, str(change_id)))
+    return change_id
+
+class NotificationWaiter:
+    """
+    Blocks until a NOTIFY arrives on `channel` or the timeout passes, on a
+    dedicated autocommit connection (LISTEN can't share a pooled one).
+    A dropped connection is reopened on the next wait.
+    """
+
+    def __init__(self, db_url, channel=CATALOG_CHANNEL):
+        self.db_url = db_url
+        self.channel = channel
+        self._conn = None
+
+    def _connect(self):
+        conn = psycopg2.connect(self.db_url)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+        return conn
+
+    def wait(self, timeout):
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = self._connect()
+            if select.select([self._conn], [], [], timeout)[0]:
+                self._conn.poll()
+                self._conn.notifies.clear()
+        except (psycopg2.Error, OSError):
+            logger.exception("Lost the catalog notification connection; reconnecting.")
+            self._conn = None
+            select.select([], [], [], timeout)
+
+    def close(self):
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
+
+class CatalogListener:
+    """
+    Background thread that applies catalog changes published by the loader.
+
+    `read_changes(after_id)` returns [(id, payload)] for newer changes and
+    `wait(timeout)` blocks until a change may be available. Every payload is
+    passed to each subscribed callback in order. Reading by id (rather than
+    trusting the notification alone) means nothing is missed while the
+    listener reconnects.
+
+    A change is only marked applied once every callback succeeded on it. If
+    one raises, the change (and those after it) is retried with a growing
+    pause, so callbacks must be idempotent: the ones that succeeded run again.
+    """
+
+    def __init__(self, read_changes, wait, start_id=0, interval=CATALOG_POLL_INTERVAL):
+        self._read_changes = read_changes
+        self._wait = wait
+        self.interval = interval
+        self.last_id = start_id
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="catalog-listener", daemon=True)
+        self._thread.start()
+
+    def subscribe(self, callback):
+        """Registers callback(payload); safe to call more than once with the same function."""
+        with self._lock:
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+
+    def close(self):
+        self._stopping.set()
+
+    def _apply(self, changes):
+        """Runs the callbacks on each change in order; returns False at the first failure."""
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for change_id, payload in changes:
+            for callback in callbacks:
+                try:
+                    callback(payload)
+                except Exception:
+                    logger.exception("Catalog change callback %r failed on change %s; will retry.", callback, change_id)
+                    return False
+            self.last_id = change_id
+        return True
+
+    def _run(self):
+        retry_delay = self.interval
+        while not self._stopping.is_set():
+            self._wait(self.interval)
+            try:
+                changes = self._read_changes(self.last_id)
+            except Exception:
+                logger.exception("Reading catalog changes failed; will retry.")
+                continue
+            if self._apply(changes):
+                retry_delay = self.interval
+            else:
+                self._stopping.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, CATALOG_RETRY_MAX)
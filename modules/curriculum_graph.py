@@ -0,0 +1,98 @@
+from types import MappingProxyType
+
+class CurriculumGraph:
+    """
+    Navigation structure of one subject, built once per catalog snapshot
+    (see Catalog.graph()) and shared read-only by every session.
+
+    Topics keep their flat topic_order for next/previous navigation. A
+    curriculum file may also give topics `prerequisites`; those edges form a
+    DAG (cycles are rejected by the loader) used for locking:
+
+    - a topic at or before the student's frontier (first unmastered topic)
+      is unlocked, as in a purely linear path;
+    - a topic after it is unlocked once all of its prerequisites are
+      mastered, so branches of the DAG can be started out of order.
+
+    Everything is precomputed in dicts, so position, next/previous, KU,
+    prerequisite and unlock lookups are O(1) for any number of topics.
+    """
+
+    def __init__(self, subject, topics, prerequisites=()):
+        self.subject = subject
+        self.topics = tuple(topics)
+        self.topic_ids = tuple(t['id'] for t in self.topics)
+        self.by_id = MappingProxyType({t['id']: t for t in self.topics})
+        self.position = MappingProxyType({topic_id: i for i, topic_id in enumerate(self.topic_ids)})
+        self.next_id = MappingProxyType(dict(zip(self.topic_ids, self.topic_ids[1:] + (None,))))
+        self.previous_id = MappingProxyType(dict(zip(self.topic_ids, (None,) + self.topic_ids[:-1])))
+
+        ku_groups = {}
+        for topic in self.topics:
+            ku_groups.setdefault(topic['ku_code'], []).append(topic['id'])
+        self.ku_groups = MappingProxyType({ku: tuple(ids) for ku, ids in ku_groups.items()})
+
+        required = {topic_id: set() for topic_id in self.topic_ids}
+        unlocks = {topic_id: set() for topic_id in self.topic_ids}
+        for topic_id, prerequisite_id in prerequisites:
+            if topic_id in required and prerequisite_id in required:
+                required[topic_id].add(prerequisite_id)
+                unlocks[prerequisite_id].add(topic_id)
+        # Sorted by position, so callers listing them need no sort of their own
+        self.prerequisites = MappingProxyType({
+            topic_id: tuple(sorted(ids, key=self.position.__getitem__)) for topic_id, ids in required.items()
+        })
+        self.unlocks = MappingProxyType({
+            topic_id: tuple(sorted(ids, key=self.position.__getitem__)) for topic_id, ids in unlocks.items()
+        })
+        self._gated = tuple(topic_id for topic_id in self.topic_ids if required[topic_id])
+
+    def __len__(self):
+        return len(self.topics)
+
+    def __contains__(self, topic_id):
+        return topic_id in self.by_id
+
+    @property
+    def first_id(self):
+        return self.topic_ids[0] if self.topic_ids else None
+
+    @property
+    def last_id(self):
+        return self.topic_ids[-1] if self.topic_ids else None
+
+    def next_topic(self, topic_id):
+        """The record after topic_id in topic order, or None at the end (or for an unknown id)."""
+        next_id = self.next_id.get(topic_id)
+        return self.by_id[next_id] if next_id is not None else None
+
+    def previous_topic(self, topic_id):
+        """The record before topic_id in topic order, or None at the start (or for an unknown id)."""
+        previous_id = self.previous_id.get(topic_id)
+        return self.by_id[previous_id] if previous_id is not None else None
+
+    def frontier(self, first_unmastered_topic_id, subject_mastered=False):
+        """
+        The topic the student should work on, from their mastery rollup:
+        the last topic once the subject is mastered, else the rollup's first
+        unmastered topic (the first topic if the rollup names none we know).
+        """
+        if subject_mastered:
+            return self.last_id
+        if first_unmastered_topic_id in self.by_id:
+            return first_unmastered_topic_id
+        return self.first_id
+
+    def unlocked(self, frontier_id, mastered_ids=()):
+        """
+        The set of unlocked topic ids for a student, given their frontier and
+        the ids of the topics they have mastered. Build it once per render and
+        test membership per topic.
+        """
+        frontier_position = self.position.get(frontier_id, 0)
+        unlocked = set(self.topic_ids[:frontier_position + 1])
+        mastered_ids = mastered_ids if isinstance(mastered_ids, (set, frozenset)) else set(mastered_ids)
+        for topic_id in self._gated:
+            if self.position[topic_id] > frontier_position and all(p in mastered_ids for p in self.prerequisites[topic_id]):
+                unlocked.add(topic_id)
+        return unlocked
@@ -1,530 +1,658 @@
 import streamlit as st
-import psycopg2
 import os
-import json
-import hashlib
-from psycopg2.extras import DictCursor
+from contextlib import contextmanager
+from datetime import datetime, timezone
 import numpy as np
+from . import backends, catalog, catalog_events, student_cache, topic_bundles
 
 # --- BKT Model Parameters (Research-Backed) ---
 # These are your model's "assumptions" about learning.
 P_TRANSIT = 0.15  # Probability of learning (transitioning) after an activity
 P_GUESS = 0.20    # Probability of guessing a correct answer
 P_SLIP = 0.10     # Probability of making a mistake even if you know it
+MASTERY_THRESHOLD = 0.95  # A topic counts as mastered at this P(Knows); mirrored by SQL mastery_threshold()
+
+# --- Misconception Memory ---
+MISCONCEPTION_LIMIT = int(os.environ.get("MISCONCEPTION_LIMIT", 5))            # Kept per student and topic, most recent first
+MISCONCEPTION_MAX_CHARS = int(os.environ.get("MISCONCEPTION_MAX_CHARS", 500))  # Longer explanations are truncated
+if MISCONCEPTION_LIMIT < 1:
+    # The misconception just recorded is always kept
+    raise ValueError(f"MISCONCEPTION_LIMIT must be at least 1, got {MISCONCEPTION_LIMIT}.")
+
+# --- Telemetry Write-Behind Settings ---
+EVENT_BATCH_SIZE = int(os.environ.get("EVENT_BATCH_SIZE", 200))             # Rows per batched INSERT
+EVENT_FLUSH_INTERVAL = float(os.environ.get("EVENT_FLUSH_INTERVAL", 1.0))   # Max seconds a row waits in memory
+
+# Append-only tables written through the event buffer, with their insert columns.
+EVENT_TABLES = {
+    'learning_log': ('user_id', 'subject', 'topic_id', 'event_type', 'details', 'timestamp'),
+    'student_cat_responses': ('user_id', 'question_id', 'test_type', 'response_index', 'is_correct', 'theta_estimate_after', 'timestamp'),
+}
+
+# --- Student Model Cache Settings ---
+STUDENT_CACHE_MAX_ENTRIES = int(os.environ.get("STUDENT_CACHE_MAX_ENTRIES", 5000))  # LRU bound per process
+STUDENT_CACHE_TTL = float(os.environ.get("STUDENT_CACHE_TTL", 60))  # Seconds; bounds staleness from other processes' writes
+
+# Apply pending schema migrations when the app starts (set to 0 to require the CLI).
+DB_AUTO_MIGRATE = os.environ.get("DB_AUTO_MIGRATE", "1") == "1"
+
+# --- Storage Backend ---
+# "postgres" (default) or "sqlite" for single-node installs. A sqlite:///path
+# DATABASE_URL selects the embedded backend as well (see modules/backends).
+DB_BACKEND = backends.selected_backend()
+
+def get_database_url():
+    """Reads the DATABASE_URL from the environment or Streamlit Secrets."""
+    # Use os.environ.get for flexibility (local.env or Streamlit Secrets)
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        # Access the secret key, not the whole object
+        db_url = st.secrets["DATABASE_URL"]
+    return db_url
+
+@st.cache_resource(show_spinner=False)
+def get_backend():
+    """
+    Opens the storage backend once per process (the PostgreSQL pool is
+    created and warmed up here). Streamlit shares this single instance across
+    all sessions and reruns.
+    """
+    return backends.create(DB_BACKEND, get_database_url, EVENT_TABLES, EVENT_BATCH_SIZE, EVENT_FLUSH_INTERVAL)
 
 def get_db_connection():
-    """Establishes a connection to the PostgreSQL database."""
+    """
+    Borrows a connection (from the pool, or this thread's SQLite connection).
+    Every borrowed connection must be handed back with release_db_connection().
+    """
     try:
-        # Use os.environ.get for flexibility (local.env or Streamlit Secrets)
-        db_url = os.environ.get("DATABASE_URL")
-        if not db_url:
-            # Access the secret key, not the whole object
-            db_url = st.secrets["DATABASE_URL"]
-            
-        conn = psycopg2.connect(db_url)
-        conn.cursor_factory = DictCursor
-        return conn
+        return get_backend().connect()
     except Exception as e:
-        st.error(f"Error connecting to database. Make sure your DATABASE_URL is set. Error: {e}")
+        st.error(f"Error connecting to the {DB_BACKEND} database. Make sure DATABASE_URL (or SQLITE_PATH) is set. Error: {e}")
         st.stop()
 
-def create_tables(conn): # <--- Accepts 'conn'
-    """Creates the necessary tables if they don't exist."""
+def release_db_connection(conn):
+    """Returns a borrowed connection; uncommitted work is rolled back."""
+    get_backend().release(conn)
+
+@contextmanager
+def db_cursor(commit=False, read_only=False):
+    """
+    Yields a cursor on a borrowed connection and hands the connection back
+    afterwards. Commits on success when commit=True. With read_only=True the
+    transaction cannot write (BEGIN READ ONLY, or PRAGMA query_only), so a
+    read path can never write by accident. Uncommitted work is rolled back.
+    """
+    conn = get_db_connection()
+    if read_only:
+        get_backend().set_read_only(conn)
     cur = conn.cursor()
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            hashed_password TEXT NOT NULL
-        )
-    ''')
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS progress (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            subject TEXT NOT NULL,
-            
-            -- OLD level (e.g., "beginner") is replaced by IRT score
-            -- NEW: Store the IRT "theta" (ability) score
-            irt_theta_initial REAL,
-            irt_theta_final REAL,
-            
-            topic_index INTEGER DEFAULT 0, -- This is now legacy, BKT is primary
-            status TEXT DEFAULT 'learning', -- learning, assessing, completed
-            assignment_score INTEGER,
-
-            final_assessment_attempts INTEGER DEFAULT 0,    
-            
-            UNIQUE(user_id, subject)
-        )
-    ''')
+    try:
+        yield cur
+        if commit:
+            conn.commit()
+    finally:
+        cur.close()
+        release_db_connection(conn)
 
-    # ---
-    # --- SECTION 2: CURRICULUM & PEDAGOGY (REFACTOR)
-    # ---
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS knowledge_units (
-            id SERIAL PRIMARY KEY,
-            ku_code TEXT UNIQUE NOT NULL, -- e.g., "SDF-Fundamentals"
-            ku_name TEXT NOT NULL,
-            description TEXT
-        )
-    ''')
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS topics (
-            id SERIAL PRIMARY KEY,
-            subject TEXT NOT NULL,        -- e.g., "C"
-            ku_id INTEGER REFERENCES knowledge_units(id),
-            topic_name TEXT NOT NULL,
-            topic_order INTEGER, -- Used to order the path
-            UNIQUE(subject, topic_name)
-        )
-    ''')
-    
-    # --- Create ENUM types *only if* they don't exist
-    cur.execute("SELECT 1 FROM pg_type WHERE typname = 'bloom_level'")
-    if cur.fetchone() is None:
-        cur.execute('''
-            CREATE TYPE bloom_level AS ENUM (
-                'Explain',    -- (Bloom: Remember/Understand)
-                'Apply',      -- (Bloom: Understand/Apply)
-                'Evaluate',   -- (Bloom: Analyze/Evaluate)
-                'Develop'     -- (Bloom: Create)
-            )
-        ''')
-        
-    cur.execute("SELECT 1 FROM pg_type WHERE typname = 'intention_type'")
-    if cur.fetchone() is None:
-        cur.execute('''
-            CREATE TYPE intention_type AS ENUM (
-                'Lesson',               -- Main teaching content
-                'Worked_Example',       -- A fully solved problem
-                'Socratic_Question',    -- A guided question
-                'Hint_L1',              -- A vague hint
-                'Hint_L2',              -- A specific hint
-                'Quiz_Question_Apply',  -- An "Apply" level MCQ
-                'Quiz_Question_Eval',   -- An "Evaluate" level MCQ
-                'Code_Challenge',       -- A problem statement
-                'Simple_Explanation'    -- A simpler explanation
-            )
-        ''')
-
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS pedagogical_content (
-            id SERIAL PRIMARY KEY,
-            topic_id INTEGER REFERENCES topics(id) ON DELETE CASCADE,
-            bloom_level bloom_level NOT NULL,
-            intention_type intention_type NOT NULL,
-            content TEXT NOT NULL, -- This is the Markdown, code, or JSON
-            author_notes TEXT,
-            UNIQUE(topic_id, bloom_level, intention_type)
-        )
-    ''')
+def queue_event(table, *values):
+    """
+    Queues one row for an append-only table in EVENT_TABLES.
+    The row's timestamp is taken now, not when the batch is written.
+    """
+    get_backend().write_event(table, (*values, datetime.now(timezone.utc)))
 
-    # ---
-    # --- SECTION 3: PSYCHOMETRICS (IRT/CAT)
-    # ---
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS question_bank (
-            id SERIAL PRIMARY KEY,
-            topic_id INTEGER REFERENCES topics(id),
-            question_text TEXT NOT NULL,
-            options JSONB NOT NULL, -- e.g., ["A", "B", "C"]
-            correct_option_index INTEGER NOT NULL, -- e.g., 0 for "A"
-            irt_difficulty_b REAL NOT NULL DEFAULT 0.0,
-            irt_discrimination_a REAL NOT NULL DEFAULT 1.0,
-            irt_guessing_c REAL NOT NULL DEFAULT 0.25,
-            
-            -- Track which test this question is for
-            test_type TEXT DEFAULT 'placement' -- 'placement' or 'final'
-        )
-    ''')
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS student_cat_responses (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            question_id INTEGER REFERENCES question_bank(id),
-            test_type TEXT NOT NULL, -- 'placement' or 'final'
-            response_index INTEGER,
-            is_correct BOOLEAN,
-            theta_estimate_after REAL, -- Store ability estimate after each answer
-            timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+@st.cache_resource(show_spinner=False)
+def get_student_model_cache():
+    """Creates the process-wide student model cache, invalidated by writes and expired by TTL."""
+    return student_cache.StudentModelCache(max_entries=STUDENT_CACHE_MAX_ENTRIES, ttl=STUDENT_CACHE_TTL)
 
-    # ---
-    # --- SECTION 4: STUDENT "BRAIN" (BKT) 
-    # ---
-    
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS bkt_model (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            subject TEXT NOT NULL,
-            
-            -- This now links to the new topics table
-            topic_id INTEGER REFERENCES topics(id) ON DELETE CASCADE,
-            
-            prob_knows REAL DEFAULT 0.0,
-            misconceptions TEXT, -- Stored as JSON array string
-            last_assessed TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, subject, topic_id)
-        )
-    ''')
-
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS learning_log (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-            subject TEXT NOT NULL,
-            topic_id INTEGER REFERENCES topics(id),
-            event_type TEXT NOT NULL, 
-            details TEXT,
-            timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+def invalidate_student_model(user_id, subject):
+    """Call after committing any BKT or progress write so cached reads for the student refresh."""
+    get_student_model_cache().bump(user_id, subject)
+
+@st.cache_resource(show_spinner=False)
+def ensure_schema():
+    """
+    Checks the schema version once per process and applies pending migrations
+    at startup. Pages can call this on every rerun: after the first call it is
+    a cached no-op.
+    """
+    conn = get_db_connection()
+    backend = get_backend()
+    try:
+        version = backend.schema_version(conn)
+        if version < backend.LATEST_VERSION:
+            if not DB_AUTO_MIGRATE:
+                st.error(f"Database schema is at version {version}, the app needs {backend.LATEST_VERSION}. Run `{backend.MIGRATE_COMMAND}`.")
+                st.stop()
+            backend.migrate(conn)
+            version = backend.schema_version(conn)
+        backend.maintain(conn)
+    finally:
+        release_db_connection(conn)
+    get_catalog_store()
+    return version
+
+# --- Catalog Change Feed ---
+# The curriculum loader publishes what it changed (see modules/catalog_events.py).
+# The listener thread swaps in a new catalog snapshot and calls the callbacks
+# registered here, so curriculum reads refresh right after a load.
 
-    conn.commit()
-    cur.close()
+CATALOG_CHANGES_SQL = "SELECT id, payload FROM catalog_changes WHERE id > %s ORDER BY id"
+
+_catalog_callbacks = []
+
+def on_catalog_change(callback):
+    """Registers callback(payload) for every published curriculum change. Runs on the listener thread."""
+    if callback not in _catalog_callbacks:
+        _catalog_callbacks.append(callback)
+
+def _background_cursor():
+    """
+    Returns cursor(): a read-only cursor for background threads, on one
+    snapshot. The backend is bound now because those threads run outside any
+    Streamlit session (and errors must raise, not st.error).
+    """
+    return get_backend().background_cursor()
+
+def _catalog_reader(cursor):
+    def read(after_id):
+        with cursor() as cur:
+            cur.execute(CATALOG_CHANGES_SQL, (after_id,))
+            return [(row[0], row[1]) for row in cur.fetchall()]
+    return read
+
+def _catalog_waiter():
+    return get_backend().change_waiter()
+
+@st.cache_resource(show_spinner=False)
+def get_catalog_listener():
+    """Starts the process-wide listener for curriculum changes (from ensure_schema())."""
+    with db_cursor(read_only=True) as cur:
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM catalog_changes")
+        start_id = cur.fetchone()[0]
+    student_models = get_student_model_cache()
+
+    def dispatch(payload):
+        if payload['subjects']:
+            # Profiles and dashboards list every topic of a subject
+            student_models.clear()
+        for callback in list(_catalog_callbacks):
+            callback(payload)
+
+    listener = catalog_events.CatalogListener(_catalog_reader(_background_cursor()), _catalog_waiter(), start_id)
+    listener.subscribe(dispatch)
+    return listener
+
+@st.cache_resource(show_spinner=False)
+def get_catalog_store():
+    """
+    Loads the catalog snapshot once per process (from ensure_schema()) and
+    keeps it current: every published change swaps in a new snapshot.
+    """
+    # Listen first, so a change committed during the load is not missed
+    get_catalog_listener()
+    store = catalog.CatalogStore(_background_cursor())
+    # First in line, so other callbacks already see the new snapshot
+    _catalog_callbacks.insert(0, store.refresh)
+    return store
+
+def get_catalog():
+    """The current catalog snapshot (see modules/catalog.py). Read-only."""
+    return get_catalog_store().current
+
+@st.cache_resource(show_spinner=False)
+def get_topic_bundle_cache():
+    """
+    Creates the process-wide LRU of per-topic content bundles once
+    (see modules/topic_bundles.py); content changes evict their topics.
+    """
+    cache = topic_bundles.TopicBundleCache(_background_cursor())
+    on_catalog_change(cache.apply_change)
+    return cache
 
 # --- User & Progress Functions ---
+# Statements are module-level so benchmarks/db_queries.py times the shipped SQL.
+
+USER_SQL = 'SELECT * FROM users WHERE username = %s'
+PROGRESS_SQL = 'SELECT * FROM progress WHERE user_id = %s AND subject = %s'
+ALL_PROGRESS_SQL = 'SELECT * FROM progress WHERE user_id = %s'
+
+def progress_upsert_sql(columns):
+    """update_progress()'s upsert for the given progress columns; parameters are (user_id, subject, *values)."""
+    placeholders = ", ".join(["%s"] * (len(columns) + 2))
+    assignments = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns)
+    return f'''
+        INSERT INTO progress (user_id, subject, {", ".join(columns)}) VALUES ({placeholders})
+        ON CONFLICT (user_id, subject) DO UPDATE SET {assignments}
+    '''
 
 def add_user_to_db(username, hashed_password):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            'INSERT INTO users (username, hashed_password) VALUES (%s, %s)',
-            (username, hashed_password)
-        )
-        conn.commit()
-        return True
-    except psycopg2.IntegrityError:
-        return False
-    finally:
-        cur.close()
-        conn.close()
+    with db_cursor(commit=True) as cur:
+        try:
+            cur.execute(
+                'INSERT INTO users (username, hashed_password) VALUES (%s, %s)',
+                (username, hashed_password)
+            )
+        except get_backend().IntegrityError:
+            return False
+    return True
 
 def get_user_from_db(username):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM users WHERE username = %s', (username,))
-    user = cur.fetchone() 
-    cur.close()
-    conn.close()
+    with db_cursor(read_only=True) as cur:
+        cur.execute(USER_SQL, (username,))
+        user = cur.fetchone() 
     return user
 
-def get_or_create_progress(user_id, subject):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        'SELECT * FROM progress WHERE user_id = %s AND subject = %s',
-        (user_id, subject)
+def _default_progress(user_id, subject):
+    """What a progress row looks like before the student starts the subject."""
+    return {
+        'id': None,
+        'user_id': user_id,
+        'subject': subject,
+        'irt_theta_initial': None,
+        'irt_theta_final': None,
+        'topic_index': 0,
+        'status': 'learning',
+        'assignment_score': None,
+        'final_assessment_attempts': 0,
+    }
+
+def get_progress(user_id, subject):
+    """
+    Read-only: returns the student's progress row, or the defaults if they
+    have not started the subject yet. Never writes. Cached until the next
+    progress or BKT write for this student.
+    """
+    return get_student_model_cache().get(
+        user_id, subject, 'progress',
+        lambda: _load_progress(user_id, subject)
     )
-    progress = cur.fetchone()
-    if not progress:
+
+def _load_progress(user_id, subject):
+    with db_cursor(read_only=True) as cur:
+        cur.execute(PROGRESS_SQL, (user_id, subject))
+        progress = cur.fetchone()
+    return progress or _default_progress(user_id, subject)
+
+def get_or_create_progress(user_id, subject):
+    """
+    Creates the progress row when a student starts a subject.
+    Only call this at that lifecycle point; page renders use get_progress().
+    """
+    with db_cursor(commit=True) as cur:
         cur.execute(
-            'INSERT INTO progress (user_id, subject) VALUES (%s, %s) RETURNING *',
+            '''
+            INSERT INTO progress (user_id, subject) VALUES (%s, %s)
+            ON CONFLICT (user_id, subject) DO NOTHING
+            RETURNING *
+            ''',
             (user_id, subject)
         )
         progress = cur.fetchone()
-        conn.commit()
-    cur.close()
-    conn.close()
-    return progress
+    if progress:
+        invalidate_student_model(user_id, subject)
+        return progress
+    return get_progress(user_id, subject)
 
 def update_progress(user_id, subject, irt_theta_initial=None, irt_theta_final=None, status=None, score=None, final_assessment_attempts=None):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
+    """Sets the given progress fields, creating the row if the student has none yet."""
     # Initialize lists
-    query_parts = []
+    columns = []
     params = []
     
     if irt_theta_initial is not None:
-        query_parts.append("irt_theta_initial = %s")
+        columns.append("irt_theta_initial")
         params.append(irt_theta_initial)
     if irt_theta_final is not None:
-        query_parts.append("irt_theta_final = %s")
+        columns.append("irt_theta_final")
         params.append(irt_theta_final)
     if status is not None:
-        query_parts.append("status = %s")
+        columns.append("status")
         params.append(status)
     if score is not None:
-        query_parts.append("assignment_score = %s")
+        columns.append("assignment_score")
         params.append(score)
     if final_assessment_attempts is not None: 
-        query_parts.append("final_assessment_attempts = %s")
+        columns.append("final_assessment_attempts")
         params.append(final_assessment_attempts)
         
-    if not query_parts:
+    if not columns:
         return
 
-    params.extend([user_id, subject])
-    
-    cur.execute(
-        f'UPDATE progress SET {", ".join(query_parts)} WHERE user_id = %s AND subject = %s',
-        tuple(params)
-    )
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor(commit=True) as cur:
+        cur.execute(progress_upsert_sql(columns), (user_id, subject, *params))
+    invalidate_student_model(user_id, subject)
 
 def get_all_user_progress(user_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM progress WHERE user_id = %s', (user_id,))
-    progress_records = cur.fetchall()
-    cur.close()
-    conn.close()
+    """Read-only: every progress row for the user (cached until their next write)."""
+    return get_student_model_cache().get(
+        user_id, None, 'all_progress',
+        lambda: _load_all_user_progress(user_id)
+    )
+
+def _load_all_user_progress(user_id):
+    with db_cursor(read_only=True) as cur:
+        cur.execute(ALL_PROGRESS_SQL, (user_id,))
+        progress_records = cur.fetchall()
     return progress_records
 
-# --- BKT "BRAIN" FUNCTIONS ---
+# --- Dashboard ---
+
+def dashboard_from_rows(rows):
+    """Shapes DASHBOARD_SQL rows into the list get_dashboard() returns."""
+    dashboard = []
+    for row in rows:
+        started = row['progress_id'] is not None
+        dashboard.append({
+            'subject': row['subject'],
+            'started': started,
+            'irt_theta_initial': row['irt_theta_initial'],
+            'irt_theta_final': row['irt_theta_final'],
+            'status': row['status'] if started else None,
+            'assignment_score': row['assignment_score'],
+            'final_assessment_attempts': row['final_assessment_attempts'] or 0,
+            'total_topics': row['total_topics'],
+            'topics_mastered': row['topics_mastered'],
+            'mean_mastery': row['mean_mastery'],
+            'last_activity': row['last_activity'],
+            'topics': row['topics'],
+        })
+    return dashboard
 
-def get_or_create_bkt_model(cur, user_id, subject, topic_id):
+def get_dashboard(user_id):
     """
-    Gets or creates a BKT model entry.
-    Note: Now uses topic_id instead of topic_name.
+    Read-only: everything the Profile page shows, in one query.
+    Returns one dict per available subject with the student's progress fields
+    (started=False if they have no progress row), total_topics,
+    topics_mastered and `topics`, the ordered per-topic mastery vector.
+    Cached until the student's next progress or BKT write in any subject.
     """
-    cur.execute(
-        'SELECT * FROM bkt_model WHERE user_id = %s AND subject = %s AND topic_id = %s',
-        (user_id, subject, topic_id)
+    return get_student_model_cache().get(
+        user_id, None, 'dashboard',
+        lambda: _load_dashboard(user_id)
     )
-    model = cur.fetchone()
-    
-    if not model:
-        cur.execute(
-            'INSERT INTO bkt_model (user_id, subject, topic_id, prob_knows) VALUES (%s, %s, %s, %s) RETURNING *',
-            (user_id, subject, topic_id, 0.0) # Start with 0% knowledge
-        )
-        model = cur.fetchone()
-        cur.connection.commit() # Commit within the transaction
-    return model
 
-def update_bkt_model(user_id, subject, topic_id, is_correct, new_misconception=None):
-    """Updates the BKT model based on a quiz answer."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    model = get_or_create_bkt_model(cur, user_id, subject, topic_id)
-    
-    prob_knows_prior = model['prob_knows']
-    
-    if is_correct:
-        # Student got it RIGHT
-        prob_knows_if_learned = (prob_knows_prior * (1 - P_SLIP)) / (prob_knows_prior * (1 - P_SLIP) + (1 - prob_knows_prior) * P_GUESS)
-    else:
-        # Student got it WRONG
-        prob_knows_if_learned = (prob_knows_prior * P_SLIP) / (prob_knows_prior * P_SLIP + (1 - prob_knows_prior) * (1 - P_GUESS))
-    
-    # This is the final, updated probability
-    new_prob_knows = prob_knows_if_learned
+def _load_dashboard(user_id):
+    with db_cursor(read_only=True) as cur:
+        rows = get_backend().load_dashboard(cur, user_id)
+    return dashboard_from_rows(rows)
 
-    # Update misconceptions
-    misconceptions = json.loads(model['misconceptions']) if model['misconceptions'] else []
-    if new_misconception and new_misconception not in misconceptions:
-        misconceptions.append(new_misconception)
-    
-    cur.execute(
-        'UPDATE bkt_model SET prob_knows = %s, misconceptions = %s, last_assessed = CURRENT_TIMESTAMP WHERE id = %s',
-        (new_prob_knows, json.dumps(misconceptions), model['id'])
+# --- Mastery Rollup ---
+# mastery_rollup is maintained by triggers on bkt_model (migrations 3 and 11),
+# which apply each write's change in the same transaction, so mastery checks
+# are one-row lookups.
+
+def _default_rollup(user_id, subject):
+    """Rollup for a student with no BKT rows in the subject yet."""
+    return {
+        'user_id': user_id,
+        'subject': subject,
+        'total_topics': 0,
+        'mastered_count': 0,
+        'first_unmastered_order': None,
+        'first_unmastered_topic_id': None,
+        'mean_mastery': 0.0,
+        'mastery_sum': 0.0,
+        'last_activity': None,
+    }
+
+def get_mastery_rollup(user_id, subject):
+    """
+    Read-only: mastered count, first unmastered topic, mean mastery and last
+    activity for one student and subject. Cached until their next write.
+    """
+    return get_student_model_cache().get(
+        user_id, subject, 'rollup',
+        lambda: _load_mastery_rollup(user_id, subject)
     )
-    conn.commit()
-    cur.close()
-    conn.close()
+
+MASTERY_ROLLUP_SQL = 'SELECT * FROM mastery_rollup WHERE user_id = %s AND subject = %s'
+
+def _load_mastery_rollup(user_id, subject):
+    with db_cursor(read_only=True) as cur:
+        cur.execute(MASTERY_ROLLUP_SQL, (user_id, subject))
+        rollup = cur.fetchone()
+    return dict(rollup) if rollup else _default_rollup(user_id, subject)
+
+def is_subject_mastered(rollup):
+    """True when every topic in the rollup's subject is at or above the threshold."""
+    return rollup['total_topics'] > 0 and rollup['mastered_count'] == rollup['total_topics']
+
+# --- BKT "BRAIN" FUNCTIONS ---
+
+# Answers, learning and seeding each write in one transaction; the SQL is the
+# backend's (modules/backends), where PostgreSQL runs an answer as a single
+# UPSERT ... RETURNING so concurrent submits for the same topic serialize on
+# the row lock instead of overwriting each other.
+
+MISCONCEPTIONS_SQL = """
+    SELECT misconception FROM bkt_misconceptions
+    WHERE user_id = %(user_id)s AND topic_id = %(topic_id)s
+    ORDER BY last_seen DESC, frequency DESC
+    LIMIT %(limit)s
+"""
+
+def answer_params(user_id, subject, topic_id, is_correct, misconception=None):
+    """Parameters for the backend's BKT_ANSWER_SQL."""
+    return {
+        'user_id': user_id,
+        'subject': subject,
+        'topic_id': topic_id,
+        'is_correct': bool(is_correct),
+        'misconception': misconception or None,
+        'p_slip': P_SLIP,
+        'p_guess': P_GUESS,
+        'max_chars': MISCONCEPTION_MAX_CHARS,
+        'keep': MISCONCEPTION_LIMIT,
+    }
+
+def update_bkt_model(user_id, subject, topic_id, is_correct, new_misconception=None):
+    """
+    Updates the BKT model based on a quiz answer and, for a wrong answer,
+    records the misconception in the same statement.
+    Returns the new P(Knows).
+    """
+    params = answer_params(user_id, subject, topic_id, is_correct, new_misconception)
+    with db_cursor(commit=True) as cur:
+        new_prob_knows = get_backend().record_answer(cur, params)
+    invalidate_student_model(user_id, subject)
+    return new_prob_knows
 
 def apply_learning(user_id, subject, topic_id):
-    """Applies the "learning" probability (P_TRANSIT) after an activity."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    model = get_or_create_bkt_model(cur, user_id, subject, topic_id)
-    
-    prob_knows_prior = model['prob_knows']
-    
-    # P(Knows_New) = P(Knows_Old) + P(Not_Knows_Old) * P(Learns_Now)
-    new_prob_knows = prob_knows_prior + (1 - prob_knows_prior) * P_TRANSIT
-    
-    cur.execute(
-        'UPDATE bkt_model SET prob_knows = %s, last_assessed = CURRENT_TIMESTAMP WHERE id = %s',
-        (new_prob_knows, model['id'])
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    """
+    Applies the "learning" probability (P_TRANSIT) after an activity.
+    Returns the new P(Knows).
+    """
+    params = {
+        'user_id': user_id,
+        'subject': subject,
+        'topic_id': topic_id,
+        'p_transit': P_TRANSIT,
+    }
+    with db_cursor(commit=True) as cur:
+        new_prob_knows = get_backend().apply_learning(cur, params)
+    invalidate_student_model(user_id, subject)
+    return new_prob_knows
+
+BKT_MODEL_SQL = 'SELECT * FROM bkt_model WHERE user_id = %s AND subject = %s AND topic_id = %s'
 
 def get_bkt_model(user_id, subject, topic_id):
-    """Gets a single BKT model record."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    model = get_or_create_bkt_model(cur, user_id, subject, topic_id)
-    cur.close()
-    conn.close()
-    return model
+    """
+    Read-only: gets a single BKT model record, or a 0% default if the
+    student has no record for the topic yet. Never writes.
+    """
+    with db_cursor(read_only=True) as cur:
+        cur.execute(BKT_MODEL_SQL, (user_id, subject, topic_id))
+        model = cur.fetchone()
+    if model:
+        return model
+    return {
+        'id': None,
+        'user_id': user_id,
+        'subject': subject,
+        'topic_id': topic_id,
+        'prob_knows': 0.0,
+        'last_assessed': None,
+    }
+
+def get_misconceptions(user_id, subject, topic_id):
+    """
+    Read-only: the student's recorded misconceptions for a topic, most recent
+    first. Bounded by MISCONCEPTION_LIMIT; cached until their next write.
+    """
+    return get_student_model_cache().get(
+        user_id, subject, ('misconceptions', topic_id),
+        lambda: _load_misconceptions(user_id, topic_id)
+    )
+
+def _load_misconceptions(user_id, topic_id):
+    with db_cursor(read_only=True) as cur:
+        cur.execute(MISCONCEPTIONS_SQL, {'user_id': user_id, 'topic_id': topic_id, 'limit': MISCONCEPTION_LIMIT})
+        return [row['misconception'] for row in cur.fetchall()]
 
 def get_student_model_summary(user_id, subject):
     """Gets the full knowledge profile for the agent."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # LEFT JOIN to include all topics
+    # Served from the cached profile: includes all topics
     # regardless of whether a BKT record exists yet.
-    cur.execute(
-        '''
-        SELECT 
-            t.topic_name, 
-            b.prob_knows, 
-            b.misconceptions 
-        FROM topics t
-        LEFT JOIN bkt_model b ON t.id = b.topic_id AND b.user_id = %s
-        WHERE t.subject = %s
-        ORDER BY t.topic_order
-        ''',
-        (user_id, subject)
-    )
-    model_records = cur.fetchall()
-    cur.close()
-    conn.close()
+    profile = get_all_bkt_models_for_subject(user_id, subject)
     
-    if not model_records:
+    if not profile:
         return "No topics found for this subject."
         
-    # Process the results to handle NULL prob_knows
-    results = []
-    for m in model_records:
-        if m['prob_knows'] is None:
-            results.append({
-                'topic_name': m['topic_name'],
-                'prob_knows': 0.0, # Default to 0
-                'misconceptions': None
-            })
-        else:
-            results.append(dict(m)) # Convert from DictRow
-            
-    return results
-
-def seed_bkt_model_from_irt(user_id, subject, initial_prob):
+    return [
+        {
+            'topic_name': m['topic_name'],
+            'prob_knows': m['prob_knows'],
+            'misconceptions': m['misconceptions']
+        }
+        for m in profile
+    ]
+
+def seed_bkt_models(user_id, subject_priors, topic_priors=None, ku_priors=None):
+    """
+    Writes the initial P(Knows) for every topic of one or more subjects in
+    one transaction (a single INSERT ... ON CONFLICT DO UPDATE on PostgreSQL).
+
+    subject_priors: {subject: prior} default prior for each subject's topics.
+    topic_priors:   {topic_id: prior} overrides for individual topics.
+    ku_priors:      {ku_code: prior} overrides for every topic in a knowledge unit.
+
+    The most specific prior wins (topic, then knowledge unit, then subject).
+    Returns the number of BKT rows written.
+    """
+    if not subject_priors:
+        return 0
+
+    with db_cursor(commit=True) as cur:
+        seeded = get_backend().seed_bkt_models(cur, user_id, subject_priors, topic_priors, ku_priors)
+    for subject in subject_priors:
+        invalidate_student_model(user_id, subject)
+    return seeded
+
+def seed_bkt_model_from_irt(user_id, subject, initial_prob, topic_priors=None, ku_priors=None):
     """
     Sets the initial P(Knows) for all topics for a user/subject.
     This "seeds the brain" from the IRT placement test.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # Get all topic IDs for this subject
-    cur.execute("SELECT id FROM topics WHERE subject = %s", (subject,))
-    topic_rows = cur.fetchall()
-    
-    if not topic_rows:
+    seeded = seed_bkt_models(user_id, {subject: initial_prob}, topic_priors, ku_priors)
+    if not seeded:
         st.warning(f"No topics found for subject {subject} to seed BKT model.")
-        return
-        
-    initial_prob_float = float(initial_prob)
-    
-    for row in topic_rows:
-        topic_id = row['id']
-        # Use get_or_create to insert/ignore
-        model = get_or_create_bkt_model(cur, user_id, subject, topic_id)
-        
-        # Update the model with the new P(Prior)
-        cur.execute(
-            "UPDATE bkt_model SET prob_knows = %s WHERE id = %s",
-            (initial_prob_float, model['id'])
-        )
-    
-    conn.commit()
-    cur.close()
-    conn.close()
 
 def log_learning_event(user_id, subject, topic_id, event_type, details=""):
-    """Logs a specific learning interaction."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        'INSERT INTO learning_log (user_id, subject, topic_id, event_type, details) VALUES (%s, %s, %s, %s, %s)',
-        (user_id, subject, topic_id, event_type, details)
+    """Logs a specific learning interaction (written asynchronously in batches)."""
+    queue_event('learning_log', user_id, subject, topic_id, event_type, details)
+
+# --- CAT Sessions ---
+# One row per in-progress adaptive test, rewritten after every answer so a
+# refresh, reconnect or another app instance can resume it. Rows are plain
+# dicts here; psychometrics.CatSession packs and unpacks them.
+
+CAT_SESSION_UPSERT_SQL = """
+    INSERT INTO cat_sessions (
+        user_id, subject, test_type, bank_version, test_length,
+        item_ids, responses, theta, se, current_item_id, updated_at
+    )
+    VALUES (
+        %(user_id)s, %(subject)s, %(test_type)s, %(bank_version)s, %(test_length)s,
+        %(item_ids)s, %(responses)s, %(theta)s, %(se)s, %(current_item_id)s, CURRENT_TIMESTAMP
     )
-    conn.commit()
-    cur.close()
-    conn.close()
+    ON CONFLICT (user_id, subject, test_type) DO UPDATE SET
+        bank_version = EXCLUDED.bank_version,
+        test_length = EXCLUDED.test_length,
+        item_ids = EXCLUDED.item_ids,
+        responses = EXCLUDED.responses,
+        theta = EXCLUDED.theta,
+        se = EXCLUDED.se,
+        current_item_id = EXCLUDED.current_item_id,
+        updated_at = EXCLUDED.updated_at
+"""
+
+def save_cat_session(row):
+    """Writes a CAT session row (synchronously: the next rerun may run on another instance)."""
+    with db_cursor(commit=True) as cur:
+        cur.execute(CAT_SESSION_UPSERT_SQL, row)
+
+def load_cat_session(user_id, subject, test_type):
+    """The student's in-progress CAT session row, or None."""
+    with db_cursor(read_only=True) as cur:
+        cur.execute(
+            """
+            SELECT user_id, subject, test_type, bank_version, test_length,
+                   item_ids, responses, theta, se, current_item_id
+            FROM cat_sessions
+            WHERE user_id = %s AND subject = %s AND test_type = %s
+            """,
+            (user_id, subject, test_type)
+        )
+        row = cur.fetchone()
+    if row is None:
+        return None
+    row = dict(row)
+    row['item_ids'] = list(row['item_ids'])
+    row['responses'] = bytes(row['responses'])   # psycopg2 returns BYTEA as a memoryview
+    return row
+
+def delete_cat_session(user_id, subject, test_type):
+    """Drops a finished (or abandoned) CAT session."""
+    with db_cursor(commit=True) as cur:
+        cur.execute(
+            'DELETE FROM cat_sessions WHERE user_id = %s AND subject = %s AND test_type = %s',
+            (user_id, subject, test_type)
+        )
 
 
 def get_available_subjects():
-    """
-    Queries the database for a distinct list of all available subjects
-    based on the topics loaded.
-    """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        'SELECT DISTINCT subject FROM topics ORDER BY subject'
-    )
-    subjects = [row['subject'] for row in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return subjects
+    """Every subject with topics loaded, sorted (from the catalog snapshot)."""
+    return list(get_catalog().subjects)
 
-# ---BKT Caching Function ---
+# --- BKT Caching Functions ---
+# Profiles are cached per (user, subject) in the StudentModelCache. Every BKT
+# write bumps the student's scope, so reads are fresh immediately after an
+# answer and served from memory until the next one or STUDENT_CACHE_TTL.
 
-@st.cache_data(ttl=60, show_spinner=False)
 def get_bkt_model_cached(user_id, subject, topic_id):
     """
-    Gets a single BKT model record, optimized with Streamlit caching 
+    Gets a single BKT model record from the cached profile
     to speed up sidebar rendering.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    # Using get_or_create_bkt_model ensures a record exists for the topic
-    model = get_or_create_bkt_model(cur, user_id, subject, topic_id) 
-    cur.close()
-    conn.close()
-    return model
+    for model in get_all_bkt_models_for_subject(user_id, subject):
+        if model['topic_id'] == topic_id:
+            return model
+    return None
 
-@st.cache_data(ttl=60, show_spinner=False)
 def get_all_bkt_models_for_subject(user_id, subject):
     """
     Gets the *entire* BKT model profile for a user/subject
-    in a single query.
+    in a single query (cached until the student's next BKT write).
+    The returned list is shared; do not modify it.
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT 
-            t.id AS topic_id, 
-            t.topic_name, 
-            b.prob_knows,
-            b.misconceptions
-        FROM topics t
-        LEFT JOIN bkt_model b ON t.id = b.topic_id AND b.user_id = %s
-        WHERE t.subject = %s
-        ORDER BY t.topic_order
-        """,
-        (user_id, subject)
+    return get_student_model_cache().get(
+        user_id, subject, 'bkt_profile',
+        lambda: _load_bkt_profile(user_id, subject)
     )
-    models = cur.fetchall()
-    cur.close()
-    conn.close()
-    
-    # Ensure a default record for any topics not yet in bkt_model
-    results = []
-    for m in models:
-        if m['prob_knows'] is None:
-            # This topic exists, but the user has no BKT record for it yet.
-            # We'll just return the 0.0 probability
-            results.append({
-                'topic_id': m['topic_id'],
-                'topic_name': m['topic_name'],
-                'prob_knows': 0.0, 
-                'misconceptions': None
-            })
-        else:
-            # User has a valid BKT record
-            results.append(dict(m)) # convert from DictRow to regular dict
-            
-    return results
\ No newline at end of file
+
+def _load_bkt_profile(user_id, subject):
+    # Topics the user has no BKT record for yet come back with a 0.0 probability
+    with db_cursor(read_only=True) as cur:
+        return get_backend().load_bkt_profile(cur, user_id, subject, MISCONCEPTION_LIMIT)
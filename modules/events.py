@@ -0,0 +1,220 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Marker placed on the queue by close() to wake the writer thread up.
+_STOP = object()
+
+class EventWriter:
+    """
+    In-process write-behind buffer for append-only telemetry rows
+    (learning_log, student_cat_responses, ...).
+
+    submit() only puts the row on a bounded queue and never waits: telemetry
+    must not stall a page. A background thread collects rows and hands them
+    to `write_batch(table, rows)` whenever `batch_size` rows are waiting or
+    `flush_interval` seconds have passed.
+
+    A batch that fails with one of `transient_errors` (the database is down
+    or unreachable) is kept and retried with exponential backoff
+    (`retry_delay` doubling up to `retry_max` seconds). Any other error means
+    some row cannot be written (a foreign key to a deleted row, a bad value),
+    so the batch is retried row by row and the rows that still fail are
+    logged and dropped. While the writer retries, the queue fills up; once
+    it is full, submit() drops the row and counts it instead of blocking.
+    Remaining rows are drained when the process exits; rows that still
+    cannot be written once close()'s timeout has passed are dropped too.
+    """
+
+    def __init__(self, write_batch, batch_size=200, flush_interval=1.0, max_queue=10000,
+                 retry_delay=0.5, retry_max=30.0, transient_errors=(OSError,)):
+        self._write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.retry_max = retry_max
+        self.transient_errors = transient_errors
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stopping = threading.Event()
+        self._give_up_at = None
+        self._overflowing = False   # Logged once per stretch of rejected rows
+        self._stats = {
+            "submitted": 0,
+            "written": 0,
+            "dropped": 0,
+            "rejected": 0,
+            "batches": 0,
+            "failed_flushes": 0,
+            "retrying": False,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- Producer side ---
+
+    def submit(self, table, row):
+        """Queues one row for `table`. Never blocks: the row is dropped if the queue is full."""
+        if self._closed:
+            raise RuntimeError("EventWriter is closed.")
+        try:
+            self._queue.put_nowait((table, row))
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+                first, self._overflowing = not self._overflowing, True
+            if first:
+                logger.error("Event queue is full (%d rows); dropping %s rows until it drains.",
+                             self._queue.maxsize, table)
+            return
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._overflowing = False
+
+    def flush(self):
+        """Blocks until every row queued so far has been written (or dropped at close)."""
+        self._queue.join()
+
+    def close(self, timeout=10.0):
+        """
+        Stops accepting rows, drains the queue and stops the writer thread.
+        Batches that still fail after `timeout` seconds are dropped.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._give_up_at = time.monotonic() + timeout
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(_STOP)
+        except queue.Full:
+            pass   # The writer is busy and sees _stopping after this batch
+        # A little longer than the retry deadline, for the attempt in flight
+        self._thread.join(timeout + 1.0)
+        if self._thread.is_alive():
+            logger.error("Event writer did not stop within %.0fs; %d queued rows and the batch being written are lost.",
+                         timeout, self._queue.qsize())
+
+    def stats(self):
+        """
+        Returns queue depth and flush-latency counters. `dropped` counts rows
+        the writer gave up on, `rejected` rows submitted to a full queue.
+        """
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["queue_depth"] = self._queue.qsize()
+        snapshot["avg_flush_ms"] = snapshot["total_flush_ms"] / snapshot["batches"] if snapshot["batches"] else 0.0
+        return snapshot
+
+    # --- Writer thread ---
+
+    def _run(self):
+        while True:
+            batch, stopping = self._collect(self._stopping.is_set())
+            if batch:
+                self._flush(batch)
+            if stopping and self._queue.empty():
+                return
+
+    def _collect(self, stopping):
+        """Takes up to batch_size rows, waiting at most flush_interval for them."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if stopping:
+                    item = self._queue.get_nowait()
+                else:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            if item is _STOP:
+                self._queue.task_done()
+                stopping = True
+                continue
+            batch.append(item)
+        return batch, stopping
+
+    def _flush(self, batch):
+        # Group by table, keeping submission order within each table
+        by_table = {}
+        for table, row in batch:
+            by_table.setdefault(table, []).append(row)
+
+        for table, rows in by_table.items():
+            started = time.perf_counter()
+            written = self._write(table, rows)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._stats["retrying"] = False
+                self._stats["written"] += written
+                self._stats["dropped"] += len(rows) - written
+                if written:
+                    self._stats["batches"] += 1
+                    self._stats["last_flush_ms"] = elapsed_ms
+                    self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+                    self._stats["total_flush_ms"] += elapsed_ms
+
+        for _ in batch:
+            self._queue.task_done()
+
+    def _write(self, table, rows):
+        """
+        Writes one table's rows, falling back to one row at a time when the
+        batch fails for a reason other than a transient error. Returns the
+        number of rows written.
+        """
+        try:
+            return len(rows) if self._write_with_retries(table, rows) else 0
+        except Exception:
+            if len(rows) == 1:
+                logger.exception("Dropping %s row that cannot be written: %r", table, rows[0])
+                return 0
+        logger.warning("Writing %d %s rows failed; writing them one by one.", len(rows), table)
+        return sum(self._write(table, [row]) for row in rows)
+
+    def _write_with_retries(self, table, rows):
+        """
+        Writes rows, retrying transient errors until it succeeds; other
+        errors are raised. Returns False only when close() has given up.
+        """
+        attempt, delay = 0, self.retry_delay
+        while True:
+            try:
+                self._write_batch(table, rows)
+                if attempt:
+                    logger.info("Wrote %d %s rows after %d failed attempts.", len(rows), table, attempt)
+                return True
+            except self.transient_errors:
+                attempt += 1
+                with self._lock:
+                    self._stats["failed_flushes"] += 1
+                    self._stats["retrying"] = True
+                if self._stopping.is_set():
+                    remaining = self._give_up_at - time.monotonic()
+                    if remaining <= 0:
+                        logger.exception("Dropping %d %s rows at shutdown after %d failed writes.", len(rows), table, attempt)
+                        return False
+                    time.sleep(min(delay, remaining))
+                else:
+                    logger.warning("Writing %d %s rows failed (attempt %d); retrying in %.1fs.",
+                                   len(rows), table, attempt, delay, exc_info=attempt == 1)
+                    self._stopping.wait(delay)
+                delay = min(delay * 2, self.retry_max)
+            except Exception:
+                with self._lock:
+                    self._stats["failed_flushes"] += 1
+                raise
@@ -0,0 +1,70 @@
+import numpy as np
+
+# 3PL item response functions and per-bank item-information tables, shared by
+# the question banks of the catalog snapshot (modules/item_bank.py builds a
+# table for each bank when it is loaded) and the CAT engine in
+# modules/psychometrics.py.
+
+THETA_MIN = -4.0
+THETA_MAX = 4.0
+QUADRATURE_POINTS = 161                  # Grid step of 0.05 on [THETA_MIN, THETA_MAX]
+THETA_GRID = np.linspace(THETA_MIN, THETA_MAX, QUADRATURE_POINTS)
+THETA_STEP = THETA_GRID[1] - THETA_GRID[0]
+
+def prob_correct(theta, a, b, c):
+    """3PL probability of a correct answer; broadcasts over theta and item arrays."""
+    return c + (1.0 - c) / (1.0 + np.exp(-a * (theta - b)))
+
+def item_information(theta, a, b, c):
+    """Fisher information of 3PL items at theta; broadcasts like prob_correct()."""
+    p = prob_correct(theta, a, b, c)
+    return a ** 2 * ((p - c) / (1.0 - c)) ** 2 * (1.0 - p) / p
+
+def grid_index(theta):
+    """Index of the THETA_GRID point nearest to theta (clamped to the grid)."""
+    i = int(round((theta - THETA_MIN) / THETA_STEP))
+    return min(max(i, 0), QUADRATURE_POINTS - 1)
+
+class InformationTable:
+    """
+    Item information of one bank at every THETA_GRID point, computed once.
+
+    information[g, i] is item i's information at THETA_GRID[g] (float32) and
+    order[g] lists the items by decreasing information there (int32), so the
+    most informative unadministered item at a grid point is the first entry
+    of order[g] not yet administered: at most len(administered) + 1 reads,
+    independent of the bank size. Both arrays are read-only and shared.
+    """
+
+    def __init__(self, item_params):
+        item_params = np.asarray(item_params, dtype=float)
+        a, b, c = (item_params[:, k][None, :] for k in range(3))
+        information = item_information(THETA_GRID[:, None], a, b, c).astype(np.float32)
+        # Stable, so equally informative items keep bank order (lowest index first)
+        order = np.argsort(-information, axis=1, kind='stable').astype(np.int32)
+        information.setflags(write=False)
+        order.setflags(write=False)
+        self.information = information
+        self.order = order
+
+    @classmethod
+    def from_arrays(cls, information, order):
+        """A table over arrays computed earlier (e.g. memory-mapped by modules/item_bank.py)."""
+        table = cls.__new__(cls)
+        table.information = information
+        table.order = order
+        return table
+
+    def __len__(self):
+        return self.order.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.information.nbytes + self.order.nbytes
+
+    def best_item(self, theta, administered=()):
+        """Most informative item at the grid point nearest theta that is not in `administered` (a set), or None."""
+        for item in self.order[grid_index(theta)]:
+            if item not in administered:
+                return int(item)
+        return None
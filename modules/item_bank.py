@@ -0,0 +1,224 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from types import MappingProxyType
+from urllib.parse import quote
+import numpy as np
+from .irt import InformationTable
+
+logger = logging.getLogger(__name__)
+
+# Question banks as read-only structures of arrays.
+#
+# A bank is a handful of contiguous NumPy arrays (question and topic ids, the
+# 3PL parameters, the correct option) plus an interned string table holding
+# every distinct question text and option once, as UTF-8 bytes with offsets.
+# Question records are built on demand from a row, so a bank costs a few
+# bytes per item and nothing is copied per session or per caller.
+#
+# With ITEM_BANK_DIR set, each catalog version's banks (with their
+# InformationTables) are written once as .npy files and memory-mapped
+# read-only, so every worker process on the host shares one copy through the
+# page cache. A bank directory also records a hash of the question rows it was
+# built from and is rebuilt when the rows differ. Once a version's bank is
+# written, directories of older versions are deleted (processes still mapping
+# them keep their pages until they reload).
+
+ITEM_BANK_DIR = os.environ.get("ITEM_BANK_DIR")   # Shared memory-mapped banks; unset = in-process arrays
+
+ARRAYS = (
+    'question_id', 'topic_id', 'params', 'correct_option', 'text_id',
+    'option_offsets', 'option_ids', 'string_offsets', 'string_data',
+    'information', 'order',
+)
+HASH_FILE = 'content.sha256'
+
+class ItemBank:
+    """
+    One question bank. Rows are in question id order; `params` is 3 x N so
+    the a, b and c rows are each contiguous. Build it with from_questions()
+    or open a saved one with load().
+    """
+
+    def __init__(self, subject, test_type, arrays):
+        self.subject = subject
+        self.test_type = test_type
+        self._arrays = arrays
+        for name in ARRAYS[:-2]:
+            setattr(self, name, arrays[name])
+        self.a, self.b, self.c = self.params
+        self.information = InformationTable.from_arrays(arrays['information'], arrays['order'])
+
+    @classmethod
+    def from_questions(cls, subject, test_type, questions):
+        """Packs question rows (id, topic_id, question_text, options, ...) in id order."""
+        questions = sorted(questions, key=lambda q: q['id'])
+        strings, interned = [], {}
+
+        def intern(text):
+            if text not in interned:
+                interned[text] = len(strings)
+                strings.append(text)
+            return interned[text]
+
+        text_ids, option_ids, option_offsets = [], [], [0]
+        for q in questions:
+            text_ids.append(intern(q['question_text']))
+            option_ids.extend(intern(option) for option in q['options'])
+            option_offsets.append(len(option_ids))
+        encoded = [s.encode('utf-8') for s in strings]
+
+        params = np.array([
+            [q['irt_discrimination_a'] for q in questions],
+            [q['irt_difficulty_b'] for q in questions],
+            [q['irt_guessing_c'] for q in questions],
+        ], dtype=float).reshape(3, len(questions))
+        table = InformationTable(params.T)
+        arrays = {
+            'question_id': np.array([q['id'] for q in questions], dtype=np.int64),
+            'topic_id': np.array([q['topic_id'] for q in questions], dtype=np.int64),
+            'params': params,
+            'correct_option': np.array([q['correct_option_index'] for q in questions], dtype=np.int16),
+            'text_id': np.array(text_ids, dtype=np.int32),
+            'option_offsets': np.array(option_offsets, dtype=np.int32),
+            'option_ids': np.array(option_ids, dtype=np.int32),
+            'string_offsets': np.cumsum([0] + [len(b) for b in encoded], dtype=np.int64),
+            'string_data': np.frombuffer(b''.join(encoded), dtype=np.uint8).copy(),
+            'information': table.information,
+            'order': table.order,
+        }
+        for array in arrays.values():
+            array.setflags(write=False)
+        return cls(subject, test_type, arrays)
+
+    @classmethod
+    def load(cls, subject, test_type, path):
+        """Memory-maps a bank written by save()."""
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in ARRAYS}
+        return cls(subject, test_type, arrays)
+
+    def save(self, path, content_hash):
+        """
+        Writes the arrays and the content_hash() of their rows to `path`
+        atomically (a concurrent writer of the same bank is harmless).
+        """
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+        try:
+            for name in ARRAYS:
+                np.save(os.path.join(tmp, name + '.npy'), np.asarray(self._arrays[name]))
+            with open(os.path.join(tmp, HASH_FILE), 'w') as f:
+                f.write(content_hash)
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+
+    def __len__(self):
+        return len(self.question_id)
+
+    def __getitem__(self, row):
+        return self.question(row)
+
+    @property
+    def item_params(self):
+        """N x 3 view of [discrimination (a), difficulty (b), guessing (c)]."""
+        return self.params.T
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays.values())
+
+    def string(self, k):
+        start, end = self.string_offsets[k], self.string_offsets[k + 1]
+        return bytes(self.string_data[start:end]).decode('utf-8')
+
+    def row_of(self, question_id):
+        """The row of a question id, or None if it is not in the bank (O(log N), no per-process index)."""
+        if question_id is None:
+            return None
+        row = int(np.searchsorted(self.question_id, question_id))
+        if row < len(self.question_id) and self.question_id[row] == question_id:
+            return row
+        return None
+
+    def question(self, row):
+        """The question record at a row, in the shape the pages use."""
+        start, end = self.option_offsets[row], self.option_offsets[row + 1]
+        return MappingProxyType({
+            'id': int(self.question_id[row]),
+            'topic_id': int(self.topic_id[row]),
+            'subject': self.subject,
+            'test_type': self.test_type,
+            'question_text': self.string(self.text_id[row]),
+            'options': tuple(self.string(k) for k in self.option_ids[start:end]),
+            'correct_option_index': int(self.correct_option[row]),
+            'irt_discrimination_a': float(self.a[row]),
+            'irt_difficulty_b': float(self.b[row]),
+            'irt_guessing_c': float(self.c[row]),
+        })
+
+def bank_path(directory, version, subject, test_type):
+    return os.path.join(directory, str(version), quote(f"{subject}.{test_type}", safe=''))
+
+def content_hash(questions):
+    """SHA-256 over every field a bank is built from, in question id order."""
+    digest = hashlib.sha256()
+    for q in sorted(questions, key=lambda q: q['id']):
+        row = [
+            q['id'], q['topic_id'], q['question_text'], list(q['options']), q['correct_option_index'],
+            float(q['irt_discrimination_a']), float(q['irt_difficulty_b']), float(q['irt_guessing_c']),
+        ]
+        digest.update(json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+def read_content_hash(path):
+    """The hash recorded in a bank directory, or None if it has none."""
+    try:
+        with open(os.path.join(path, HASH_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def prune_versions(directory, version):
+    """Deletes the bank directories of catalog versions older than `version`."""
+    for name in os.listdir(directory):
+        if name.isdigit() and int(name) < version:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+def build_item_bank(subject, test_type, questions, version, directory=ITEM_BANK_DIR):
+    """
+    The ItemBank for a catalog version: mapped from `directory` when another
+    process already wrote it from the same question rows, otherwise built
+    from the rows and, with a directory, written there first.
+    """
+    if not directory:
+        return ItemBank.from_questions(subject, test_type, questions)
+    path = bank_path(directory, version, subject, test_type)
+    expected = content_hash(questions)
+    if os.path.isdir(path):
+        try:
+            if read_content_hash(path) == expected:
+                return ItemBank.load(subject, test_type, path)
+            logger.warning("Item bank %s does not match catalog version %s; rebuilding it.", path, version)
+            shutil.rmtree(path, ignore_errors=True)
+        except (OSError, ValueError):
+            logger.exception("Reading item bank %s failed; rebuilding it.", path)
+            shutil.rmtree(path, ignore_errors=True)
+    bank = ItemBank.from_questions(subject, test_type, questions)
+    try:
+        bank.save(path, expected)
+        bank = ItemBank.load(subject, test_type, path)
+    except (OSError, ValueError):
+        logger.exception("Writing item bank %s failed; keeping it in process memory.", path)
+        return bank
+    try:
+        prune_versions(directory, version)
+    except OSError:
+        logger.exception("Pruning old item bank versions in %s failed.", directory)
+    return bank
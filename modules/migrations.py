@@ -0,0 +1,956 @@
+import os
+import sys
+import psycopg2
+from dotenv import load_dotenv
+
+# Versioned schema migrations.
+# Apply pending migrations from the command line:
+# python -m modules.migrations
+# Show the current version without changing anything:
+# python -m modules.migrations --status
+
+# Arbitrary constant used with pg_advisory_lock so that several app processes
+# starting at once never apply the same migration twice.
+MIGRATION_LOCK_ID = 724_310_001
+
+def _initial_schema(cur):
+    """
+    Migration 1: the original tables from db.create_tables.
+    Kept idempotent so databases created before migrations existed adopt version 1 cleanly.
+    """
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            hashed_password TEXT NOT NULL
+        )
+    ''')
+    
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS progress (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            subject TEXT NOT NULL,
+            
+            -- OLD level (e.g., "beginner") is replaced by IRT score
+            -- NEW: Store the IRT "theta" (ability) score
+            irt_theta_initial REAL,
+            irt_theta_final REAL,
+            
+            topic_index INTEGER DEFAULT 0, -- This is now legacy, BKT is primary
+            status TEXT DEFAULT 'learning', -- learning, assessing, completed
+            assignment_score INTEGER,
+
+            final_assessment_attempts INTEGER DEFAULT 0,    
+            
+            UNIQUE(user_id, subject)
+        )
+    ''')
+
+    # ---
+    # --- SECTION 2: CURRICULUM & PEDAGOGY (REFACTOR)
+    # ---
+    
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS knowledge_units (
+            id SERIAL PRIMARY KEY,
+            ku_code TEXT UNIQUE NOT NULL, -- e.g., "SDF-Fundamentals"
+            ku_name TEXT NOT NULL,
+            description TEXT
+        )
+    ''')
+    
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS topics (
+            id SERIAL PRIMARY KEY,
+            subject TEXT NOT NULL,        -- e.g., "C"
+            ku_id INTEGER REFERENCES knowledge_units(id),
+            topic_name TEXT NOT NULL,
+            topic_order INTEGER, -- Used to order the path
+            UNIQUE(subject, topic_name)
+        )
+    ''')
+    
+    # --- Create ENUM types *only if* they don't exist
+    cur.execute("SELECT 1 FROM pg_type WHERE typname = 'bloom_level'")
+    if cur.fetchone() is None:
+        cur.execute('''
+            CREATE TYPE bloom_level AS ENUM (
+                'Explain',    -- (Bloom: Remember/Understand)
+                'Apply',      -- (Bloom: Understand/Apply)
+                'Evaluate',   -- (Bloom: Analyze/Evaluate)
+                'Develop'     -- (Bloom: Create)
+            )
+        ''')
+        
+    cur.execute("SELECT 1 FROM pg_type WHERE typname = 'intention_type'")
+    if cur.fetchone() is None:
+        cur.execute('''
+            CREATE TYPE intention_type AS ENUM (
+                'Lesson',               -- Main teaching content
+                'Worked_Example',       -- A fully solved problem
+                'Socratic_Question',    -- A guided question
+                'Hint_L1',              -- A vague hint
+                'Hint_L2',              -- A specific hint
+                'Quiz_Question_Apply',  -- An "Apply" level MCQ
+                'Quiz_Question_Eval',   -- An "Evaluate" level MCQ
+                'Code_Challenge',       -- A problem statement
+                'Simple_Explanation'    -- A simpler explanation
+            )
+        ''')
+
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS pedagogical_content (
+            id SERIAL PRIMARY KEY,
+            topic_id INTEGER REFERENCES topics(id) ON DELETE CASCADE,
+            bloom_level bloom_level NOT NULL,
+            intention_type intention_type NOT NULL,
+            content TEXT NOT NULL, -- This is the Markdown, code, or JSON
+            author_notes TEXT,
+            UNIQUE(topic_id, bloom_level, intention_type)
+        )
+    ''')
+
+    # ---
+    # --- SECTION 3: PSYCHOMETRICS (IRT/CAT)
+    # ---
+    
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS question_bank (
+            id SERIAL PRIMARY KEY,
+            topic_id INTEGER REFERENCES topics(id),
+            question_text TEXT NOT NULL,
+            options JSONB NOT NULL, -- e.g., ["A", "B", "C"]
+            correct_option_index INTEGER NOT NULL, -- e.g., 0 for "A"
+            irt_difficulty_b REAL NOT NULL DEFAULT 0.0,
+            irt_discrimination_a REAL NOT NULL DEFAULT 1.0,
+            irt_guessing_c REAL NOT NULL DEFAULT 0.25,
+            
+            -- Track which test this question is for
+            test_type TEXT DEFAULT 'placement' -- 'placement' or 'final'
+        )
+    ''')
+    
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS student_cat_responses (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            question_id INTEGER REFERENCES question_bank(id),
+            test_type TEXT NOT NULL, -- 'placement' or 'final'
+            response_index INTEGER,
+            is_correct BOOLEAN,
+            theta_estimate_after REAL, -- Store ability estimate after each answer
+            timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # ---
+    # --- SECTION 4: STUDENT "BRAIN" (BKT) 
+    # ---
+    
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS bkt_model (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            subject TEXT NOT NULL,
+            
+            -- This now links to the new topics table
+            topic_id INTEGER REFERENCES topics(id) ON DELETE CASCADE,
+            
+            prob_knows REAL DEFAULT 0.0,
+            misconceptions TEXT, -- Stored as JSON array string
+            last_assessed TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, subject, topic_id)
+        )
+    ''')
+
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS learning_log (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            subject TEXT NOT NULL,
+            topic_id INTEGER REFERENCES topics(id),
+            event_type TEXT NOT NULL, 
+            details TEXT,
+            timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+# Indexes for the hot per-user and per-subject lookups. Kept as data so the
+# query benchmark (benchmarks/db_queries.py) can drop them to measure "before".
+HOT_PATH_INDEXES = {
+    'idx_cat_responses_user_type_time': 'student_cat_responses (user_id, test_type, timestamp)',
+    'idx_learning_log_user_subject_time': 'learning_log (user_id, subject, timestamp)',
+    'idx_question_bank_type_topic': 'question_bank (test_type, topic_id)',
+    'idx_topics_subject_order': 'topics (subject, topic_order)',
+    'idx_bkt_model_user_topic': 'bkt_model (user_id, topic_id)',
+    'idx_cat_responses_question': 'student_cat_responses (question_id)',
+}
+
+def _hot_path_indexes(cur):
+    """Migration 2: indexes backing the queries in db, curriculum and psychometrics."""
+    for name, target in HOT_PATH_INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+def _mastery_rollup(cur):
+    """
+    Migration 3: per (user, subject) mastery rollup, kept current by triggers.
+
+    Every statement that writes bkt_model refreshes the rollup rows of the
+    (user, subject) pairs it touched, inside the same transaction, so pages
+    read mastery state as a single-row lookup instead of scanning topics.
+    The threshold lives in mastery_threshold() and must match
+    db.MASTERY_THRESHOLD.
+    """
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS mastery_rollup (
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            subject TEXT NOT NULL,
+            total_topics INTEGER NOT NULL,
+            mastered_count INTEGER NOT NULL,
+            first_unmastered_order INTEGER,     -- NULL once every topic is mastered
+            first_unmastered_topic_id INTEGER,
+            mean_mastery REAL NOT NULL,
+            last_activity TIMESTAMPTZ,
+            PRIMARY KEY (user_id, subject)
+        )
+    ''')
+
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION mastery_threshold() RETURNS REAL
+        LANGUAGE sql IMMUTABLE AS 'SELECT 0.95::real'
+    ''')
+
+    # Recomputes the given (user, subject) pairs from topics + bkt_model.
+    # Topics without a BKT row count as P(Knows) = 0.
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION refresh_mastery_rollup(p_user_ids INTEGER[], p_subjects TEXT[])
+        RETURNS VOID LANGUAGE sql AS $$
+            INSERT INTO mastery_rollup (
+                user_id, subject, total_topics, mastered_count,
+                first_unmastered_order, first_unmastered_topic_id, mean_mastery, last_activity
+            )
+            SELECT
+                pair.user_id,
+                pair.subject,
+                COUNT(t.id),
+                COUNT(*) FILTER (WHERE COALESCE(b.prob_knows, 0) >= mastery_threshold()),
+                MIN(t.topic_order) FILTER (WHERE COALESCE(b.prob_knows, 0) < mastery_threshold()),
+                (array_agg(t.id ORDER BY t.topic_order)
+                    FILTER (WHERE COALESCE(b.prob_knows, 0) < mastery_threshold()))[1],
+                AVG(COALESCE(b.prob_knows, 0)),
+                MAX(b.last_assessed)
+            FROM (
+                SELECT DISTINCT u, s FROM unnest(p_user_ids, p_subjects) AS changed(u, s)
+            ) AS pair(user_id, subject)
+            JOIN users u ON u.id = pair.user_id     -- skip users being deleted
+            JOIN topics t ON t.subject = pair.subject
+            LEFT JOIN bkt_model b
+                ON b.user_id = pair.user_id AND b.subject = pair.subject AND b.topic_id = t.id
+            GROUP BY pair.user_id, pair.subject
+            ON CONFLICT (user_id, subject) DO UPDATE SET
+                total_topics = EXCLUDED.total_topics,
+                mastered_count = EXCLUDED.mastered_count,
+                first_unmastered_order = EXCLUDED.first_unmastered_order,
+                first_unmastered_topic_id = EXCLUDED.first_unmastered_topic_id,
+                mean_mastery = EXCLUDED.mean_mastery,
+                last_activity = EXCLUDED.last_activity
+        $$
+    ''')
+
+    # Rebuilds every rollup, or one subject's; run after curriculum changes.
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION refresh_mastery_rollups(p_subject TEXT DEFAULT NULL)
+        RETURNS VOID LANGUAGE sql AS $$
+            SELECT refresh_mastery_rollup(array_agg(user_id), array_agg(subject))
+            FROM (
+                SELECT DISTINCT user_id, subject FROM bkt_model
+                WHERE p_subject IS NULL OR subject = p_subject
+            ) pairs
+        $$
+    ''')
+
+    # Serializes writers of the same pairs by locking their rollup rows, which
+    # costs no shared lock table entries however many pairs a statement
+    # touches. Missing rows are inserted as placeholders first (so there is a
+    # row to lock) and returned; the caller must refresh those. Both passes go
+    # in (user_id, subject) order so concurrent statements lock alike. The
+    # statements after this one read a snapshot that includes the other writer.
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION lock_mastery_rollups(
+            p_user_ids INTEGER[], p_subjects TEXT[],
+            OUT new_user_ids INTEGER[], OUT new_subjects TEXT[]
+        ) LANGUAGE plpgsql AS $$
+        BEGIN
+            WITH inserted AS (
+                INSERT INTO mastery_rollup (user_id, subject, total_topics, mastered_count, mean_mastery)
+                SELECT pair.u, pair.s, 0, 0, 0
+                FROM (SELECT DISTINCT u, s FROM unnest(p_user_ids, p_subjects) AS changed(u, s)) AS pair
+                JOIN users ON users.id = pair.u     -- skip users being deleted
+                ORDER BY pair.u, pair.s
+                ON CONFLICT (user_id, subject) DO NOTHING
+                RETURNING user_id, subject
+            )
+            SELECT array_agg(i.user_id), array_agg(i.subject) INTO new_user_ids, new_subjects
+            FROM inserted i;
+
+            PERFORM 1
+            FROM mastery_rollup r
+            JOIN (SELECT DISTINCT u, s FROM unnest(p_user_ids, p_subjects) AS changed(u, s)) AS pair
+                ON r.user_id = pair.u AND r.subject = pair.s
+            ORDER BY r.user_id, r.subject
+            FOR UPDATE OF r;
+        END
+        $$
+    ''')
+
+    # Statement-level, so a seed writing every topic refreshes each pair once.
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION mastery_rollup_after_bkt_write() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            user_ids INTEGER[];
+            subjects TEXT[];
+        BEGIN
+            SELECT array_agg(user_id), array_agg(subject) INTO user_ids, subjects
+            FROM (SELECT DISTINCT user_id, subject FROM changed_rows) AS pairs;
+            IF user_ids IS NOT NULL THEN
+                PERFORM lock_mastery_rollups(user_ids, subjects);
+                PERFORM refresh_mastery_rollup(user_ids, subjects);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    ''')
+
+    # A trigger with transition tables can only handle one event
+    for event, transition in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        cur.execute(f"DROP TRIGGER IF EXISTS bkt_model_rollup_{event.lower()} ON bkt_model")
+        cur.execute(f'''
+            CREATE TRIGGER bkt_model_rollup_{event.lower()}
+            AFTER {event} ON bkt_model
+            REFERENCING {transition} TABLE AS changed_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION mastery_rollup_after_bkt_write()
+        ''')
+
+    # Backfill existing students
+    cur.execute("SELECT refresh_mastery_rollups()")
+
+# Append-only history tables partitioned by month on "timestamp" (migration 4).
+# Column lists are the insert order used when copying the unpartitioned data.
+PARTITIONED_TABLES = {
+    'learning_log': {
+        'columns': ('id', 'user_id', 'subject', 'topic_id', 'event_type', 'details', 'timestamp'),
+        'ddl': '''
+            id BIGINT NOT NULL,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            subject TEXT NOT NULL,
+            topic_id INTEGER REFERENCES topics(id),
+            event_type TEXT NOT NULL,
+            details TEXT,
+            timestamp TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, timestamp)
+        ''',
+        'indexes': ('idx_learning_log_user_subject_time',),
+    },
+    'student_cat_responses': {
+        'columns': ('id', 'user_id', 'question_id', 'test_type', 'response_index', 'is_correct', 'theta_estimate_after', 'timestamp'),
+        'ddl': '''
+            id BIGINT NOT NULL,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            question_id INTEGER REFERENCES question_bank(id),
+            test_type TEXT NOT NULL,
+            response_index INTEGER,
+            is_correct BOOLEAN,
+            theta_estimate_after REAL,
+            timestamp TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, timestamp)
+        ''',
+        'indexes': ('idx_cat_responses_user_type_time', 'idx_cat_responses_question'),
+    },
+}
+
+# Monthly partitions are created this far ahead so inserts never hit the default partition.
+PARTITION_MONTHS_AHEAD = 3
+
+def _partition_event_logs(cur):
+    """
+    Migration 4: range-partition learning_log and student_cat_responses by
+    month. Existing rows are copied into the new partitions and the id
+    sequences are kept (widened to BIGINT), so ids continue where they were.
+    Partitions are named <table>_pYYYY_MM; a <table>_default partition
+    catches rows outside the created months.
+    """
+    # Creates any missing monthly partitions between two dates. Rows already
+    # sitting in the default partition for a new month are moved into it.
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION ensure_monthly_partitions(p_parent TEXT, p_from DATE, p_to DATE)
+        RETURNS INTEGER LANGUAGE plpgsql AS $$
+        DECLARE
+            month_start DATE := date_trunc('month', p_from)::date;
+            month_end DATE;
+            part TEXT;
+            created INTEGER := 0;
+        BEGIN
+            WHILE month_start <= p_to LOOP
+                month_end := (month_start + interval '1 month')::date;
+                part := format('%s_p%s', p_parent, to_char(month_start, 'YYYY_MM'));
+                IF to_regclass(part) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part, p_parent);
+                    EXECUTE format(
+                        'WITH moved AS (DELETE FROM %I WHERE "timestamp" >= %L AND "timestamp" < %L RETURNING *) '
+                        'INSERT INTO %I SELECT * FROM moved',
+                        p_parent || '_default', month_start, month_end, part
+                    );
+                    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                                   p_parent, part, month_start, month_end);
+                    created := created + 1;
+                END IF;
+                month_start := month_end;
+            END LOOP;
+            RETURN created;
+        END
+        $$
+    ''')
+
+    for table, spec in PARTITIONED_TABLES.items():
+        old = f"{table}_unpartitioned"
+        columns = ", ".join(f'"{c}"' for c in spec['columns'])
+
+        cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+        sequence = cur.fetchone()[0]
+
+        # Move the old table (and the names of its key and indexes) out of the way
+        cur.execute(f"ALTER TABLE {table} RENAME TO {old}")
+        cur.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+        for index in spec['indexes']:
+            cur.execute(f"DROP INDEX IF EXISTS {index}")
+
+        cur.execute(f"CREATE TABLE {table} ({spec['ddl']}) PARTITION BY RANGE (timestamp)")
+        cur.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        cur.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        cur.execute(f"ALTER SEQUENCE {sequence} AS BIGINT OWNED BY {table}.id")
+
+        cur.execute(
+            f"""
+            SELECT ensure_monthly_partitions(
+                %s,
+                COALESCE(MIN(timestamp), now())::date,
+                (now() + %s * interval '1 month')::date
+            )
+            FROM {old}
+            """,
+            (table, PARTITION_MONTHS_AHEAD)
+        )
+        cur.execute(
+            f"""
+            INSERT INTO {table} ({columns})
+            SELECT {columns.replace('"timestamp"', 'COALESCE("timestamp", CURRENT_TIMESTAMP)')} FROM {old}
+            """
+        )
+        cur.execute(f"DROP TABLE {old}")
+
+        # Partitioned indexes: created on every current and future partition
+        for index in spec['indexes']:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {HOT_PATH_INDEXES[index]}")
+
+def ensure_partitions(conn, months_back=0, months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Creates the monthly partitions from `months_back` months ago to
+    `months_ahead` months from now for every partitioned table. Cheap when
+    they already exist; run at startup and from the archive job.
+    """
+    cur = conn.cursor()
+    for table in PARTITIONED_TABLES:
+        cur.execute(
+            """
+            SELECT ensure_monthly_partitions(
+                %s,
+                (now() - %s * interval '1 month')::date,
+                (now() + %s * interval '1 month')::date
+            )
+            """,
+            (table, months_back, months_ahead)
+        )
+    conn.commit()
+    cur.close()
+
+def _misconception_memory(cur):
+    """
+    Migration 5: move bkt_model.misconceptions (a JSON array in a TEXT column)
+    into bkt_misconceptions, one row per distinct text with a frequency count.
+    Existing lists keep their order through last_seen; each backfilled list
+    is cut to the 5 most recent entries and 500 characters per entry, the
+    defaults the write path enforces from then on.
+    """
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS bkt_misconceptions (
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            topic_id INTEGER REFERENCES topics(id) ON DELETE CASCADE,
+            text_hash TEXT NOT NULL,            -- md5 of the full text, for dedup
+            misconception TEXT NOT NULL,
+            frequency INTEGER NOT NULL DEFAULT 1,
+            first_seen TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_seen TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, topic_id, text_hash)
+        )
+    ''')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bkt_misconceptions_recent ON bkt_misconceptions (user_id, topic_id, last_seen DESC)")
+
+    cur.execute('''
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'bkt_model' AND column_name = 'misconceptions'
+    ''')
+    if cur.fetchone() is None:
+        return
+
+    # Old rows may hold anything; treat unparsable text as an empty list
+    cur.execute('''
+        CREATE FUNCTION pg_temp.misconception_list(raw TEXT) RETURNS JSONB
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF jsonb_typeof(raw::jsonb) = 'array' THEN
+                RETURN raw::jsonb;
+            END IF;
+            RETURN '[]'::jsonb;
+        EXCEPTION WHEN others THEN
+            RETURN '[]'::jsonb;
+        END
+        $$
+    ''')
+    cur.execute('''
+        INSERT INTO bkt_misconceptions (user_id, topic_id, text_hash, misconception, frequency, first_seen, last_seen)
+        SELECT user_id, topic_id, text_hash, left(misconception, 500), COUNT(*), MIN(seen), MAX(seen)
+        FROM (
+            SELECT
+                b.user_id,
+                b.topic_id,
+                md5(item.value) AS text_hash,
+                item.value AS misconception,
+                -- Later list entries were appended later
+                COALESCE(b.last_assessed, CURRENT_TIMESTAMP)
+                    - (jsonb_array_length(pg_temp.misconception_list(b.misconceptions)) - item.position) * interval '1 second' AS seen
+            FROM bkt_model b
+            CROSS JOIN LATERAL jsonb_array_elements_text(pg_temp.misconception_list(b.misconceptions))
+                WITH ORDINALITY AS item(value, position)
+            WHERE b.misconceptions IS NOT NULL AND b.user_id IS NOT NULL
+        ) items
+        GROUP BY user_id, topic_id, text_hash, misconception
+        ON CONFLICT (user_id, topic_id, text_hash) DO NOTHING
+    ''')
+    cur.execute('''
+        DELETE FROM bkt_misconceptions m
+        USING (
+            SELECT user_id, topic_id, text_hash,
+                   row_number() OVER (PARTITION BY user_id, topic_id ORDER BY last_seen DESC) AS recency
+            FROM bkt_misconceptions
+        ) ranked
+        WHERE ranked.recency > 5
+          AND m.user_id = ranked.user_id AND m.topic_id = ranked.topic_id AND m.text_hash = ranked.text_hash
+    ''')
+    cur.execute("ALTER TABLE bkt_model DROP COLUMN misconceptions")
+
+def _loader_keys(cur):
+    """
+    Migration 6: stable keys for the curriculum loader's diffs.
+    question_bank had no natural key, so every loader run appended the whole
+    bank again. Questions now carry content_key (md5 of subject, topic, test
+    type and question text) and content_hash (md5 of the whole item). Copies
+    left by earlier runs are merged into the oldest one, with their responses
+    repointed to it. Questions dropped from the source file are retired, not
+    deleted, since responses reference them. loader_files remembers each
+    source file's hash so unchanged files are skipped.
+    """
+    cur.execute('''
+        ALTER TABLE question_bank
+            ADD COLUMN IF NOT EXISTS content_key TEXT,
+            ADD COLUMN IF NOT EXISTS content_hash TEXT,
+            ADD COLUMN IF NOT EXISTS retired BOOLEAN NOT NULL DEFAULT false
+    ''')
+    # Same key as data/load_curriculum.py: the fields joined by the unit separator
+    cur.execute(r'''
+        UPDATE question_bank q
+        SET content_key = md5(concat_ws(E'\x1f', t.subject, t.topic_name, COALESCE(q.test_type, 'placement'), q.question_text))
+        FROM topics t
+        WHERE t.id = q.topic_id
+    ''')
+    cur.execute('''
+        CREATE TEMP TABLE question_duplicates ON COMMIT DROP AS
+        SELECT id, min(id) OVER (PARTITION BY content_key) AS keep_id
+        FROM question_bank
+        WHERE content_key IS NOT NULL
+    ''')
+    cur.execute('''
+        UPDATE student_cat_responses r
+        SET question_id = d.keep_id
+        FROM question_duplicates d
+        WHERE r.question_id = d.id AND d.id <> d.keep_id
+    ''')
+    cur.execute('''
+        DELETE FROM question_bank q
+        USING question_duplicates d
+        WHERE q.id = d.id AND d.id <> d.keep_id
+    ''')
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_question_bank_content_key ON question_bank (content_key)")
+
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS loader_files (
+            path TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            loaded_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _item_calibrations(cur):
+    """
+    Migration 10: versioned IRT item calibrations (data/calibrate_items.py).
+    Each run is a row of item_calibrations with the parameters it fitted in
+    item_calibration_params; question_bank.calibration_id tags the run its
+    current parameters come from (NULL = hand-entered values from the file).
+    """
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS item_calibrations (
+            id SERIAL PRIMARY KEY,
+            model TEXT NOT NULL, -- '2pl' or '3pl'
+            responses BIGINT NOT NULL,
+            students INTEGER NOT NULL,
+            items INTEGER NOT NULL,
+            since TIMESTAMPTZ,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS item_calibration_params (
+            calibration_id INTEGER NOT NULL REFERENCES item_calibrations(id) ON DELETE CASCADE,
+            question_id INTEGER NOT NULL REFERENCES question_bank(id),
+            irt_difficulty_b REAL NOT NULL,
+            irt_discrimination_a REAL NOT NULL,
+            irt_guessing_c REAL NOT NULL,
+            responses INTEGER NOT NULL,
+            iterations INTEGER NOT NULL,
+            converged BOOLEAN NOT NULL,
+            PRIMARY KEY (calibration_id, question_id)
+        )
+    ''')
+    cur.execute("ALTER TABLE question_bank ADD COLUMN IF NOT EXISTS calibration_id INTEGER REFERENCES item_calibrations(id)")
+
+def _incremental_mastery_rollup(cur):
+    """
+    Migration 11: maintain mastery_rollup from each statement's changes
+    instead of re-aggregating the subject on every BKT write.
+
+    The statement triggers pass the old and new prob_knows of the rows they
+    changed (a missing row counts as 0) to apply_mastery_rollup_delta(), which
+    adjusts mastered_count and a running mastery_sum per (user, subject).
+    The first unmastered topic only moves back when a changed topic before it
+    drops below the threshold, and forward (an index scan from its position)
+    when that topic itself becomes mastered. A pair without a rollup row
+    yet is computed in full once, and so is every pair of a statement that
+    touches more than 1000 pairs (a bulk seed or a cascade delete), where
+    one set-based refresh beats a loop. last_activity only moves forward; row
+    deletes come from deleted users (whose rollups cascade) or curriculum
+    changes, after which the loader runs refresh_mastery_rollups().
+    """
+    cur.execute("ALTER TABLE mastery_rollup ADD COLUMN IF NOT EXISTS mastery_sum DOUBLE PRECISION NOT NULL DEFAULT 0")
+
+    # Same as migration 3, plus mastery_sum
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION refresh_mastery_rollup(p_user_ids INTEGER[], p_subjects TEXT[])
+        RETURNS VOID LANGUAGE sql AS $$
+            INSERT INTO mastery_rollup (
+                user_id, subject, total_topics, mastered_count,
+                first_unmastered_order, first_unmastered_topic_id, mean_mastery, mastery_sum, last_activity
+            )
+            SELECT
+                pair.user_id,
+                pair.subject,
+                COUNT(t.id),
+                COUNT(*) FILTER (WHERE COALESCE(b.prob_knows, 0) >= mastery_threshold()),
+                MIN(t.topic_order) FILTER (WHERE COALESCE(b.prob_knows, 0) < mastery_threshold()),
+                (array_agg(t.id ORDER BY t.topic_order)
+                    FILTER (WHERE COALESCE(b.prob_knows, 0) < mastery_threshold()))[1],
+                AVG(COALESCE(b.prob_knows, 0)),
+                SUM(COALESCE(b.prob_knows, 0)),
+                MAX(b.last_assessed)
+            FROM (
+                SELECT DISTINCT u, s FROM unnest(p_user_ids, p_subjects) AS changed(u, s)
+            ) AS pair(user_id, subject)
+            JOIN users u ON u.id = pair.user_id     -- skip users being deleted
+            JOIN topics t ON t.subject = pair.subject
+            LEFT JOIN bkt_model b
+                ON b.user_id = pair.user_id AND b.subject = pair.subject AND b.topic_id = t.id
+            GROUP BY pair.user_id, pair.subject
+            ON CONFLICT (user_id, subject) DO UPDATE SET
+                total_topics = EXCLUDED.total_topics,
+                mastered_count = EXCLUDED.mastered_count,
+                first_unmastered_order = EXCLUDED.first_unmastered_order,
+                first_unmastered_topic_id = EXCLUDED.first_unmastered_topic_id,
+                mean_mastery = EXCLUDED.mean_mastery,
+                mastery_sum = EXCLUDED.mastery_sum,
+                last_activity = EXCLUDED.last_activity
+        $$
+    ''')
+
+    # One element per changed bkt_model row: old and new P(Knows), 0 for no row.
+    # lock_mastery_rollups() (migration 3) serializes writers of one pair, so
+    # the forward scan for the next unmastered topic sees the other writer's rows.
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION apply_mastery_rollup_delta(
+            p_user_ids INTEGER[], p_subjects TEXT[], p_topic_ids INTEGER[],
+            p_old REAL[], p_new REAL[], p_assessed TIMESTAMPTZ[]
+        ) RETURNS VOID LANGUAGE plpgsql AS $$
+        DECLARE
+            pair RECORD;
+            rollup RECORD;
+            first_order INTEGER;
+            first_id INTEGER;
+            new_user_ids INTEGER[];
+            new_subjects TEXT[];
+        BEGIN
+            SELECT l.new_user_ids, l.new_subjects INTO new_user_ids, new_subjects
+            FROM lock_mastery_rollups(p_user_ids, p_subjects) l;
+            IF (SELECT COUNT(*) FROM (SELECT DISTINCT u, s FROM unnest(p_user_ids, p_subjects) AS c(u, s)) AS pairs) > 1000 THEN
+                PERFORM refresh_mastery_rollup(p_user_ids, p_subjects);
+                RETURN;
+            END IF;
+            IF new_user_ids IS NOT NULL THEN
+                PERFORM refresh_mastery_rollup(new_user_ids, new_subjects);
+            END IF;
+
+            FOR pair IN
+                SELECT
+                    c.user_id,
+                    c.subject,
+                    SUM(c.new_p - c.old_p) AS sum_delta,
+                    SUM((c.new_p >= mastery_threshold())::int - (c.old_p >= mastery_threshold())::int) AS mastered_delta,
+                    MAX(c.assessed) AS assessed,
+                    MIN(t.topic_order) FILTER (WHERE c.new_p < mastery_threshold()) AS unmastered_order,
+                    (array_agg(t.id ORDER BY t.topic_order) FILTER (WHERE c.new_p < mastery_threshold()))[1] AS unmastered_id,
+                    array_agg(t.id) FILTER (WHERE c.new_p >= mastery_threshold()) AS mastered_ids
+                FROM unnest(p_user_ids, p_subjects, p_topic_ids, p_old, p_new, p_assessed)
+                    AS c(user_id, subject, topic_id, old_p, new_p, assessed)
+                JOIN topics t ON t.id = c.topic_id
+                -- Pairs refreshed above already include this statement
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM unnest(new_user_ids, new_subjects) AS n(u, s)
+                    WHERE n.u = c.user_id AND n.s = c.subject
+                )
+                GROUP BY c.user_id, c.subject
+                ORDER BY c.user_id, c.subject
+            LOOP
+                SELECT * INTO rollup FROM mastery_rollup
+                WHERE user_id = pair.user_id AND subject = pair.subject;
+                IF NOT FOUND THEN
+                    CONTINUE;   -- the user is being deleted
+                END IF;
+
+                first_order := rollup.first_unmastered_order;
+                first_id := rollup.first_unmastered_topic_id;
+                IF first_id = ANY(pair.mastered_ids) THEN
+                    -- Topics before it were mastered; this statement's own changes are handled below
+                    SELECT t.topic_order, t.id INTO first_order, first_id
+                    FROM topics t
+                    LEFT JOIN bkt_model b
+                        ON b.user_id = pair.user_id AND b.subject = pair.subject AND b.topic_id = t.id
+                    WHERE t.subject = pair.subject AND t.topic_order >= first_order
+                      AND COALESCE(b.prob_knows, 0) < mastery_threshold()
+                    ORDER BY t.topic_order
+                    LIMIT 1;
+                END IF;
+                IF pair.unmastered_order < first_order OR (first_id IS NULL AND pair.unmastered_id IS NOT NULL) THEN
+                    first_order := pair.unmastered_order;
+                    first_id := pair.unmastered_id;
+                END IF;
+
+                UPDATE mastery_rollup SET
+                    mastered_count = mastered_count + pair.mastered_delta,
+                    mastery_sum = mastery_sum + pair.sum_delta,
+                    mean_mastery = (mastery_sum + pair.sum_delta) / NULLIF(total_topics, 0),
+                    first_unmastered_order = first_order,
+                    first_unmastered_topic_id = first_id,
+                    last_activity = GREATEST(last_activity, pair.assessed)
+                WHERE user_id = pair.user_id AND subject = pair.subject;
+            END LOOP;
+        END
+        $$
+    ''')
+
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION mastery_rollup_after_bkt_write() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM apply_mastery_rollup_delta(
+                    array_agg(user_id), array_agg(subject), array_agg(topic_id),
+                    array_agg(0::real), array_agg(COALESCE(prob_knows, 0)), array_agg(last_assessed)
+                ) FROM new_rows HAVING COUNT(*) > 0;
+            ELSIF TG_OP = 'UPDATE' THEN
+                PERFORM apply_mastery_rollup_delta(
+                    array_agg(n.user_id), array_agg(n.subject), array_agg(n.topic_id),
+                    array_agg(COALESCE(o.prob_knows, 0)), array_agg(COALESCE(n.prob_knows, 0)), array_agg(n.last_assessed)
+                ) FROM old_rows o JOIN new_rows n ON n.id = o.id HAVING COUNT(*) > 0;
+            ELSE
+                PERFORM apply_mastery_rollup_delta(
+                    array_agg(user_id), array_agg(subject), array_agg(topic_id),
+                    array_agg(COALESCE(prob_knows, 0)), array_agg(0::real), array_agg(NULL::timestamptz)
+                ) FROM old_rows HAVING COUNT(*) > 0;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    ''')
+
+    # The UPDATE trigger needs both transition tables; the function names them old_rows / new_rows
+    for event, transitions in (('INSERT', 'NEW TABLE AS new_rows'),
+                               ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+                               ('DELETE', 'OLD TABLE AS old_rows')):
+        cur.execute(f"DROP TRIGGER IF EXISTS bkt_model_rollup_{event.lower()} ON bkt_model")
+        cur.execute(f'''
+            CREATE TRIGGER bkt_model_rollup_{event.lower()}
+            AFTER {event} ON bkt_model
+            REFERENCING {transitions}
+            FOR EACH STATEMENT EXECUTE FUNCTION mastery_rollup_after_bkt_write()
+        ''')
+
+    # Fill mastery_sum for existing rollups
+    cur.execute("SELECT refresh_mastery_rollups()")
+
+# ---
+# --- MIGRATION REGISTRY
+# ---
+# Append new steps to the end with the next version number; never edit or
+# renumber a migration that has already shipped. A step is either a SQL
+# string or a function that receives a cursor.
+
+MIGRATIONS = [
+    (1, "Initial schema (users, progress, curriculum, question bank, BKT, logs)", _initial_schema),
+    (2, "Indexes for hot query paths", _hot_path_indexes),
+    (3, "Trigger-maintained mastery rollup per user and subject", _mastery_rollup),
+    (4, "Monthly partitioning for learning_log and student_cat_responses", _partition_event_logs),
+    (5, "Bounded misconception memory in bkt_misconceptions", _misconception_memory),
+    (6, "Stable question keys and loader file hashes for diffed curriculum loads", _loader_keys),
+    # 7: change feed read by app processes after a NOTIFY (modules/catalog_events.py)
+    (7, "Curriculum change feed for cache invalidation", '''
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            id BIGSERIAL PRIMARY KEY,
+            payload JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    '''),
+    # 8: optional prerequisite DAG from the curriculum files (see modules/curriculum_graph.py)
+    (8, "Topic prerequisites", '''
+        CREATE TABLE IF NOT EXISTS topic_prerequisites (
+            topic_id INTEGER NOT NULL REFERENCES topics(id) ON DELETE CASCADE,
+            prerequisite_id INTEGER NOT NULL REFERENCES topics(id) ON DELETE CASCADE,
+            PRIMARY KEY (topic_id, prerequisite_id),
+            CHECK (topic_id <> prerequisite_id)
+        )
+    '''),
+    # 9: one in-progress adaptive test per student, subject and test type (see psychometrics.CatSession)
+    (9, "Resumable CAT sessions", '''
+        CREATE TABLE IF NOT EXISTS cat_sessions (
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            subject TEXT NOT NULL,
+            test_type TEXT NOT NULL, -- 'placement' or 'final'
+            bank_version BIGINT NOT NULL,
+            test_length SMALLINT NOT NULL,
+            item_ids INTEGER[] NOT NULL DEFAULT '{}',
+            responses BYTEA NOT NULL DEFAULT ''::bytea, -- bit k set = answer k correct
+            theta REAL NOT NULL DEFAULT 0,
+            se REAL,
+            current_item_id INTEGER,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, subject, test_type)
+        )
+    '''),
+    (10, "Versioned IRT item calibrations", _item_calibrations),
+    (11, "Incremental mastery rollup from BKT row changes", _incremental_mastery_rollup),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def _ensure_version_table(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def get_schema_version(conn):
+    """Returns the highest applied migration version, or 0 for an empty database."""
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        version = 0
+    else:
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        version = cur.fetchone()[0]
+    cur.close()
+    conn.rollback() # Don't leave a read transaction open on the caller's connection
+    return version
+
+def migrate(conn, target=LATEST_VERSION):
+    """
+    Applies every pending migration up to `target`, each in its own transaction.
+    Returns the list of versions that were applied (empty if already current).
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    applied = []
+    try:
+        _ensure_version_table(cur)
+        conn.commit()
+
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        current = cur.fetchone()[0]
+
+        for version, description, step in MIGRATIONS:
+            if version <= current or version > target:
+                continue
+            try:
+                if callable(step):
+                    step(cur)
+                else:
+                    cur.execute(step)
+                cur.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        cur.close()
+    return applied
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    load_dotenv()
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        print("DATABASE_URL not found in .env file.")
+        return 1
+
+    conn = psycopg2.connect(db_url)
+    try:
+        current = get_schema_version(conn)
+        if "--status" in argv:
+            print(f"Schema version: {current} (latest: {LATEST_VERSION})")
+            return 0
+
+        applied = migrate(conn)
+        if applied:
+            print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+        print(f"Schema is at version {get_schema_version(conn)}.")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,95 +1,242 @@
-import streamlit as st
-from . import db
+from . import db, irt
 import numpy as np
-from catsim.simulation import Simulator
-from catsim.initialization import FixedPointInitializer
-from catsim.selection import MaxInfoSelector
-from catsim.estimation import NumericalSearchEstimator 
-from catsim.stopping import MaxItemStopper
+from .irt import THETA_GRID, prob_correct
+
+# --- CAT Engine Settings ---
+# Ability is estimated over the fixed quadrature grid irt.THETA_GRID, so every
+# step is a few vectorized NumPy operations whatever the bank size.
+PRIOR_MEAN = 0.0                         # Standard normal ability prior for EAP
+PRIOR_SD = 1.0
+LOG_PRIOR = -0.5 * ((THETA_GRID - PRIOR_MEAN) / PRIOR_SD) ** 2
+CAT_ESTIMATOR = 'mle'                    # 'mle' (falls back to EAP until answers are mixed) or 'eap'
 
-@st.cache_data(ttl=3600)
 def get_irt_question_bank(subject, test_type='placement'):
     """
-    Loads the IRT question bank from the database.
+    Gets the IRT question bank from the in-memory catalog snapshot:
+    (item_bank, item_map, information), where item_bank is the read-only
+    N x 3 view of [discrimination (a), difficulty (b), guessing (c)] (3PL),
+    item_map is the shared ItemBank (indexing it by row gives the question
+    record) and information is the bank's precomputed irt.InformationTable.
+    """
+    bank = db.get_catalog().question_bank(subject, test_type)
+    if bank is None:
+        return None, None, None
+    return bank.item_params, bank, bank.information
+
+class CatEngine:
+    """
+    Computerized adaptive test over a 3PL item bank, replacing the catsim
+    selector and estimator. It keeps no per-student state: callers pass
+    the administered item indices and responses on every call. Building one
+    only takes views of the bank arrays, so an engine is rebuilt from the
+    catalog on every rerun instead of being kept per session.
+
+    - select(): the unadministered item with the most information at the
+      THETA_GRID point nearest theta, read from the bank's precomputed
+      InformationTable (built here if none is given).
+    - estimate(): MLE or EAP of theta from the responses, evaluated on
+      THETA_GRID (the MLE is refined between grid points).
     """
-    conn = db.get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
+
+    def __init__(self, item_bank, test_length=20, estimator=CAT_ESTIMATOR, information=None):
+        item_bank = np.asarray(item_bank, dtype=float)
+        self.information = information if information is not None else irt.InformationTable(item_bank)
+        self.a, self.b, self.c = item_bank[:, 0], item_bank[:, 1], item_bank[:, 2]
+        self.test_length = test_length
+        self.estimator = estimator
+
+    def __len__(self):
+        return len(self.a)
+
+    def select(self, administered_items, est_theta):
+        """Index of the next item, or None if every item has been administered."""
+        return self.information.best_item(est_theta, set(administered_items))
+
+    def log_likelihood(self, administered_items, response_vector):
+        """Log-likelihood of the responses at every THETA_GRID point."""
+        items = np.asarray(administered_items, dtype=np.intp)
+        correct = np.asarray(response_vector, dtype=bool)
+        if not len(items):
+            return np.zeros_like(THETA_GRID)
+        p = prob_correct(THETA_GRID[None, :], self.a[items, None], self.b[items, None], self.c[items, None])
+        p = np.clip(p, 1e-12, 1.0 - 1e-12)   # Keeps c = 0 items finite at the grid ends
+        return np.where(correct[:, None], np.log(p), np.log1p(-p)).sum(axis=0)
+
+    def estimate(self, administered_items, response_vector, est_theta=None):
         """
-        SELECT id, topic_id, irt_difficulty_b, irt_discrimination_a, irt_guessing_c,
-               question_text, options, correct_option_index
-        FROM question_bank
-        WHERE topic_id IN (SELECT id FROM topics WHERE subject = %s)
-        AND test_type = %s
-        """,
-        (subject, test_type)
-    )
-    questions = cur.fetchall()
-    cur.close()
-    conn.close()
-    
-    if not questions:
-        return None, None
-        
-    # Original format intention: [discrimination (a), difficulty (b), guessing (c)] (3PL)
-    item_bank_3pl = []
-    item_map = {} # maps simulator index to db record
-    
-    for i, q in enumerate(questions):
-        disc = q['irt_discrimination_a'] if q['irt_discrimination_a'] is not None else 1.0
-        diff = q['irt_difficulty_b'] if q['irt_difficulty_b'] is not None else 0.0
-        guess = q['irt_guessing_c'] if q['irt_guessing_c'] is not None else 0.25
-        
-        item_bank_3pl.append([disc, diff, guess]) 
-        item_map[i] = q 
-        
-    # *** FIX FOR CATSIM 0.17.3 INDEXERROR ***
-    # The old catsim library internally assumes 4 parameters (4PL) for validation.
-    # We must append a 4th column (upper asymptote, d=1.0) to avoid the IndexError.
-    
-    item_bank_3pl_np = np.array(item_bank_3pl)
-    
-    # Create an array of 1.0s for the 4th parameter (d)
-    d_param = np.ones((item_bank_3pl_np.shape[0], 1))
-    
-    # Concatenate the 3PL parameters with the new d parameter
-    item_bank = np.concatenate((item_bank_3pl_np, d_param), axis=1)
-    
-    # This item_bank now has the required (N x 4) shape: [a, b, c, d]
-    return item_bank, item_map
-
-def initialize_cat_simulator(item_bank, test_length=20):
+        Ability estimate after the given responses. est_theta (the previous
+        estimate) is accepted for compatibility with the catsim call and is
+        returned unchanged when nothing has been answered yet.
+        """
+        if not len(administered_items):
+            return PRIOR_MEAN if est_theta is None else est_theta
+        log_likelihood = self.log_likelihood(administered_items, response_vector)
+        responses = np.asarray(response_vector, dtype=bool)
+        # The MLE runs off the grid while every answer is right (or wrong)
+        if self.estimator == 'eap' or responses.all() or not responses.any():
+            return self._eap(log_likelihood)
+        return self._mle(log_likelihood)
+
+    def standard_error(self, administered_items, theta):
+        """1 / sqrt(test information) at theta; None before the first answer."""
+        items = np.asarray(administered_items, dtype=np.intp)
+        if not len(items):
+            return None
+        information = irt.item_information(theta, self.a[items], self.b[items], self.c[items]).sum()
+        return float(1.0 / np.sqrt(information)) if information > 0 else None
+
+    @staticmethod
+    def _eap(log_likelihood):
+        log_posterior = log_likelihood + LOG_PRIOR
+        weights = np.exp(log_posterior - log_posterior.max())
+        return float(np.dot(weights, THETA_GRID) / weights.sum())
+
+    @staticmethod
+    def _mle(log_likelihood):
+        i = int(np.argmax(log_likelihood))
+        if i == 0 or i == len(THETA_GRID) - 1:
+            return float(THETA_GRID[i])
+        # Vertex of the parabola through the peak and its neighbours
+        left, mid, right = log_likelihood[i - 1:i + 2]
+        curvature = left - 2 * mid + right
+        offset = 0.5 * (left - right) / curvature if curvature < 0 else 0.0
+        return float(THETA_GRID[i] + offset * irt.THETA_STEP)
+
+def initialize_cat_engine(item_bank, test_length=20, information=None):
     """
-    Initializes a catsim Simulator object.
-    
-    *** MODIFIED FOR CATSIM 0.17.3: REMOVED ALL 'model' KWARGS ***
+    Creates the CatEngine for a question bank from get_irt_question_bank().
+    Returns None for an empty bank.
     """
     if item_bank is None or len(item_bank) == 0:
         return None
-        
-    # 1. Initializer: Start all students at theta = 0 (average)
-    initializer = FixedPointInitializer(0)
-    
-    # 2. Selector: Initialize without 'model'
-    selector = MaxInfoSelector()
-    
-    # 3. Estimator: Initialize without 'model'
-    estimator = NumericalSearchEstimator()
-    
-    # 4. Stopper: Stop after a fixed number of questions
-    stopper = MaxItemStopper(test_length) 
-    
-    # 5. Create the simulator (no 'model' keyword allowed)
-    simulator = Simulator(
-        item_bank,              
-        1,                      
-        initializer,            
-        selector,               
-        estimator,              
-        stopper                 
+    return CatEngine(item_bank, test_length, information=information)
+
+# --- Resumable CAT Sessions ---
+
+class CatSession:
+    """
+    Compact state of one student's adaptive test, small enough to keep in
+    st.session_state and persisted to cat_sessions after every answer so the
+    test survives a refresh, a reconnect or a move to another app instance.
+
+    Items are stored by question id (not bank row), so a session stays valid
+    when the catalog is reloaded; `responses` packs the answers as bits
+    (bit k set = answer k was correct). Its size depends on the test length
+    only: the bank itself is the catalog's shared ItemBank (see get_cat_bank()).
+    """
+
+    __slots__ = (
+        'user_id', 'subject', 'test_type', 'bank_version', 'test_length',
+        'item_ids', 'responses', 'theta', 'se', 'current_item_id',
     )
-    
-    return simulator
+
+    def __init__(self, user_id, subject, test_type, bank_version, test_length,
+                 item_ids=(), responses=0, theta=0.0, se=None, current_item_id=None):
+        self.user_id = user_id
+        self.subject = subject
+        self.test_type = test_type
+        self.bank_version = bank_version
+        self.test_length = test_length
+        self.item_ids = list(item_ids)
+        self.responses = responses
+        self.theta = theta
+        self.se = se
+        self.current_item_id = current_item_id
+
+    @property
+    def answered(self):
+        return len(self.item_ids)
+
+    @property
+    def is_complete(self):
+        return self.answered >= self.test_length
+
+    def response_vector(self):
+        return [bool(self.responses >> k & 1) for k in range(self.answered)]
+
+    def record(self, item_id, is_correct):
+        if is_correct:
+            self.responses |= 1 << self.answered
+        self.item_ids.append(item_id)
+
+    def to_row(self):
+        row = {name: getattr(self, name) for name in self.__slots__}
+        row['responses'] = self.responses.to_bytes((self.answered + 7) // 8, 'little')
+        return row
+
+    @classmethod
+    def from_row(cls, row):
+        row = dict(row)
+        row['responses'] = int.from_bytes(row['responses'], 'little')
+        return cls(**row)
+
+class CatBank:
+    """One ItemBank of the current catalog snapshot with a CatEngine over its arrays."""
+
+    def __init__(self, version, items):
+        self.version = version
+        self.items = items
+        self.engine = CatEngine(items.item_params, information=items.information) if items is not None else None
+
+    def __len__(self):
+        return len(self.items) if self.items is not None else 0
+
+    def administered(self, session):
+        """(rows, responses) of the session's answers that are still in this bank."""
+        rows, responses = [], []
+        for item_id, correct in zip(session.item_ids, session.response_vector()):
+            row = self.items.row_of(item_id)
+            if row is not None:
+                rows.append(row)
+                responses.append(correct)
+        return rows, responses
+
+def get_cat_bank(subject, test_type):
+    """The CatBank for a subject and test from the catalog snapshot (O(1); nothing is copied)."""
+    catalog = db.get_catalog()
+    return CatBank(catalog.version, catalog.question_bank(subject, test_type))
+
+def start_cat_session(user_id, subject, test_type, test_length, initial_theta=0.0, bank=None):
+    """A new session; it is saved when its first question is selected."""
+    bank = bank or get_cat_bank(subject, test_type)
+    return CatSession(user_id, subject, test_type, bank.version, test_length, theta=initial_theta)
+
+def resume_cat_session(user_id, subject, test_type):
+    """The student's saved in-progress session, or None."""
+    row = db.load_cat_session(user_id, subject, test_type)
+    return CatSession.from_row(row) if row else None
+
+def current_cat_question(session, bank):
+    """
+    The question record the student should answer now. Selects (and saves)
+    the next item when none is pending; None if the bank has run out.
+    """
+    row = bank.items.row_of(session.current_item_id)
+    if row is not None:
+        return bank.items.question(row)
+    rows, _ = bank.administered(session)
+    row = bank.engine.select(rows, session.theta)
+    if row is None:
+        return None
+    question = bank.items.question(row)
+    session.current_item_id = question['id']
+    session.bank_version = bank.version
+    db.save_cat_session(session.to_row())
+    return question
+
+def record_cat_answer(session, bank, is_correct):
+    """Records the answer to the pending question, re-estimates theta and SE, and saves. Returns theta."""
+    session.record(session.current_item_id, is_correct)
+    rows, responses = bank.administered(session)
+    session.theta = float(bank.engine.estimate(rows, responses, session.theta))
+    session.se = bank.engine.standard_error(rows, session.theta)
+    session.current_item_id = None
+    db.save_cat_session(session.to_row())
+    return session.theta
+
+def finish_cat_session(session):
+    """Deletes the saved session once its results have been stored."""
+    db.delete_cat_session(session.user_id, session.subject, session.test_type)
 
 def map_theta_to_bkt_prior(theta):
     """
@@ -101,17 +248,9 @@ def map_theta_to_bkt_prior(theta):
 def log_cat_response(user_id, q_id, test_type, response_idx, is_correct, theta_after):
     """
     Logs the student's response to a CAT question.
+    The row is buffered and written in a batch off the request path.
     """
-    conn = db.get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO student_cat_responses 
-        (user_id, question_id, test_type, response_index, is_correct, theta_estimate_after)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """,
-        (user_id, q_id, test_type, response_idx, is_correct, theta_after)
+    db.queue_event(
+        'student_cat_responses',
+        user_id, q_id, test_type, response_idx, is_correct, theta_after
     )
-    conn.commit()
-    cur.close()
-    conn.close()
\ No newline at end of file
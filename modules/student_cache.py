@@ -0,0 +1,115 @@
+import time
+import threading
+from collections import OrderedDict
+
+class StudentModelCache:
+    """
+    In-process cache for per-student reads (BKT profiles, dashboards, ...),
+    invalidated by this process's writes and expired after `ttl` seconds.
+
+    Every write to a student's model calls bump(user_id, subject), which
+    records the time of the write for that (user, subject) scope and the
+    user-wide scope (user_id, None). A cached entry is only served if it was
+    loaded after the scope's last write, so reads are fresh right after a
+    write made by this process. Writes made by other processes (another
+    server behind the load balancer, a resumed session) are not seen here;
+    the TTL bounds how long such an entry can be served stale.
+
+    Entries are evicted least-recently-used once `max_entries` is reached,
+    and expired or invalidated ones as soon as they are looked up. A write
+    record is only needed while entries loaded before it can still be
+    served, so records older than the TTL are dropped and their number is
+    bounded by the writes of one TTL window.
+    Cached values are shared between sessions and must not be mutated.
+    """
+
+    def __init__(self, max_entries=5000, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # (user_id, subject, view) -> (loaded_at, value)
+        self._writes = OrderedDict()    # (user_id, subject) -> time of the last write, oldest first
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _is_current(self, scope, loaded_at, now):
+        # Lock held. Strict comparison: a write in the same clock tick invalidates.
+        return now - loaded_at < self.ttl and loaded_at > self._writes.get(scope, float('-inf'))
+
+    def _forget_old_writes(self, now):
+        # Lock held. Entries loaded before a write this old have expired anyway.
+        while self._writes:
+            scope, written_at = next(iter(self._writes.items()))
+            if now - written_at < self.ttl:
+                break
+            del self._writes[scope]
+
+    def bump(self, user_id, subject):
+        """Marks everything cached for this student and subject (and user-wide views) as stale."""
+        now = time.monotonic()
+        with self._lock:
+            for scope in ((user_id, subject), (user_id, None)):
+                self._writes[scope] = now
+                self._writes.move_to_end(scope)
+            self._forget_old_writes(now)
+            self._stats["invalidations"] += 1
+
+    def get(self, user_id, subject, view, loader):
+        """
+        Returns the cached value of `view` for the scope, calling loader() on a
+        miss. A value loaded while a write bumped the scope is returned to the
+        caller but not cached.
+        """
+        hit, value, revision = self.lookup(user_id, subject, view)
+        if hit:
+            return value
+        value = loader()
+        self.store(user_id, subject, view, revision, value)
+        return value
+
+    def lookup(self, user_id, subject, view):
+        """
+        Returns (hit, value, revision). On a miss, load the value yourself and
+        pass the returned revision (the time of the lookup) to store(), so
+        the loader runs without holding the lock.
+        """
+        key = (user_id, subject, view)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_current((user_id, subject), entry[0], now):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return True, entry[1], now
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return False, None, now
+
+    def store(self, user_id, subject, view, revision, value):
+        """Caches a loaded value unless the scope was bumped since lookup() or the TTL has passed."""
+        key = (user_id, subject, view)
+        now = time.monotonic()
+        with self._lock:
+            if not self._is_current((user_id, subject), revision, now):
+                return
+            self._entries[key] = (revision, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        """Drops every cached entry (e.g. after the curriculum changed)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and the current sizes."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+            snapshot["writes_tracked"] = len(self._writes)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
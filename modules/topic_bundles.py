@@ -0,0 +1,142 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# Per-topic bundles of pedagogical content.
+#
+# The catalog snapshot only indexes content slots; the bodies (lessons,
+# worked examples, quiz JSON, ...) are loaded a topic at a time: one query
+# returns every bloom_level x intention_type row of the topic, JSON payloads
+# are parsed once, and the bundle is kept in a bounded LRU shared by every
+# session. The next topic's bundle can be loaded on a background thread
+# while the student finishes the current one.
+
+TOPIC_BUNDLE_CACHE_SIZE = int(os.environ.get("TOPIC_BUNDLE_CACHE_SIZE", 500))   # Bundles kept per process
+
+TOPIC_BUNDLE_SQL = """
+    SELECT id, bloom_level, intention_type, content
+    FROM pedagogical_content
+    WHERE topic_id = %s
+"""
+
+def parse_content(text):
+    """Quizzes are stored as JSON, everything else as Markdown/text."""
+    try:
+        return json.loads(text)
+    except (TypeError, json.JSONDecodeError):
+        return text
+
+class TopicBundle:
+    """Every content item of one topic, keyed by (bloom_level, intention_type). Read-only."""
+
+    def __init__(self, topic_id, rows):
+        self.topic_id = topic_id
+        self._items = {
+            (row['bloom_level'], row['intention_type']): MappingProxyType({'content': parse_content(row['content']), 'id': row['id']})
+            for row in rows
+        }
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, bloom_level, intention_type):
+        """{'content', 'id'} for one slot, or None."""
+        return self._items.get((bloom_level, intention_type))
+
+    def slots(self):
+        return tuple(self._items)
+
+class TopicBundleCache:
+    """
+    Thread-safe LRU of TopicBundles. `cursor()` is a context manager
+    yielding a read cursor; it is used from page threads and from the
+    prefetch thread alike.
+
+    invalidate() bumps a generation counter, so a bundle that was being
+    loaded while its content changed is returned to its caller but not
+    cached (the same rule as StudentModelCache writes).
+    """
+
+    def __init__(self, cursor, max_entries=TOPIC_BUNDLE_CACHE_SIZE):
+        self._cursor = cursor
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # topic_id -> TopicBundle
+        self._loading = {}              # topic_id -> Future of a prefetch in flight
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="topic-prefetch")
+        self._stats = {"hits": 0, "misses": 0, "prefetches": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, topic_id):
+        """The topic's bundle, loading it (or waiting for its prefetch) on a miss."""
+        with self._lock:
+            bundle = self._entries.get(topic_id)
+            if bundle is not None:
+                self._entries.move_to_end(topic_id)
+                self._stats["hits"] += 1
+                return bundle
+            self._stats["misses"] += 1
+            pending = self._loading.get(topic_id)
+        if pending is not None:
+            return pending.result()
+        return self._load(topic_id)
+
+    def prefetch(self, topic_id):
+        """Loads the topic's bundle on the background thread unless it is cached or already loading."""
+        with self._lock:
+            if topic_id is None or topic_id in self._entries or topic_id in self._loading:
+                return
+            self._stats["prefetches"] += 1
+            self._loading[topic_id] = self._executor.submit(self._prefetch, topic_id)
+
+    def _prefetch(self, topic_id):
+        try:
+            return self._load(topic_id)
+        except Exception:
+            logger.exception("Prefetching content for topic %s failed.", topic_id)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(topic_id, None)
+
+    def _load(self, topic_id):
+        with self._lock:
+            generation = self._generation
+        with self._cursor() as cur:
+            cur.execute(TOPIC_BUNDLE_SQL, (topic_id,))
+            bundle = TopicBundle(topic_id, cur.fetchall())
+        with self._lock:
+            if generation == self._generation:
+                self._entries[topic_id] = bundle
+                self._entries.move_to_end(topic_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+        return bundle
+
+    def invalidate(self, topic_ids):
+        """Drops the bundles of the given topics."""
+        with self._lock:
+            self._generation += 1
+            for topic_id in topic_ids:
+                self._entries.pop(topic_id, None)
+            self._stats["invalidations"] += 1
+
+    def apply_change(self, change):
+        """Catalog change callback: drops the bundles of topics whose content changed."""
+        topic_ids = {topic_id for topic_id, _bloom_level, _intention_type in change['content']}
+        if topic_ids:
+            self.invalidate(topic_ids)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["entries"] = len(self._entries)
+        snapshot["max_entries"] = self.max_entries
+        return snapshot
@@ -156,9 +156,7 @@ st.set_page_config(
 )
 
 # --- DATABASE & REDIRECT ---
-conn = db.get_db_connection()
-db.create_tables(conn)
-conn.close()
+db.ensure_schema()
 
 if "user_id" in st.session_state:
     st.switch_page("pages/1_Home.py")
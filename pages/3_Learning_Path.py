@@ -28,15 +28,12 @@ if 'user_id' not in st.session_state or 'selected_subject' not in st.session_sta
 subject = st.session_state['selected_subject']
 user_id = st.session_state['user_id']
 
-learning_path = curriculum.get_full_learning_path(subject)
-if not learning_path:
+graph = curriculum.get_curriculum_graph(subject)
+if not graph.topics:
     st.error(f"Curriculum path for {subject} not found.")
     st.stop()
-    
-topics = {t['id']: t for t in learning_path}
-topic_ids = [t['id'] for t in learning_path]
 
-progress_data = db.get_or_create_progress(user_id, subject)
+progress_data = db.get_progress(user_id, subject)
 failed_assignment = progress_data.get('assignment_score') is not None and progress_data.get('status') == 'learning'
 revise_mode_flag = st.session_state.get('revise_mode', False)
 review_mode = failed_assignment or revise_mode_flag
@@ -46,42 +43,37 @@ if review_mode:
 else:
     st.title(f"🚀 Your {subject.capitalize()} Learning Path")
 
-first_unmastered_id = topic_ids[0]
 all_bkt_data = db.get_all_bkt_models_for_subject(user_id, subject)
 bkt_model_map = {model['topic_id']: model for model in all_bkt_data}
 
-for t_id in topic_ids:
-    model = bkt_model_map.get(t_id, {'prob_knows': 0.0})
-    if model['prob_knows'] < 0.95:
-        first_unmastered_id = t_id
-        break
-else:
-    first_unmastered_id = topic_ids[-1]
+# First unmastered topic comes from the trigger-maintained rollup (one row)
+rollup = db.get_mastery_rollup(user_id, subject)
+first_unmastered_id = graph.frontier(rollup['first_unmastered_topic_id'], db.is_subject_mastered(rollup))
 
-progress_index = topic_ids.index(first_unmastered_id)
+# Unlocked set computed once; each sidebar entry is then a set lookup
+mastered_ids = {t_id for t_id, model in bkt_model_map.items() if model['prob_knows'] >= db.MASTERY_THRESHOLD}
+unlocked_ids = graph.unlocked(first_unmastered_id, mastered_ids)
 
-if 'viewing_topic_id' not in st.session_state:
+if st.session_state.get('viewing_topic_id') not in graph:
     st.session_state.viewing_topic_id = first_unmastered_id
 
 viewing_id = st.session_state.viewing_topic_id
-current_topic = topics[viewing_id]
+current_topic = graph.by_id[viewing_id]
 current_topic_name = current_topic['topic_name']
-current_viewing_index = topic_ids.index(viewing_id)
 
 st.sidebar.header("Course Outline")
 
-for topic_record in learning_path:
+for topic_record in graph.topics:
     t_id = topic_record['id']
     t_name = topic_record['topic_name']
     
     btn_type = "secondary"
     model = bkt_model_map.get(t_id, {'prob_knows': 0.0}) 
     prob_knows = model['prob_knows']
-    topic_record_index = topic_ids.index(t_id)
-    is_unlocked = review_mode or topic_record_index <= progress_index
+    is_unlocked = review_mode or t_id in unlocked_ids
     
     icon = "🔒"
-    if prob_knows > 0.95:
+    if prob_knows >= db.MASTERY_THRESHOLD:
         icon = "✅"
     elif is_unlocked:
         icon = "📖"
@@ -107,7 +99,7 @@ CODING_CHALLENGE_KEY = get_state_key('coding_challenge_text')
 CODING_FEEDBACK_KEY = get_state_key('coding_feedback')
 
 current_model = bkt_model_map.get(viewing_id, {'prob_knows': 0.0})
-is_topic_mastered = current_model['prob_knows'] > 0.95
+is_topic_mastered = current_model['prob_knows'] >= db.MASTERY_THRESHOLD
 
 if BDI_STATE not in st.session_state:
     if is_topic_mastered:
@@ -119,6 +111,10 @@ if BDI_STATE not in st.session_state:
 
 topic_state = st.session_state[BDI_STATE]
 
+# Past the lesson, warm the next topic's content while this one is finished
+if is_topic_mastered or topic_state in ('understanding_quiz', 'failed_quiz', 'coding_challenge'):
+    curriculum.prefetch_topic_bundle(graph.next_id[viewing_id])
+
 st.header(f"{current_topic_name}")
 st.caption(f"Knowledge Unit: {current_topic['ku_code']}")
 
@@ -197,9 +193,8 @@ elif topic_state == 'initial_lesson':
 
     if is_topic_mastered:
         st.info("🎓 **Topic Mastered** (Review Mode)")
-        next_topic_index = current_viewing_index + 1
-        if next_topic_index < len(topic_ids):
-            next_tid = topic_ids[next_topic_index]
+        next_tid = graph.next_id[viewing_id]
+        if next_tid is not None:
             if st.button("Go to Next Topic ➡️", type="primary"):
                 st.session_state.viewing_topic_id = next_tid
                 for key in list(st.session_state.keys()):
@@ -304,13 +299,8 @@ elif topic_state == 'understanding_quiz':
                 lesson_text = f"Topic: {current_topic_name}"
 
             # 2. THE AGENTIC BRAIN: Fetch Past Misconceptions from DB
-            bkt_record = db.get_bkt_model(user_id, subject, viewing_id)
-            past_misconceptions = []
-            if bkt_record and bkt_record['misconceptions']:
-                try:
-                    past_misconceptions = json.loads(bkt_record['misconceptions'])
-                except:
-                    past_misconceptions = []
+            # (bounded to the most recent MISCONCEPTION_LIMIT entries)
+            past_misconceptions = db.get_misconceptions(user_id, subject, viewing_id)
 
             # 3. Construct the Adaptive Prompt
             memory_context = ""
@@ -365,11 +355,11 @@ elif topic_state == 'understanding_quiz':
         else:
             is_correct = (user_choice == correct_answer)
             
-            # Only update BKT if not already mastered
-            if not is_topic_mastered:
-                db.update_bkt_model(user_id, subject, viewing_id, is_correct)
-            
             if is_correct:
+                # Only update BKT if not already mastered
+                if not is_topic_mastered:
+                    db.update_bkt_model(user_id, subject, viewing_id, True)
+
                 st.balloons()
                 st.success("✅ Correct! Proceeding to Coding Challenge...")
                 db.log_learning_event(user_id, subject, viewing_id, "quiz_pass")
@@ -379,11 +369,9 @@ elif topic_state == 'understanding_quiz':
                 # *** AGENTIC TRIGGER: MEMORY STORAGE ***
                 misconception_text = quiz_data.get('explanation', 'General misunderstanding')
                 
+                # One update records both the wrong answer and the misconception
                 if not is_topic_mastered:
-                    try:
-                        db.update_bkt_model(user_id, subject, viewing_id, False, new_misconception=misconception_text)
-                    except TypeError:
-                        db.update_bkt_model(user_id, subject, viewing_id, False)
+                    db.update_bkt_model(user_id, subject, viewing_id, False, new_misconception=misconception_text)
 
                 st.session_state[LAST_QUIZ_DATA] = {
                     "question": question,
@@ -1,9 +1,6 @@
 import streamlit as st
 from modules import db, helpers, psychometrics, curriculum
 import numpy as np
-# *** Import the component classes for direct method calling in 0.17.3 ***
-from catsim.selection import MaxInfoSelector 
-from catsim.estimation import NumericalSearchEstimator 
 
 helpers.set_page_styling()
 
@@ -18,7 +15,7 @@ user_id = st.session_state['user_id']
 st.title(f"Final Assessment for {subject}")
 
 # --- PROGRESS & ATTEMPT CHECK ---
-progress = db.get_or_create_progress(user_id, subject)
+progress = db.get_progress(user_id, subject)
 attempt_num = progress.get('final_assessment_attempts', 0) + 1 # Use .get for robustness
 
 if progress['status'] == 'completed':
@@ -35,9 +32,8 @@ if progress['status'] == 'completed':
         st.switch_page("pages/5_Profile.py")
     st.stop()
 
-# Get mastery status for locking retries
-all_bkt_data = db.get_all_bkt_models_for_subject(user_id, subject)
-all_mastered = all(model['prob_knows'] >= 0.95 for model in all_bkt_data)
+# Get mastery status for locking retries (one-row rollup lookup)
+all_mastered = db.is_subject_mastered(db.get_mastery_rollup(user_id, subject))
 
 if progress['irt_theta_final'] is not None and progress['status'] == 'learning':
     # User previously failed and is in 'learning' status
@@ -62,76 +58,50 @@ if progress['status'] != 'assessing':
     st.stop()
 
 # Display the current attempt number for the active assessment state
-if 'cat_simulator_final' not in st.session_state:
+if 'cat_session_final' not in st.session_state:
     st.session_state.current_attempt = attempt_num
 st.subheader(f"Attempt: {st.session_state.current_attempt}")
 
-# --- CAT SIMULATOR INITIALIZATION ---
-if 'cat_simulator_final' not in st.session_state:
-    with st.spinner("Loading calibrated final exam..."):
-        item_bank, item_map = psychometrics.get_irt_question_bank(subject, 'final')
-        
-        if item_bank is None or len(item_bank) < 10:
+# --- CAT SESSION ---
+# Only the compact CatSession is kept in session state; it is saved after every
+# answer, so a refresh or reconnect (on any instance) resumes the same test.
+with st.spinner("Loading calibrated final exam..."):
+    bank = psychometrics.get_cat_bank(subject, 'final')
+
+if 'cat_session_final' not in st.session_state:
+    session = psychometrics.resume_cat_session(user_id, subject, 'final')
+    if session is None:
+        if len(bank) < 10:
             st.error("No final exam bank found or not enough items. Cannot start assessment.")
             st.stop()
-            
+
         TEST_LENGTH = 10 
 
-        st.session_state.cat_simulator_final = psychometrics.initialize_cat_simulator(item_bank, TEST_LENGTH)
-        st.session_state.cat_item_map_final = item_map
-        st.session_state.cat_item_bank_final = item_bank
-        
-        # Initialize lists
-        st.session_state.cat_administered_items_final = []
-        st.session_state.cat_responses_final = []
-        
         # Initialize theta based on initial score
         initial_theta = progress['irt_theta_initial'] or 0.0
-        st.session_state.cat_current_theta_final = initial_theta
-        
-        st.session_state.cat_current_item_index_final = None
+        session = psychometrics.start_cat_session(user_id, subject, 'final', TEST_LENGTH, initial_theta, bank=bank)
+    st.session_state.cat_session_final = session
 
 # --- RUN THE TEST ---
-simulator = st.session_state.cat_simulator_final
-item_map = st.session_state.cat_item_map_final
-item_bank = st.session_state.cat_item_bank_final
+session = st.session_state.cat_session_final
 
-q_num = len(st.session_state.cat_administered_items_final) + 1
-# Use max_itens for catsim 0.17.3
-TEST_LENGTH = simulator.stopper.max_itens 
+q_num = session.answered + 1
+TEST_LENGTH = session.test_length
 
-test_is_complete = q_num > TEST_LENGTH
+# 1. Select the next item (or re-show the one pending before a reconnect)
+item_data = None if session.is_complete else psychometrics.current_cat_question(session, bank)
+test_is_complete = item_data is None
 
 if not test_is_complete:
     st.header(f"Attempt {st.session_state.current_attempt}: Question {q_num} of {TEST_LENGTH}")
     
-    # 1. Select the next item
-    if st.session_state.cat_current_item_index_final is None:
-        theta_estimate = st.session_state.cat_current_theta_final
-        
-        administered_indices = [idx for idx, r in st.session_state.cat_administered_items_final]
-        
-        #
-        # Use KEYWORD ARGUMENTS for independence check to pass
-        #
-        next_item_sim_index = MaxInfoSelector.select(
-            simulator.selector, # The 'self' instance
-            items=item_bank,
-            administered_items=administered_indices, 
-            est_theta=theta_estimate
-        )
-        st.session_state.cat_current_item_index_final = next_item_sim_index
-    
     # 2. Display the item
-    item_sim_index = st.session_state.cat_current_item_index_final
-    item_data = item_map[item_sim_index]
-    
     #st.markdown(f"**Topic:** {item_data['topic_id']}") 
     st.markdown(item_data['question_text'])
     
     options = item_data['options']
     
-    with st.form(key=f"cat_final_q_{item_sim_index}"):
+    with st.form(key=f"cat_final_q_{item_data['id']}"):
         user_choice_idx = st.radio(
             "Select your answer:",
             options=options,
@@ -149,25 +119,8 @@ if not test_is_complete:
             response_idx = options.index(user_choice_idx)
             is_correct = (response_idx == item_data['correct_option_index'])
             
-            st.session_state.cat_administered_items_final.append((item_sim_index, is_correct))
-            st.session_state.cat_responses_final.append(is_correct)
-            
-            # Extract administered indices AND responses
-            administered_indices = [idx for idx, r in st.session_state.cat_administered_items_final]
-            responses = [r for idx, r in st.session_state.cat_administered_items_final]
-            
-            #
-            # Use KEYWORD ARGUMENTS for independence check to pass
-            # NumericalSearchEstimator.estimate(self, items, administered_items, response_vector, est_theta, **kwargs)
-            #
-            theta_estimate = NumericalSearchEstimator.estimate(
-                simulator.estimator, # The 'self' instance
-                items=item_bank,
-                administered_items=administered_indices,
-                response_vector=responses,
-                est_theta=st.session_state.cat_current_theta_final
-            )
-            st.session_state.cat_current_theta_final = float(theta_estimate)
+            # Re-estimate theta and save the session
+            theta_estimate = psychometrics.record_cat_answer(session, bank, is_correct)
             
             # Log to DB
             psychometrics.log_cat_response(
@@ -183,13 +136,12 @@ if not test_is_complete:
             # This is key for the remediation analysis!
             db.update_bkt_model(user_id, subject, item_data['topic_id'], is_correct)
             
-            st.session_state.cat_current_item_index_final = None
             st.rerun()
 else:
     # --- TEST IS COMPLETE ---
     st.success("🎉 Final Assessment Complete!")
     
-    final_theta = st.session_state.cat_current_theta_final
+    final_theta = session.theta
     initial_theta = progress['irt_theta_initial'] or 0.0
     
     # User-friendly score interpretation (NEW CONVEYANCE)
@@ -234,7 +186,8 @@ else:
 
         st.page_link("pages/3_Learning_Path.py", label="Go to Review Mode", icon="📚")
     
-    # Clean up session state
+    # Clean up session state and the saved session
+    psychometrics.finish_cat_session(session)
     keys_to_delete = [k for k in st.session_state if k.startswith('cat_')]
     for k in keys_to_delete:
         del st.session_state[k]
\ No newline at end of file
@@ -1,6 +1,6 @@
 import streamlit as st
 import json
-from modules import db, helpers, curriculum
+from modules import db, helpers
 import pandas as pd
 import plotly.graph_objects as go
 
@@ -117,7 +117,7 @@ def get_ability_level(theta):
 def get_mastery_color(prob_knows):
     if prob_knows < 0.4: return '#ea4335' 
     elif prob_knows < 0.7: return '#fbbc04' 
-    elif prob_knows < 0.95: return '#4285f4' 
+    elif prob_knows < db.MASTERY_THRESHOLD: return '#4285f4' 
     else: return '#34a853' 
 
 # --- Custom HTML Progress Bar ---
@@ -168,24 +168,11 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
-all_progress = db.get_all_user_progress(st.session_state['user_id'])
-all_subjects = db.get_available_subjects()
-user_subjects = [p['subject'] for p in all_progress]
+# One aggregated query: every subject with the student's progress and topic mastery
+dashboard = db.get_dashboard(st.session_state['user_id'])
 
-active_courses = []
-not_started_courses = []
-
-for p in all_progress:
-    if p['irt_theta_initial'] is not None:
-        active_courses.append(p)
-
-for sub in all_subjects:
-    if sub not in user_subjects:
-        not_started_courses.append(sub)
-    else:
-        p = next((x for x in all_progress if x['subject'] == sub), None)
-        if p and p['irt_theta_initial'] is None:
-             not_started_courses.append(sub)
+active_courses = [c for c in dashboard if c['irt_theta_initial'] is not None]
+not_started_courses = [c['subject'] for c in dashboard if c['irt_theta_initial'] is None]
 
 # --- TABS ---
 tab1, tab2 = st.tabs(["🔥 Active Courses", "📚 Course Catalog"])
@@ -214,13 +201,10 @@ with tab1:
             st.markdown("<div class='card-spacer'></div>", unsafe_allow_html=True)
 
             # 2. Metrics
-            path = curriculum.get_full_learning_path(subject)
-            total_topics = len(path)
-            mastery_data = db.get_student_model_summary(st.session_state['user_id'], subject)
-            topics_mastered = 0
-            if isinstance(mastery_data, list):
-                 topics_mastered = sum(1 for m in mastery_data if m.get('prob_knows', 0) > 0.95)
-            
+            total_topics = p['total_topics']
+            topics_mastered = p['topics_mastered']
+            mastery_data = p['topics']
+
             progress_percent = topics_mastered / total_topics if total_topics > 0 else 0
             theta = p['irt_theta_initial']
             theta_final = p['irt_theta_final']
@@ -250,7 +234,7 @@ with tab1:
 
             # 5. Topic Details Expander (without action buttons)
             with st.expander("📊 View Topic Details"):
-                if isinstance(mastery_data, list):
+                if mastery_data:
                     df = pd.DataFrame(mastery_data)
                     if 'prob_knows' in df.columns:
                         df['prob_knows_percent'] = (df['prob_knows'] * 100).round(0)
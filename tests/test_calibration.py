@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+from modules import calibration
+from modules.irt import prob_correct
+
+def simulate(rng, true_params, n_people):
+    """Every simulated person answers every item; returns (people, items, correct)."""
+    theta = rng.standard_normal(n_people)
+    a, b, c = true_params.T
+    p = prob_correct(theta[:, None], a[None, :], b[None, :], c[None, :])
+    correct = rng.random(p.shape) < p
+    people, items = np.indices(p.shape)
+    return people.ravel(), items.ravel(), correct.ravel()
+
+class CalibrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(7)
+        n_items = 15
+        self.true = np.column_stack([
+            self.rng.uniform(0.8, 2.0, n_items),
+            np.linspace(-1.5, 1.5, n_items),
+            np.zeros(n_items),
+        ])
+        self.start = np.tile([1.0, 0.0, 0.25], (n_items, 1))
+
+    def test_2pl_parameters_are_recovered(self):
+        people, items, correct = simulate(self.rng, self.true, 3000)
+        result = calibration.calibrate(people, items, correct, self.start, model='2pl')
+        fitted = result['item_params']
+        self.assertTrue(result['converged'])
+        self.assertLess(np.abs(fitted[:, 1] - self.true[:, 1]).max(), 0.3)
+        self.assertLess(np.abs(fitted[:, 0] - self.true[:, 0]).mean(), 0.2)
+        self.assertTrue((fitted[:, 2] == 0).all())
+
+    def test_fixed_items_keep_their_parameters(self):
+        people, items, correct = simulate(self.rng, self.true, 500)
+        fixed = np.zeros(len(self.true), dtype=bool)
+        fixed[:3] = True
+        result = calibration.calibrate(people, items, correct, self.start, model='3pl', fixed=fixed, max_iterations=20)
+        np.testing.assert_array_equal(result['item_params'][fixed], self.start[fixed])
+        self.assertFalse(np.array_equal(result['item_params'][~fixed], self.start[~fixed]))
+
+    def test_grouped_sums_match_across_chunks(self):
+        rows = self.rng.integers(0, 5, 1000)
+        groups = np.sort(self.rng.integers(0, 40, 1000))
+        table = self.rng.random((5, 3))
+        expected = np.zeros((40, 3))
+        np.add.at(expected, groups, table[rows])
+        np.testing.assert_allclose(calibration.GroupedRows(rows, groups, 40, chunk=64).sum(table), expected)
+
+    def test_unknown_model_is_rejected(self):
+        with self.assertRaises(ValueError):
+            calibration.calibrate([0], [0], [True], self.start[:1], model='1pl')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from modules.curriculum_graph import CurriculumGraph
+
+def topics(count):
+    return [{'id': 10 + i, 'topic_name': f"Topic {i}", 'ku_code': f"KU{i // 2}"} for i in range(count)]
+
+class CurriculumGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        # 10 -> 11 -> 12 -> 13 -> 14 in topic order; 13 needs 10 and 11, 14 needs 12
+        self.graph = CurriculumGraph('C', topics(5), [(13, 10), (13, 11), (14, 12)])
+
+    def test_navigation(self):
+        self.assertEqual((self.graph.first_id, self.graph.last_id), (10, 14))
+        self.assertEqual(self.graph.next_topic(11)['id'], 12)
+        self.assertIsNone(self.graph.next_topic(14))
+        self.assertIsNone(self.graph.previous_topic(10))
+        self.assertIsNone(self.graph.next_topic(99))
+        self.assertEqual(self.graph.ku_groups['KU1'], (12, 13))
+
+    def test_prerequisites_are_sorted_by_position(self):
+        graph = CurriculumGraph('C', topics(5), [(13, 11), (13, 10)])
+        self.assertEqual(graph.prerequisites[13], (10, 11))
+        self.assertEqual(graph.unlocks[10], (13,))
+
+    def test_edges_to_unknown_topics_are_ignored(self):
+        graph = CurriculumGraph('C', topics(2), [(11, 99), (98, 10)])
+        self.assertEqual(graph.prerequisites[11], ())
+
+    def test_frontier(self):
+        self.assertEqual(self.graph.frontier(12), 12)
+        self.assertEqual(self.graph.frontier(None), 10)
+        self.assertEqual(self.graph.frontier(99), 10)
+        self.assertEqual(self.graph.frontier(12, subject_mastered=True), 14)
+
+    def test_topics_up_to_the_frontier_are_unlocked(self):
+        self.assertEqual(self.graph.unlocked(11), {10, 11})
+
+    def test_topic_after_the_frontier_unlocks_with_its_prerequisites(self):
+        self.assertEqual(self.graph.unlocked(11, mastered_ids={10}), {10, 11})
+        self.assertEqual(self.graph.unlocked(11, mastered_ids=[10, 11]), {10, 11, 13})
+        self.assertEqual(self.graph.unlocked(10, mastered_ids={12}), {10, 14})
+
+    def test_empty_graph(self):
+        graph = CurriculumGraph('C', ())
+        self.assertEqual((len(graph), graph.first_id, graph.frontier(None)), (0, None, None))
+        self.assertEqual(graph.unlocked(None), set())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import threading
+import time
+import unittest
+
+from modules.events import EventWriter
+
+class Unreachable(OSError):
+    pass
+
+class BadRow(ValueError):
+    pass
+
+class EventWriterTest(unittest.TestCase):
+
+    def writer(self, write_batch, **kwargs):
+        writer = EventWriter(write_batch, batch_size=5, flush_interval=0.02, retry_delay=0.01, **kwargs)
+        self.addCleanup(writer.close, 0.2)
+        return writer
+
+    def test_transient_errors_are_retried(self):
+        written, failures = [], [3]
+
+        def write_batch(table, rows):
+            if failures[0]:
+                failures[0] -= 1
+                raise Unreachable("database down")
+            written.extend(rows)
+
+        writer = self.writer(write_batch)
+        for i in range(12):
+            writer.submit('log', i)
+        writer.flush()
+        self.assertEqual(written, list(range(12)))
+        self.assertEqual(writer.stats()['dropped'], 0)
+
+    def test_rows_that_cannot_be_written_are_dropped_one_by_one(self):
+        written = []
+
+        def write_batch(table, rows):
+            if 3 in rows:
+                raise BadRow("foreign key violation")
+            written.extend(rows)
+
+        writer = self.writer(write_batch)
+        for i in range(12):
+            writer.submit('log', i)
+        writer.flush()
+        self.assertEqual(sorted(written), [i for i in range(12) if i != 3])
+        stats = writer.stats()
+        self.assertEqual((stats['written'], stats['dropped']), (11, 1))
+
+    def test_submit_never_blocks_on_a_full_queue(self):
+        release = threading.Event()
+
+        def write_batch(table, rows):
+            release.wait()
+            raise Unreachable("database down")
+
+        writer = self.writer(write_batch, max_queue=3)
+        started = time.monotonic()
+        for i in range(50):
+            writer.submit('log', i)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertGreater(writer.stats()['rejected'], 0)
+        release.set()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import unittest
+
+# Needs a PostgreSQL database the migrations can run against; everything the
+# tests write is rolled back:
+# DATABASE_URL=postgresql://... python -m unittest tests.test_mastery_rollup
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+
+@unittest.skipUnless(DATABASE_URL.startswith(("postgres://", "postgresql://")), "DATABASE_URL is not a PostgreSQL URL")
+class MasteryRollupTest(unittest.TestCase):
+
+    SUBJECT = "rollup-test"
+
+    def setUp(self):
+        import psycopg2
+        from modules import migrations
+        self.conn = psycopg2.connect(DATABASE_URL)
+        self.addCleanup(self.conn.close)
+        migrations.migrate(self.conn)
+        self.cur = self.conn.cursor()
+        self.addCleanup(self.conn.rollback)
+        self.cur.execute(
+            """
+            INSERT INTO topics (subject, topic_name, topic_order)
+            SELECT %s, 'topic ' || n, n FROM generate_series(1, 3) AS n
+            RETURNING id
+            """,
+            (self.SUBJECT,)
+        )
+        self.topic_ids = [row[0] for row in self.cur.fetchall()]
+
+    def add_users(self, count):
+        self.cur.execute(
+            """
+            INSERT INTO users (username, hashed_password)
+            SELECT 'rollup-test-' || n, '' FROM generate_series(1, %s) AS n
+            RETURNING id
+            """,
+            (count,)
+        )
+        return [row[0] for row in self.cur.fetchall()]
+
+    def rollups(self, user_ids):
+        self.cur.execute(
+            """
+            SELECT user_id, mastered_count, first_unmastered_topic_id, round(mastery_sum::numeric, 4)
+            FROM mastery_rollup WHERE subject = %s AND user_id = ANY(%s)
+            ORDER BY user_id
+            """,
+            (self.SUBJECT, user_ids)
+        )
+        return self.cur.fetchall()
+
+    def refreshed(self, user_ids):
+        """What a full refresh computes for the same pairs."""
+        self.cur.execute("SAVEPOINT refresh")
+        self.cur.execute("SELECT refresh_mastery_rollup(%s, %s)", (user_ids, [self.SUBJECT] * len(user_ids)))
+        expected = self.rollups(user_ids)
+        self.cur.execute("ROLLBACK TO SAVEPOINT refresh")
+        return expected
+
+    def test_bulk_write_over_more_pairs_than_the_lock_table_holds(self):
+        self.cur.execute(
+            """
+            SELECT current_setting('max_locks_per_transaction')::int
+                 * (current_setting('max_connections')::int + current_setting('max_prepared_transactions')::int)
+            """
+        )
+        user_ids = self.add_users(self.cur.fetchone()[0] + 1000)
+        self.cur.execute(
+            """
+            INSERT INTO bkt_model (user_id, subject, topic_id, prob_knows)
+            SELECT u, %s, %s, 0.99 FROM unnest(%s) AS u
+            """,
+            (self.SUBJECT, self.topic_ids[0], user_ids)
+        )
+        self.cur.execute("UPDATE bkt_model SET prob_knows = 0.5 WHERE subject = %s", (self.SUBJECT,))
+        rollups = self.rollups(user_ids)
+        self.assertEqual(len(rollups), len(user_ids))
+        self.assertEqual(rollups, self.refreshed(user_ids))
+
+    def test_incremental_updates_match_a_refresh(self):
+        user_ids = self.add_users(3)
+        first, second, third = self.topic_ids
+        for user_id, topic_id, p in [
+            (user_ids[0], first, 0.99), (user_ids[0], second, 0.4), (user_ids[1], second, 0.99),
+            (user_ids[2], first, 0.2),
+        ]:
+            self.cur.execute(
+                "INSERT INTO bkt_model (user_id, subject, topic_id, prob_knows) VALUES (%s, %s, %s, %s)",
+                (user_id, self.SUBJECT, topic_id, p)
+            )
+        self.cur.execute(
+            "UPDATE bkt_model SET prob_knows = 0.97 WHERE subject = %s AND topic_id = %s",
+            (self.SUBJECT, second)
+        )
+        self.cur.execute(
+            "DELETE FROM bkt_model WHERE subject = %s AND user_id = %s AND topic_id = %s",
+            (self.SUBJECT, user_ids[0], first)
+        )
+        self.assertEqual(self.rollups(user_ids), self.refreshed(user_ids))
+        self.assertEqual(self.rollups(user_ids)[0][2], first)
+
+if __name__ == '__main__':
+    unittest.main()
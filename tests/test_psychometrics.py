@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from modules.psychometrics import CatEngine, CatSession
+
+class CatSessionTest(unittest.TestCase):
+
+    def session(self, answers):
+        session = CatSession(7, 'C', 'placement', bank_version=3, test_length=20, theta=0.4, se=0.8)
+        for item_id, correct in answers:
+            session.record(item_id, correct)
+        return session
+
+    def test_responses_are_packed_one_bit_per_answer(self):
+        session = self.session([(11, True), (12, False), (13, True)])
+        self.assertEqual(session.responses, 0b101)
+        self.assertEqual(session.response_vector(), [True, False, True])
+        self.assertEqual(session.to_row()['responses'], b'\x05')
+
+    def test_row_round_trip(self):
+        answers = [(100 + k, k % 3 == 0) for k in range(17)]
+        session = self.session(answers)
+        session.current_item_id = 500
+        row = session.to_row()
+        self.assertEqual(len(row['responses']), 3)
+
+        restored = CatSession.from_row(row)
+        for name in CatSession.__slots__:
+            self.assertEqual(getattr(restored, name), getattr(session, name), name)
+        self.assertEqual(restored.response_vector(), [correct for _, correct in answers])
+
+    def test_trailing_wrong_answers_survive_the_round_trip(self):
+        session = self.session([(1, True)] + [(k, False) for k in range(2, 10)])
+        restored = CatSession.from_row(session.to_row())
+        self.assertEqual(restored.answered, 9)
+        self.assertEqual(restored.response_vector(), [True] + [False] * 8)
+
+    def test_empty_session(self):
+        restored = CatSession.from_row(self.session([]).to_row())
+        self.assertEqual((restored.responses, restored.item_ids, restored.is_complete), (0, [], False))
+
+class CatEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        b = np.linspace(-2, 2, 9)
+        self.engine = CatEngine(np.column_stack([np.full(9, 1.5), b, np.full(9, 0.2)]))
+
+    def test_first_item_is_the_most_informative_at_theta(self):
+        self.assertEqual(self.engine.select([], 0.0), 4)
+
+    def test_administered_items_are_not_selected_again(self):
+        self.assertNotIn(self.engine.select([4], 0.0), (4, None))
+        self.assertIsNone(self.engine.select(range(9), 0.0))
+
+    def test_estimate_follows_the_responses(self):
+        items = [2, 3, 4, 5, 6]
+        low = self.engine.estimate(items, [True, False, False, False, False])
+        high = self.engine.estimate(items, [True, True, True, True, False])
+        self.assertLess(low, high)
+        self.assertEqual(self.engine.estimate([], [], 0.7), 0.7)
+
+if __name__ == '__main__':
+    unittest.main()
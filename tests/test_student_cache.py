@@ -0,0 +1,68 @@
+import time
+import unittest
+from unittest import mock
+
+from modules.student_cache import StudentModelCache
+
+class StudentModelCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = StudentModelCache(max_entries=3, ttl=60.0)
+        self.loads = 0
+
+    def load(self, value='loaded'):
+        self.loads += 1
+        return f"{value} {self.loads}"
+
+    def test_hit_until_the_scope_is_bumped(self):
+        first = self.cache.get(1, 'C', 'profile', self.load)
+        self.assertEqual(self.cache.get(1, 'C', 'profile', self.load), first)
+        self.cache.bump(1, 'C')
+        self.assertNotEqual(self.cache.get(1, 'C', 'profile', self.load), first)
+        self.assertEqual(self.loads, 2)
+
+    def test_bump_invalidates_user_wide_views_but_not_other_subjects(self):
+        self.cache.get(1, None, 'all_progress', self.load)
+        self.cache.get(1, 'Python', 'profile', self.load)
+        self.cache.get(2, None, 'all_progress', self.load)
+        self.cache.bump(1, 'C')
+        self.assertFalse(self.cache.lookup(1, None, 'all_progress')[0])
+        self.assertTrue(self.cache.lookup(1, 'Python', 'profile')[0])
+        self.assertTrue(self.cache.lookup(2, None, 'all_progress')[0])
+
+    def test_value_loaded_during_a_write_is_not_cached(self):
+        hit, _, revision = self.cache.lookup(1, 'C', 'profile')
+        self.assertFalse(hit)
+        self.cache.bump(1, 'C')
+        self.cache.store(1, 'C', 'profile', revision, 'stale')
+        self.assertFalse(self.cache.lookup(1, 'C', 'profile')[0])
+
+    def test_entries_expire_after_the_ttl(self):
+        now = time.monotonic()
+        with mock.patch('modules.student_cache.time.monotonic', return_value=now):
+            self.cache.get(1, 'C', 'profile', self.load)
+        with mock.patch('modules.student_cache.time.monotonic', return_value=now + 61):
+            self.assertFalse(self.cache.lookup(1, 'C', 'profile')[0])
+        self.assertEqual(self.cache.stats()['expirations'], 1)
+
+    def test_write_records_older_than_the_ttl_are_forgotten(self):
+        now = time.monotonic()
+        with mock.patch('modules.student_cache.time.monotonic', return_value=now):
+            for user_id in range(10):
+                self.cache.bump(user_id, 'C')
+        self.assertEqual(self.cache.stats()['writes_tracked'], 20)
+        with mock.patch('modules.student_cache.time.monotonic', return_value=now + 61):
+            self.cache.bump(99, 'C')
+        self.assertEqual(self.cache.stats()['writes_tracked'], 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for user_id in (1, 2, 3):
+            self.cache.get(user_id, 'C', 'profile', self.load)
+        self.cache.get(1, 'C', 'profile', self.load)
+        self.cache.get(4, 'C', 'profile', self.load)
+        self.assertFalse(self.cache.lookup(2, 'C', 'profile')[0])
+        self.assertTrue(self.cache.lookup(1, 'C', 'profile')[0])
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+if __name__ == '__main__':
+    unittest.main()